@@ -2,11 +2,12 @@
 
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Header, Response
 from sqlalchemy.orm import Session
 
 from app.core.deps import TenantContext, get_current_active_tenant, get_current_cliente, get_db
 from app.schemas.agendamento import AgendamentoCreate, AgendamentoOut
+from app.services import idempotency_service
 from app.services.agendamento_service import criar_agendamento
 
 router = APIRouter()
@@ -15,11 +16,29 @@ router = APIRouter()
 @router.post("/", response_model=AgendamentoOut)
 def criar(
     payload: AgendamentoCreate,
+    response: Response,
+    idempotency_key: str | None = Header(default=None, alias="Idempotency-Key", max_length=255),
     db: Session = Depends(get_db),
     tenant: TenantContext = Depends(get_current_active_tenant),
     cliente=Depends(get_current_cliente),
 ):
-    """Cria um agendamento garantindo a coerência multi-tenant."""
+    """Cria um agendamento garantindo a coerência multi-tenant.
 
-    agendamento = criar_agendamento(db=db, tenant_id=tenant.id, cliente=cliente, payload=payload)
-    return agendamento
+    Com `Idempotency-Key`, repetições do mesmo pedido devolvem a resposta original.
+    """
+
+    if idempotency_key is None:
+        return criar_agendamento(db=db, tenant_id=tenant.id, cliente=cliente, payload=payload)
+    resposta, repetida = idempotency_service.executar(
+        db,
+        tenant_id=tenant.id,
+        cliente_id=cliente.id,
+        chave=idempotency_key,
+        request_hash=idempotency_service.hash_pedido("POST /agendamentos/", payload.model_dump(mode="json")),
+        operacao=lambda: AgendamentoOut.model_validate(
+            criar_agendamento(db=db, tenant_id=tenant.id, cliente=cliente, payload=payload)
+        ).model_dump(mode="json"),
+    )
+    if repetida:
+        response.headers["Idempotent-Replayed"] = "true"
+    return resposta
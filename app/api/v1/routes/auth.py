@@ -6,10 +6,10 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 
 from app.core.deps import get_db, get_current_user
-from app.core.security import create_access_token, get_password_hash, verify_password
+from app.core.security import get_password_hash, verify_password
 from app.domain.enums import UserRole
 from app.infrastructure.db import models
-from app.services import tenant_service
+from app.services import auth_service, tenant_service
 from app.schemas import auth as auth_schemas
 
 router = APIRouter()
@@ -70,8 +70,7 @@ def login(payload: auth_schemas.UserLogin, db: Session = Depends(get_db)):
     if not user or not verify_password(payload.password, user.password_hash):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Credenciais inválidas")
 
-    token = create_access_token(str(user.id), tenant_id=str(user.tenant_id), role=user.role.value)
-    return auth_schemas.Token(access_token=token)
+    return auth_schemas.Token(access_token=auth_service.issue_access_token(user))
 
 
 @router.get("/me", response_model=auth_schemas.UserRead)
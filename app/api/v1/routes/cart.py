@@ -3,86 +3,272 @@
 from __future__ import annotations
 
 from decimal import Decimal
+from typing import Iterable
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
 
 from app.core.deps import get_current_active_tenant, get_current_cliente, get_db
+from app.core.pagination import decode_cursor, encode_cursor, get_list_limit, set_next_cursor
 from app.infrastructure.db import models
-from app.schemas.cart import CartItemCreate, CartItemOut, CartItemUpdate
+from app.schemas.cart import (
+    CartItemBatchCreate,
+    CartItemCreate,
+    CartItemOut,
+    CartItemUpdate,
+    CartResumo,
+    CartResumoGrupo,
+    CartResumoItem,
+)
+from app.services import stock_service
+from app.services.cart_store import CartLine, CartStore, get_cart_store
 
 router = APIRouter()
 
 
-def _get_reference_price(
-    *, db: Session, tenant_id: UUID, tipo: str, ref_id: UUID
-) -> Decimal:
-    if tipo == "produto":
-        produto = (
-            db.query(models.Produto)
-            .filter(
-                models.Produto.id == ref_id,
-                models.Produto.tenant_id == tenant_id,
-                models.Produto.ativo.is_(True),
-                models.Produto.disponivel.is_(True),
-            )
-            .first()
+def _get_reference_prices(
+    *, db: Session, tenant_id: UUID, chaves: Iterable[tuple[str, UUID]]
+) -> dict[tuple[str, UUID], Decimal]:
+    """Preços de referência de vários itens com uma query por tipo."""
+
+    ids: dict[str, set[UUID]] = {"produto": set(), "servico": set()}
+    for tipo, ref_id in chaves:
+        ids[tipo].add(ref_id)
+
+    precos: dict[tuple[str, UUID], Decimal] = {}
+    if ids["produto"]:
+        produtos = db.query(models.Produto.id, models.Produto.preco).filter(
+            models.Produto.id.in_(ids["produto"]),
+            models.Produto.tenant_id == tenant_id,
+            models.Produto.ativo.is_(True),
+            models.Produto.disponivel.is_(True),
         )
-        if not produto:
-            raise HTTPException(status_code=404, detail="Produto indisponível")
-        return Decimal(produto.preco)
-    if tipo == "servico":
-        servico = (
-            db.query(models.Servico)
+        precos.update({("produto", ref_id): Decimal(preco) for ref_id, preco in produtos})
+    if ids["servico"]:
+        servicos = (
+            db.query(models.Servico.id, models.Servico.preco)
             .join(models.PrestadorServico, models.PrestadorServico.id == models.Servico.prestador_id)
             .filter(
-                models.Servico.id == ref_id,
+                models.Servico.id.in_(ids["servico"]),
                 models.Servico.tenant_id == tenant_id,
                 models.Servico.ativo.is_(True),
                 models.PrestadorServico.ativo.is_(True),
             )
-            .first()
         )
-        if not servico:
-            raise HTTPException(status_code=404, detail="Serviço indisponível")
-        return Decimal(servico.preco)
-    raise HTTPException(status_code=400, detail="Tipo de item inválido")
+        precos.update({("servico", ref_id): Decimal(preco) for ref_id, preco in servicos})
+
+    for tipo in ("produto", "servico"):
+        if any((tipo, ref_id) not in precos for ref_id in ids[tipo]):
+            detalhe = "Produto indisponível" if tipo == "produto" else "Serviço indisponível"
+            raise HTTPException(status_code=404, detail=detalhe)
+    return precos
 
 
 def _get_cart_item(
-    *, db: Session, cliente: models.Cliente, item_id: UUID
-) -> models.CartItem:
-    item = (
-        db.query(models.CartItem)
-        .filter(
-            models.CartItem.id == item_id,
-            models.CartItem.cliente_id == cliente.id,
-            models.CartItem.tenant_id == cliente.tenant_id,
-        )
-        .first()
-    )
+    *, store: CartStore, tenant_id: UUID, cliente: models.Cliente, item_id: UUID
+) -> CartLine:
+    item = store.obter(tenant_id, cliente.id, item_id)
     if not item:
         raise HTTPException(status_code=404, detail="Item não encontrado")
     return item
 
 
+@router.get("/me/carrinho/resumo", response_model=CartResumo)
+def resumo_carrinho(
+    cliente: models.Cliente = Depends(get_current_cliente),
+    tenant = Depends(get_current_active_tenant),
+    db: Session = Depends(get_db),
+    store: CartStore = Depends(get_cart_store),
+):
+    """Carrinho com preços, stock e disponibilidade atuais, totais e agrupamento por vendedor."""
+
+    linhas = store.listar(tenant.id, cliente.id)
+    dados = _dados_atuais(db=db, tenant_id=tenant.id, cliente_id=cliente.id, linhas=linhas)
+
+    grupos: dict[tuple[str, UUID], CartResumoGrupo] = {}
+    indisponiveis: list[CartResumoItem] = []
+    for linha in linhas:
+        atual = dados.get((linha.tipo, linha.ref_id))
+        if atual is None or not atual["ativo"]:
+            indisponiveis.append(
+                CartResumoItem(
+                    id=linha.id,
+                    tipo=linha.tipo,
+                    ref_id=linha.ref_id,
+                    quantidade=linha.quantidade,
+                    preco_unitario=linha.preco_unitario,
+                    nome=atual["nome"] if atual else None,
+                    disponivel=False,
+                )
+            )
+            continue
+        preco = Decimal(atual["preco"])
+        stock = atual["stock"]
+        item = CartResumoItem(
+            id=linha.id,
+            tipo=linha.tipo,
+            ref_id=linha.ref_id,
+            quantidade=linha.quantidade,
+            preco_unitario=linha.preco_unitario,
+            nome=atual["nome"],
+            preco_atual=preco,
+            total_linha=preco * linha.quantidade,
+            disponivel=stock is None or stock >= linha.quantidade or atual["permitir_backorder"],
+            stock_disponivel=stock,
+            preco_alterado=preco != Decimal(linha.preco_unitario),
+        )
+        chave = (atual["vendedor_tipo"], atual["vendedor_id"])
+        if chave not in grupos:
+            grupos[chave] = CartResumoGrupo(
+                tipo=atual["vendedor_tipo"],
+                id=atual["vendedor_id"],
+                nome=atual["vendedor_nome"],
+                subtotal=Decimal("0.00"),
+                itens=[],
+            )
+        grupos[chave].itens.append(item)
+        grupos[chave].subtotal += item.total_linha
+
+    itens = [item for grupo in grupos.values() for item in grupo.itens]
+    return CartResumo(
+        subtotal=sum((grupo.subtotal for grupo in grupos.values()), Decimal("0.00")),
+        total_itens=sum(item.quantidade for item in itens),
+        tem_precos_alterados=any(item.preco_alterado for item in itens),
+        tem_indisponiveis=bool(indisponiveis) or not all(item.disponivel for item in itens),
+        grupos=list(grupos.values()),
+        indisponiveis=indisponiveis,
+    )
+
+
 @router.get("/me/carrinho", response_model=list[CartItemOut])
 def listar_carrinho(
+    response: Response,
+    cursor: str | None = None,
+    limit: int = Depends(get_list_limit),
     cliente: models.Cliente = Depends(get_current_cliente),
     tenant = Depends(get_current_active_tenant),
-    db: Session = Depends(get_db),
+    store: CartStore = Depends(get_cart_store),
 ):
-    itens = (
-        db.query(models.CartItem)
-        .filter(
-            models.CartItem.cliente_id == cliente.id,
-            models.CartItem.tenant_id == tenant.id,
+    """Linhas do carrinho por ordem de inserção, `limit` de cada vez (cursor seguinte em `X-Next-Cursor`).
+
+    O carrinho é lido inteiro pelo backend (um hash ou as linhas de um cliente); a chave
+    `(created_at, id)` é aplicada em memória.
+    """
+
+    linhas = sorted(store.listar(tenant.id, cliente.id), key=lambda linha: (linha.created_at, linha.id))
+    if cursor:
+        depois = tuple(decode_cursor(cursor, 2))
+        linhas = [linha for linha in linhas if (linha.created_at, linha.id) > depois]
+    if len(linhas) > limit:
+        linhas = linhas[:limit]
+        set_next_cursor(response, encode_cursor([linhas[-1].created_at, linhas[-1].id]))
+    return linhas
+
+
+def _dados_atuais(
+    *, db: Session, tenant_id: UUID, cliente_id: UUID, linhas: list[CartLine]
+) -> dict[tuple[str, UUID], dict]:
+    """Preço, disponibilidade, stock e vendedor atuais das linhas, com uma query por tipo."""
+
+    produto_ids = {linha.ref_id for linha in linhas if linha.tipo == "produto"}
+    servico_ids = {linha.ref_id for linha in linhas if linha.tipo == "servico"}
+    dados: dict[tuple[str, UUID], dict] = {}
+    if produto_ids:
+        produtos = (
+            db.query(
+                models.Produto.id,
+                models.Produto.nome,
+                models.Produto.preco,
+                (models.Produto.ativo & models.Produto.disponivel).label("ativo"),
+                models.Produto.permitir_backorder,
+                # Disponível para este cliente: as suas próprias reservas não contam contra ele.
+                (models.Produto.stock_total - stock_service.reservado_por_outros(cliente_id)).label("stock"),
+                models.Merchant.id.label("vendedor_id"),
+                models.Merchant.nome.label("vendedor_nome"),
+            )
+            .join(models.Merchant, models.Merchant.id == models.Produto.merchant_id)
+            .filter(models.Produto.id.in_(produto_ids), models.Produto.tenant_id == tenant_id)
+        )
+        for row in produtos:
+            dados[("produto", row.id)] = {**row._asdict(), "vendedor_tipo": "merchant"}
+    if servico_ids:
+        servicos = (
+            db.query(
+                models.Servico.id,
+                models.Servico.nome,
+                models.Servico.preco,
+                (models.Servico.ativo & models.PrestadorServico.ativo).label("ativo"),
+                models.PrestadorServico.id.label("vendedor_id"),
+                models.PrestadorServico.nome.label("vendedor_nome"),
+            )
+            .join(models.PrestadorServico, models.PrestadorServico.id == models.Servico.prestador_id)
+            .filter(models.Servico.id.in_(servico_ids), models.Servico.tenant_id == tenant_id)
         )
-        .order_by(models.CartItem.created_at.asc())
-        .all()
+        for row in servicos:
+            dados[("servico", row.id)] = {**row._asdict(), "vendedor_tipo": "prestador", "stock": None}
+    return dados
+
+
+def _reconciliar_reservas(
+    *, db: Session, store: CartStore, tenant_id: UUID, cliente_id: UUID, produto_ids: list[UUID]
+) -> None:
+    """Acerta, no commit do carrinho, as reservas com a quantidade efetivamente gravada.
+
+    Nos backends em hash o commit reaplica as operações sobre o estado atual, pelo que um pedido
+    concorrente do mesmo cliente pode mudar a quantidade final em relação à vista local usada na
+    primeira reserva. O lock do produto, tomado por essa reserva, dura até ao commit SQL: a
+    quantidade relida depois da escrita é a de quem acertar as reservas em último lugar.
+    """
+
+    def reconciliar() -> None:
+        for produto_id in produto_ids:
+            quantidade = store.quantidade(tenant_id, cliente_id, "produto", produto_id)
+            if quantidade:
+                stock_service.reservar(
+                    db, tenant_id=tenant_id, cliente_id=cliente_id, produto_id=produto_id, quantidade=quantidade
+                )
+            else:
+                stock_service.libertar_reservas(db, cliente_id=cliente_id, produto_ids=[produto_id])
+
+    if produto_ids:
+        store.ao_gravar(reconciliar)
+
+
+def _adicionar_itens(
+    *,
+    db: Session,
+    store: CartStore,
+    tenant_id: UUID,
+    cliente: models.Cliente,
+    itens: list[CartItemCreate],
+) -> list[CartLine]:
+    """Soma os itens ao carrinho (upsert por `tipo`/`ref_id`) e reserva o stock. Não faz commit.
+
+    No backend SQL é um único `INSERT ... ON CONFLICT DO UPDATE` na chave única
+    `(cliente_id, tipo, ref_id)`, pelo que pedidos concorrentes nunca criam linhas duplicadas.
+    """
+
+    linhas: dict[tuple[str, UUID], int] = {}
+    for item in itens:
+        linhas[(item.tipo, item.ref_id)] = linhas.get((item.tipo, item.ref_id), 0) + item.quantidade
+    precos = _get_reference_prices(db=db, tenant_id=tenant_id, chaves=linhas)
+
+    guardados = store.adicionar(
+        tenant_id,
+        cliente.id,
+        [(tipo, ref_id, quantidade, precos[(tipo, ref_id)]) for (tipo, ref_id), quantidade in linhas.items()],
     )
-    return itens
+
+    # A reserva cobre a quantidade final de cada linha (já somada pelo upsert), por ordem de produto.
+    produto_ids = sorted(item.ref_id for item in guardados if item.tipo == "produto")
+    for item in sorted((item for item in guardados if item.tipo == "produto"), key=lambda item: item.ref_id):
+        stock_service.reservar(
+            db, tenant_id=tenant_id, cliente_id=cliente.id, produto_id=item.ref_id, quantidade=item.quantidade
+        )
+    _reconciliar_reservas(db=db, store=store, tenant_id=tenant_id, cliente_id=cliente.id, produto_ids=produto_ids)
+    ordem = {chave: indice for indice, chave in enumerate(linhas)}
+    return sorted(guardados, key=lambda item: ordem[(item.tipo, item.ref_id)])
 
 
 @router.post(
@@ -95,39 +281,32 @@ def adicionar_item(
     cliente: models.Cliente = Depends(get_current_cliente),
     tenant = Depends(get_current_active_tenant),
     db: Session = Depends(get_db),
+    store: CartStore = Depends(get_cart_store),
 ):
-    preco = _get_reference_price(
-        db=db, tenant_id=tenant.id, tipo=payload.tipo, ref_id=payload.ref_id
-    )
-    existente = (
-        db.query(models.CartItem)
-        .filter(
-            models.CartItem.cliente_id == cliente.id,
-            models.CartItem.tenant_id == tenant.id,
-            models.CartItem.tipo == payload.tipo,
-            models.CartItem.ref_id == payload.ref_id,
-        )
-        .first()
-    )
-    if existente:
-        existente.quantidade += payload.quantidade
-        existente.preco_unitario = preco
-        item = existente
-    else:
-        item = models.CartItem(
-            tenant_id=tenant.id,
-            cliente_id=cliente.id,
-            tipo=payload.tipo,
-            ref_id=payload.ref_id,
-            quantidade=payload.quantidade,
-            preco_unitario=preco,
-        )
-        db.add(item)
-    db.commit()
-    db.refresh(item)
+    [item] = _adicionar_itens(db=db, store=store, tenant_id=tenant.id, cliente=cliente, itens=[payload])
+    store.commit()
     return item
 
 
+@router.post(
+    "/me/carrinho/itens:batch",
+    response_model=list[CartItemOut],
+    status_code=status.HTTP_201_CREATED,
+)
+def adicionar_itens(
+    payload: CartItemBatchCreate,
+    cliente: models.Cliente = Depends(get_current_cliente),
+    tenant = Depends(get_current_active_tenant),
+    db: Session = Depends(get_db),
+    store: CartStore = Depends(get_cart_store),
+):
+    """Adiciona vários itens de uma vez (reorder, bundles); itens repetidos são somados."""
+
+    itens = _adicionar_itens(db=db, store=store, tenant_id=tenant.id, cliente=cliente, itens=payload.itens)
+    store.commit()
+    return itens
+
+
 @router.patch("/me/carrinho/itens/{item_id}", response_model=CartItemOut)
 def atualizar_item(
     item_id: UUID,
@@ -135,12 +314,18 @@ def atualizar_item(
     cliente: models.Cliente = Depends(get_current_cliente),
     tenant = Depends(get_current_active_tenant),
     db: Session = Depends(get_db),
+    store: CartStore = Depends(get_cart_store),
 ):
-    item = _get_cart_item(db=db, cliente=cliente, item_id=item_id)
-    item.quantidade = payload.quantidade
-    db.add(item)
-    db.commit()
-    db.refresh(item)
+    item = _get_cart_item(store=store, tenant_id=tenant.id, cliente=cliente, item_id=item_id)
+    if item.tipo == "produto":
+        stock_service.reservar(
+            db, tenant_id=tenant.id, cliente_id=cliente.id, produto_id=item.ref_id, quantidade=payload.quantidade
+        )
+        _reconciliar_reservas(
+            db=db, store=store, tenant_id=tenant.id, cliente_id=cliente.id, produto_ids=[item.ref_id]
+        )
+    item = store.atualizar(tenant.id, cliente.id, item_id, payload.quantidade)
+    store.commit()
     return item
 
 
@@ -150,8 +335,11 @@ def remover_item(
     cliente: models.Cliente = Depends(get_current_cliente),
     tenant = Depends(get_current_active_tenant),
     db: Session = Depends(get_db),
+    store: CartStore = Depends(get_cart_store),
 ):
-    item = _get_cart_item(db=db, cliente=cliente, item_id=item_id)
-    db.delete(item)
-    db.commit()
+    item = _get_cart_item(store=store, tenant_id=tenant.id, cliente=cliente, item_id=item_id)
+    if item.tipo == "produto":
+        stock_service.libertar_reservas(db, cliente_id=cliente.id, produto_ids=[item.ref_id])
+    store.remover(tenant.id, cliente.id, item_id)
+    store.commit()
     return None
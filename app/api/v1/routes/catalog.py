@@ -2,85 +2,163 @@
 
 from __future__ import annotations
 
-from math import ceil
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request
+from sqlalchemy import select
+from sqlalchemy.orm import undefer
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.deps import TenantContext, get_db, get_tenant
+from app.core import http_cache, response_cache
+from app.core.deps import TenantContext, get_async_db, get_async_tenant
+from app.core.pagination import CountMode, get_count_mode, paginate_async
 from app.infrastructure.db import models
 from app.schemas.merchant import (
     CategoriaListResponse,
     ProdutoListResponse,
 )
+from app.services import search_service
 
 router = APIRouter()
 
 
-def _paginate(query, page: int, page_size: int):
-    total = query.count()
-    total_pages = ceil(total / page_size) if page_size else 1
-    offset = (page - 1) * page_size
-    results = query.offset(offset).limit(page_size).all()
-    return total, total_pages, results
+PRODUTO_KEYSET = (models.Produto.nome, models.Produto.id)
+CATEGORIA_KEYSET = (models.Categoria.nome, models.Categoria.id)
 
 
 @router.get("/categorias", response_model=CategoriaListResponse, tags=["Catálogo"])
-def listar_categorias(
+async def listar_categorias(
+    request: Request,
+    background_tasks: BackgroundTasks,
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
+    cursor: str | None = None,
+    count: CountMode = Depends(get_count_mode),
     merchant_id: UUID | None = None,
-    tenant: TenantContext = Depends(get_tenant),
-    db: Session = Depends(get_db),
+    tenant: TenantContext = Depends(get_async_tenant),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    query = db.query(models.Categoria).filter(models.Categoria.tenant_id == tenant.id)
+    async def carregar(session: AsyncSession) -> CategoriaListResponse:
+        stmt = select(models.Categoria).where(models.Categoria.tenant_id == tenant.id)
+        if merchant_id:
+            stmt = stmt.where(models.Categoria.merchant_id == merchant_id)
+
+        resultado = await paginate_async(
+            session,
+            stmt,
+            page=page,
+            page_size=page_size,
+            keyset=CATEGORIA_KEYSET,
+            cursor=cursor,
+            count=count,
+            filtered=merchant_id is not None,
+        )
+        return CategoriaListResponse(
+            total=resultado.total,
+            items=resultado.items,
+            page=resultado.page,
+            page_size=page_size,
+            total_pages=resultado.total_pages,
+            has_next=resultado.has_next,
+            next_cursor=resultado.next_cursor,
+        )
+
     if merchant_id:
-        query = query.filter(models.Categoria.merchant_id == merchant_id)
-
-    total, total_pages, categorias = _paginate(query, page, page_size)
-    return CategoriaListResponse(
-        total=total,
-        items=categorias,
-        page=page,
-        page_size=page_size,
-        total_pages=total_pages,
+        tags = [response_cache.merchant_tag(merchant_id)]
+    else:
+        tags = [response_cache.tenant_tag(tenant.id, "categorias")]
+    return await response_cache.cached_response(
+        request, db=db, tenant_id=tenant.id, tags=tags, loader=carregar, background_tasks=background_tasks
     )
 
 
+def _chaves_produtos(tenant_id: UUID, *filtros: tuple[str, UUID | None]):
+    """Surrogate keys de uma página de produtos: tenant, merchants e categorias presentes."""
+
+    def chaves(payload: ProdutoListResponse) -> list[str]:
+        keys = [http_cache.tenant_key(tenant_id)]
+        for tipo, valor in filtros:
+            if valor is not None:
+                keys.append(http_cache.merchant_key(valor) if tipo == "merchant" else http_cache.categoria_key(valor))
+        for item in payload.items:
+            keys.append(http_cache.merchant_key(item.merchant_id))
+            if item.categoria_id:
+                keys.append(http_cache.categoria_key(item.categoria_id))
+        return keys
+
+    return chaves
+
+
 @router.get("/produtos", response_model=ProdutoListResponse, tags=["Catálogo"])
-def listar_produtos(
+async def listar_produtos(
+    request: Request,
+    background_tasks: BackgroundTasks,
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
+    cursor: str | None = None,
+    count: CountMode = Depends(get_count_mode),
     merchant_id: UUID | None = None,
     categoria_id: UUID | None = None,
     disponivel: bool | None = None,
     ativo: bool | None = None,
     search: str | None = Query(default=None, min_length=2),
-    tenant: TenantContext = Depends(get_tenant),
-    db: Session = Depends(get_db),
+    q: str | None = Query(default=None, min_length=2, description="Pesquisa full-text ordenada por relevância"),
+    tenant: TenantContext = Depends(get_async_tenant),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    query = db.query(models.Produto).filter(models.Produto.tenant_id == tenant.id)
+    stmt = select(models.Produto).where(models.Produto.tenant_id == tenant.id)
 
     if merchant_id:
-        query = query.filter(models.Produto.merchant_id == merchant_id)
+        stmt = stmt.where(models.Produto.merchant_id == merchant_id)
     if categoria_id:
-        query = query.filter(models.Produto.categoria_id == categoria_id)
+        stmt = stmt.where(models.Produto.categoria_id == categoria_id)
     if disponivel is not None:
-        query = query.filter(models.Produto.disponivel == disponivel)
+        stmt = stmt.where(models.Produto.disponivel == disponivel)
     if ativo is not None:
-        query = query.filter(models.Produto.ativo == ativo)
+        stmt = stmt.where(models.Produto.ativo == ativo)
     if search:
         ilike = f"%{search.lower()}%"
-        query = query.filter(models.Produto.nome.ilike(ilike))
-
-    total, total_pages, produtos = _paginate(query, page, page_size)
-    return ProdutoListResponse(
-        total=total,
-        items=produtos,
-        page=page,
-        page_size=page_size,
-        total_pages=total_pages,
+        stmt = stmt.where(models.Produto.nome.ilike(ilike))
+    if q:
+        stmt = search_service.apply_search(stmt, models.Produto, q, dialect_name=db.get_bind().dialect.name)
+
+    async def carregar(session: AsyncSession) -> ProdutoListResponse:
+        resultado = await paginate_async(
+            session,
+            # `ProdutoOut.stock_disponivel` precisa das reservas; só a página as carrega, não os validadores.
+            stmt.options(undefer(models.Produto.stock_reservado)),
+            page=page,
+            page_size=page_size,
+            keyset=None if q else PRODUTO_KEYSET,
+            cursor=cursor,
+            count=count,
+            filtered=any(value is not None for value in (merchant_id, categoria_id, disponivel, ativo, search, q)),
+        )
+        return ProdutoListResponse(
+            total=resultado.total,
+            items=resultado.items,
+            page=resultado.page,
+            page_size=page_size,
+            total_pages=resultado.total_pages,
+            has_next=resultado.has_next,
+            next_cursor=resultado.next_cursor,
+        )
+
+    if merchant_id:
+        tags = [response_cache.merchant_tag(merchant_id)]
+    else:
+        tags = [response_cache.tenant_tag(tenant.id, "produtos")]
+    # O stock muda com vendas e reservas sem tocar `updated_at`: a tag `stock` invalida a listagem e a ETag.
+    tags.append(response_cache.tenant_tag(tenant.id, "stock"))
+    return await response_cache.cached_response(
+        request,
+        db=db,
+        tenant_id=tenant.id,
+        tags=tags,
+        loader=carregar,
+        background_tasks=background_tasks,
+        validators_from=stmt,
+        surrogate_keys=_chaves_produtos(tenant.id, ("merchant", merchant_id), ("categoria", categoria_id)),
     )
 
 
@@ -89,44 +167,74 @@ def listar_produtos(
     response_model=ProdutoListResponse,
     tags=["Catálogo"],
 )
-def listar_produtos_publicos_por_slug(
+async def listar_produtos_publicos_por_slug(
     merchant_slug: str,
+    request: Request,
+    background_tasks: BackgroundTasks,
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
+    cursor: str | None = None,
+    count: CountMode = Depends(get_count_mode),
     categoria_id: UUID | None = None,
     search: str | None = Query(default=None, min_length=2),
-    tenant: TenantContext = Depends(get_tenant),
-    db: Session = Depends(get_db),
+    q: str | None = Query(default=None, min_length=2, description="Pesquisa full-text ordenada por relevância"),
+    tenant: TenantContext = Depends(get_async_tenant),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    merchant = (
-        db.query(models.Merchant)
-        .filter(models.Merchant.tenant_id == tenant.id, models.Merchant.slug == merchant_slug)
-        .first()
+    merchant_id = (
+        select(models.Merchant.id)
+        .where(models.Merchant.tenant_id == tenant.id, models.Merchant.slug == merchant_slug)
+        .scalar_subquery()
     )
-    if not merchant:
-        raise HTTPException(status_code=404, detail="Merchant não encontrado")
-
-    query = (
-        db.query(models.Produto)
-        .filter(
-            models.Produto.tenant_id == tenant.id,
-            models.Produto.merchant_id == merchant.id,
-            models.Produto.ativo.is_(True),
-            models.Produto.disponivel.is_(True),
-        )
-        .order_by(models.Produto.nome)
+    stmt = select(models.Produto).where(
+        models.Produto.tenant_id == tenant.id,
+        models.Produto.merchant_id == merchant_id,
+        models.Produto.ativo.is_(True),
+        models.Produto.disponivel.is_(True),
     )
     if categoria_id:
-        query = query.filter(models.Produto.categoria_id == categoria_id)
+        stmt = stmt.where(models.Produto.categoria_id == categoria_id)
     if search:
         ilike = f"%{search.lower()}%"
-        query = query.filter(models.Produto.nome.ilike(ilike))
-
-    total, total_pages, produtos = _paginate(query, page, page_size)
-    return ProdutoListResponse(
-        total=total,
-        items=produtos,
-        page=page,
-        page_size=page_size,
-        total_pages=total_pages,
+        stmt = stmt.where(models.Produto.nome.ilike(ilike))
+    if q:
+        stmt = search_service.apply_search(stmt, models.Produto, q, dialect_name=db.get_bind().dialect.name)
+
+    async def carregar(session: AsyncSession) -> ProdutoListResponse:
+        if await session.scalar(select(merchant_id)) is None:
+            raise HTTPException(status_code=404, detail="Merchant não encontrado")
+
+        resultado = await paginate_async(
+            session,
+            # `ProdutoOut.stock_disponivel` precisa das reservas; só a página as carrega, não os validadores.
+            stmt.options(undefer(models.Produto.stock_reservado)),
+            page=page,
+            page_size=page_size,
+            keyset=None if q else PRODUTO_KEYSET,
+            cursor=cursor,
+            count=count,
+            filtered=bool(categoria_id or search or q),
+        )
+        return ProdutoListResponse(
+            total=resultado.total,
+            items=resultado.items,
+            page=resultado.page,
+            page_size=page_size,
+            total_pages=resultado.total_pages,
+            has_next=resultado.has_next,
+            next_cursor=resultado.next_cursor,
+        )
+
+    return await response_cache.cached_response(
+        request,
+        db=db,
+        tenant_id=tenant.id,
+        tags=[
+            response_cache.merchant_slug_tag(tenant.id, merchant_slug),
+            response_cache.tenant_tag(tenant.id, "stock"),
+        ],
+        loader=carregar,
+        background_tasks=background_tasks,
+        validators_from=stmt,
+        surrogate_keys=_chaves_produtos(tenant.id, ("categoria", categoria_id)),
     )
@@ -2,33 +2,78 @@
 
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Header, Response
 from sqlalchemy.orm import Session
 
 from app.core.deps import TenantContext, get_current_active_tenant, get_current_cliente, get_db
-from app.schemas.checkout import CheckoutRequest, PedidoOut
-from app.services.checkout_service import create_pedido
+from app.schemas.checkout import CheckoutQuoteOut, CheckoutQuoteRequest, CheckoutRequest, PedidoOut
+from app.services import idempotency_service
+from app.services.cart_store import CartStore, get_cart_store
+from app.services.checkout_service import cotar_pedido, create_pedido
 
 router = APIRouter()
 
 
-@router.post("/", response_model=PedidoOut)
-def checkout(
-    payload: CheckoutRequest | None = None,
+@router.post("/quote", response_model=CheckoutQuoteOut)
+def checkout_quote(
+    payload: CheckoutQuoteRequest | None = None,
     db: Session = Depends(get_db),
     tenant: TenantContext = Depends(get_current_active_tenant),
     cliente=Depends(get_current_cliente),
+    store: CartStore = Depends(get_cart_store),
 ):
-    """Cria um pedido validando preços no servidor e limpa o carrinho."""
+    """Valida e precifica os itens (ou o carrinho) sem criar o pedido; devolve um token de cotação."""
 
-    pedido = create_pedido(
+    return cotar_pedido(
         db=db,
         tenant_id=tenant.id,
         cliente=cliente,
         itens_payload=payload.itens if payload else None,
-        origem=payload.origem if payload else None,
-        metodo_pagamento=payload.metodo_pagamento if payload else None,
-        estado_pagamento=payload.estado_pagamento if payload else None,
-        endereco_id=payload.endereco_id if payload else None,
+        store=store,
+    )
+
+
+@router.post("/", response_model=PedidoOut)
+def checkout(
+    response: Response,
+    payload: CheckoutRequest | None = None,
+    idempotency_key: str | None = Header(default=None, alias="Idempotency-Key", max_length=255),
+    db: Session = Depends(get_db),
+    tenant: TenantContext = Depends(get_current_active_tenant),
+    cliente=Depends(get_current_cliente),
+    store: CartStore = Depends(get_cart_store),
+):
+    """Cria um pedido validando preços no servidor e limpa o carrinho.
+
+    Com `Idempotency-Key`, repetições do mesmo pedido devolvem a resposta original.
+    """
+
+    def _criar():
+        return create_pedido(
+            db=db,
+            tenant_id=tenant.id,
+            cliente=cliente,
+            itens_payload=payload.itens if payload else None,
+            origem=payload.origem if payload else None,
+            metodo_pagamento=payload.metodo_pagamento if payload else None,
+            estado_pagamento=payload.estado_pagamento if payload else None,
+            endereco_id=payload.endereco_id if payload else None,
+            store=store,
+            quote_token=payload.quote_token if payload else None,
+        )
+
+    if idempotency_key is None:
+        return _criar()
+    resposta, repetida = idempotency_service.executar(
+        db,
+        tenant_id=tenant.id,
+        cliente_id=cliente.id,
+        chave=idempotency_key,
+        request_hash=idempotency_service.hash_pedido(
+            "POST /checkout/", payload.model_dump(mode="json") if payload else None
+        ),
+        operacao=lambda: PedidoOut.model_validate(_criar()).model_dump(mode="json"),
     )
-    return pedido
+    if repetida:
+        response.headers["Idempotent-Replayed"] = "true"
+    return resposta
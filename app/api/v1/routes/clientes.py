@@ -5,10 +5,18 @@ from __future__ import annotations
 from datetime import datetime, timezone
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
 
 from app.core.deps import get_current_active_tenant, get_current_cliente, get_db
+from app.core.pagination import (
+    ListFormat,
+    apply_keyset,
+    get_list_limit,
+    keyset_list,
+    set_next_cursor,
+    stream_ndjson,
+)
 from app.domain.enums import AgendamentoStatus
 from app.infrastructure.db import models
 from app.schemas.cliente import (
@@ -22,6 +30,9 @@ from app.schemas.agendamento import AgendamentoCancelCliente, AgendamentoOut
 
 router = APIRouter()
 
+ENDERECO_KEYSET = (models.ClienteEndereco.created_at, models.ClienteEndereco.id)
+AGENDAMENTO_KEYSET = (models.Agendamento.data_hora, models.Agendamento.id)
+
 
 @router.get("/me/cliente", response_model=ClienteOut)
 def get_me(cliente: models.Cliente = Depends(get_current_cliente)):
@@ -78,16 +89,19 @@ def _get_agendamento_cliente(
 
 
 @router.get("/me/enderecos", response_model=list[ClienteEnderecoOut])
-def list_enderecos(cliente: models.Cliente = Depends(get_current_cliente), db: Session = Depends(get_db)):
-    enderecos = (
-        db.query(models.ClienteEndereco)
-        .filter(
-            models.ClienteEndereco.cliente_id == cliente.id,
-            models.ClienteEndereco.tenant_id == cliente.tenant_id,
-        )
-        .order_by(models.ClienteEndereco.created_at.desc())
-        .all()
+def list_enderecos(
+    response: Response,
+    cursor: str | None = None,
+    limit: int = Depends(get_list_limit),
+    cliente: models.Cliente = Depends(get_current_cliente),
+    db: Session = Depends(get_db),
+):
+    query = db.query(models.ClienteEndereco).filter(
+        models.ClienteEndereco.cliente_id == cliente.id,
+        models.ClienteEndereco.tenant_id == cliente.tenant_id,
     )
+    enderecos, next_cursor = keyset_list(query, keyset=ENDERECO_KEYSET, cursor=cursor, limit=limit, descending=True)
+    set_next_cursor(response, next_cursor)
     return enderecos
 
 
@@ -159,20 +173,20 @@ def delete_endereco(
 
 @router.get("/me/agendamentos", response_model=list[AgendamentoOut])
 def list_agendamentos_cliente(
+    response: Response,
     status_filter: AgendamentoStatus | None = Query(default=None, alias="status"),
     inicio: datetime | None = None,
     fim: datetime | None = None,
+    cursor: str | None = None,
+    limit: int = Depends(get_list_limit),
+    formato: ListFormat = Query(default="json", alias="format"),
     cliente: models.Cliente = Depends(get_current_cliente),
     tenant=Depends(get_current_active_tenant),
     db: Session = Depends(get_db),
 ):
-    query = (
-        db.query(models.Agendamento)
-        .filter(
-            models.Agendamento.tenant_id == tenant.id,
-            models.Agendamento.cliente_id == cliente.id,
-        )
-        .order_by(models.Agendamento.data_hora.desc())
+    query = db.query(models.Agendamento).filter(
+        models.Agendamento.tenant_id == tenant.id,
+        models.Agendamento.cliente_id == cliente.id,
     )
     if status_filter:
         query = query.filter(models.Agendamento.status == status_filter)
@@ -180,7 +194,14 @@ def list_agendamentos_cliente(
         query = query.filter(models.Agendamento.data_hora >= inicio)
     if fim:
         query = query.filter(models.Agendamento.data_hora <= fim)
-    return query.all()
+    if formato == "ndjson":
+        return stream_ndjson(apply_keyset(query, AGENDAMENTO_KEYSET, cursor, descending=True), AgendamentoOut)
+
+    agendamentos, next_cursor = keyset_list(
+        query, keyset=AGENDAMENTO_KEYSET, cursor=cursor, limit=limit, descending=True
+    )
+    set_next_cursor(response, next_cursor)
+    return agendamentos
 
 
 @router.patch("/me/agendamentos/{agendamento_id}/cancelar", response_model=AgendamentoOut)
@@ -2,10 +2,10 @@
 
 from __future__ import annotations
 
-from datetime import datetime, timezone
+from datetime import date, datetime, timedelta, timezone
 
-from fastapi import APIRouter, Depends
-from sqlalchemy import func
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import String, func, literal, null, select, type_coerce, union_all
 from sqlalchemy.orm import Session
 
 from app.core.deps import (
@@ -16,29 +16,101 @@ from app.core.deps import (
     get_db,
 )
 from app.infrastructure.db import models
+from app.infrastructure.db.types import GUID
 from app.domain.enums import PedidoStatus
 from app.schemas import dashboard as dashboard_schemas
+from app.services import kpi_service
 
 router = APIRouter()
 
 
 PAID_PEDIDO_STATUSES: tuple[PedidoStatus, ...] = (PedidoStatus.PAGO,)
 
+# Intervalo por omissão das séries (em buckets) e máximo de buckets por pedido.
+SERIES_BUCKETS_PADRAO = {"day": 30, "week": 12, "month": 12}
+SERIES_MAX_BUCKETS = 400
 
-def _merchant_pedidos_query(db: Session, tenant: TenantContext, merchant: models.Merchant):
-    return (
-        db.query(models.Pedido)
-        .join(models.ItemPedido, models.ItemPedido.pedido_id == models.Pedido.id)
-        .join(
-            models.Produto,
-            (models.ItemPedido.ref_id == models.Produto.id)
-            & (models.ItemPedido.tipo == "produto"),
+
+def _inicio_bucket(dia: date, granularity: str) -> date:
+    if granularity == "week":
+        return dia - timedelta(days=dia.weekday())
+    if granularity == "month":
+        return dia.replace(day=1)
+    return dia
+
+
+def _proximo_bucket(inicio: date, granularity: str) -> date:
+    if granularity == "week":
+        return inicio + timedelta(days=7)
+    if granularity == "month":
+        return (inicio.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return inicio + timedelta(days=1)
+
+
+def _buckets(
+    tenant: TenantContext, granularity: str, inicio: date | None, fim: date | None
+) -> tuple[date, date, list[date]]:
+    """Resolve o intervalo (dias locais do tenant) e devolve o início de cada bucket."""
+
+    fim = fim or datetime.now(kpi_service.zona_horaria(tenant.timezone)).date()
+    if inicio is None:
+        inicio = _inicio_bucket(fim, granularity)
+        for _ in range(SERIES_BUCKETS_PADRAO[granularity] - 1):
+            inicio = _inicio_bucket(inicio - timedelta(days=1), granularity)
+    if inicio > fim:
+        raise HTTPException(status_code=400, detail="Intervalo inválido")
+    buckets = [_inicio_bucket(inicio, granularity)]
+    while (seguinte := _proximo_bucket(buckets[-1], granularity)) <= fim:
+        buckets.append(seguinte)
+        if len(buckets) > SERIES_MAX_BUCKETS:
+            raise HTTPException(status_code=400, detail="Intervalo demasiado grande para a granularidade")
+    return inicio, fim, buckets
+
+
+def _merchant_kpis_stmt(tenant: TenantContext, merchant: models.Merchant):
+    """Contagens/faturação por status e top 3 de produtos num único statement sobre os rollups.
+
+    As duas agregações são unidas com `UNION ALL` e distinguidas pela coluna `grupo`; a faturação
+    paga é a soma das linhas de status pagos, pelo que não precisa de query própria.
+    """
+
+    kpis = models.MerchantKpiDiario
+    vendas = models.MerchantProdutoVendas
+    por_status = (
+        select(
+            literal("status").label("grupo"),
+            kpis.status.label("status"),
+            type_coerce(null(), GUID()).label("produto_id"),
+            type_coerce(null(), String()).label("nome"),
+            func.sum(kpis.pedidos).label("total"),
+            func.sum(kpis.faturacao).label("faturacao"),
         )
-        .filter(
-            models.Pedido.tenant_id == tenant.id,
-            models.Produto.merchant_id == merchant.id,
+        .where(kpis.tenant_id == tenant.id, kpis.merchant_id == merchant.id)
+        .group_by(kpis.status)
+    )
+    total_vendido = func.sum(vendas.quantidade)
+    top = (
+        select(vendas.produto_id, total_vendido.label("total"))
+        .where(
+            vendas.tenant_id == tenant.id,
+            vendas.merchant_id == merchant.id,
+            vendas.status.in_(PAID_PEDIDO_STATUSES),
         )
+        .group_by(vendas.produto_id)
+        .having(total_vendido > 0)
+        .order_by(total_vendido.desc())
+        .limit(3)
+        .subquery()
     )
+    top_produtos = select(
+        literal("produto"),
+        null(),
+        top.c.produto_id,
+        models.Produto.nome,
+        top.c.total,
+        null(),
+    ).join(models.Produto, models.Produto.id == top.c.produto_id)
+    return union_all(por_status, top_produtos)
 
 
 @router.get("/merchant/me/resumo", response_model=dashboard_schemas.MerchantSummary)
@@ -47,80 +119,48 @@ def merchant_summary(
     tenant: TenantContext = Depends(get_current_active_tenant),
     merchant: models.Merchant = Depends(get_current_merchant),
 ):
-    """Calcula KPIs principais para o merchant autenticado."""
+    """Calcula KPIs principais para o merchant autenticado.
 
-    status_counts_rows = (
-        _merchant_pedidos_query(db, tenant, merchant)
-        .with_entities(
-            models.Pedido.status,
-            func.count(func.distinct(models.Pedido.id)).label("total_por_status"),
-        )
-        .group_by(models.Pedido.status)
-        .all()
-    )
-    total_por_status = {status.value: int(count) for status, count in status_counts_rows}
+    Os agregados vêm dos rollups (`kpi_service`) num único statement; os últimos pedidos são lidos
+    dos sub-pedidos do merchant (`pedidos_merchant`), pelo que o custo não cresce com o histórico.
+    """
+
+    total_por_status: dict[str, int] = {}
+    faturacao_total = 0
+    top_produtos = []
+    for row in db.execute(_merchant_kpis_stmt(tenant, merchant)):
+        if row.grupo == "status":
+            if row.total:
+                total_por_status[row.status.value] = int(row.total)
+            if row.status in PAID_PEDIDO_STATUSES:
+                faturacao_total += row.faturacao or 0
+        else:
+            top_produtos.append(
+                {"produto_id": row.produto_id, "nome": row.nome, "total_vendido": int(row.total or 0)}
+            )
+    top_produtos.sort(key=lambda produto: produto["total_vendido"], reverse=True)
 
     total_pedidos = sum(
         total_por_status.get(status.value, 0) for status in PAID_PEDIDO_STATUSES
     )
 
-    faturacao_total = (
-        db.query(func.coalesce(func.sum(models.ItemPedido.preco_unitario * models.ItemPedido.quantidade), 0))
-        .join(models.Pedido, models.ItemPedido.pedido_id == models.Pedido.id)
-        .join(
-            models.Produto,
-            (models.ItemPedido.ref_id == models.Produto.id) & (models.ItemPedido.tipo == "produto"),
-        )
-        .filter(
-            models.ItemPedido.tenant_id == tenant.id,
-            models.Produto.merchant_id == merchant.id,
-            models.Pedido.status.in_(PAID_PEDIDO_STATUSES),
-        )
-        .scalar()
-        or 0
-    )
-
-    top_produtos_rows = (
-        db.query(
-            models.Produto.id.label("produto_id"),
-            models.Produto.nome,
-            func.sum(models.ItemPedido.quantidade).label("total_vendido"),
-        )
-        .join(
-            models.ItemPedido,
-            (models.ItemPedido.ref_id == models.Produto.id) & (models.ItemPedido.tipo == "produto"),
-        )
-        .join(models.Pedido, models.ItemPedido.pedido_id == models.Pedido.id)
-        .filter(models.Produto.merchant_id == merchant.id, models.Produto.tenant_id == tenant.id)
-        .filter(models.Pedido.status.in_(PAID_PEDIDO_STATUSES))
-        .group_by(models.Produto.id, models.Produto.nome)
-        .order_by(func.sum(models.ItemPedido.quantidade).desc())
-        .limit(3)
-        .all()
-    )
-    top_produtos = [
-        {
-            "produto_id": row.produto_id,
-            "nome": row.nome,
-            "total_vendido": int(row.total_vendido or 0),
-        }
-        for row in top_produtos_rows
-    ]
-
+    sub_pedido = models.PedidoMerchant
     ultimos_pedidos_rows = (
-        _merchant_pedidos_query(db, tenant, merchant)
-        .order_by(models.Pedido.created_at.desc())
+        db.query(sub_pedido.pedido_id, models.Pedido.total, models.Pedido.created_at, sub_pedido.status)
+        .join(models.Pedido, models.Pedido.id == sub_pedido.pedido_id)
+        .filter(sub_pedido.tenant_id == tenant.id, sub_pedido.merchant_id == merchant.id)
+        .order_by(sub_pedido.created_at.desc())
         .limit(5)
         .all()
     )
     ultimos_pedidos = [
         {
-            "pedido_id": pedido.id,
-            "total": float(pedido.total),
-            "data": pedido.created_at,
-            "status": pedido.status.value,
+            "pedido_id": row.pedido_id,
+            "total": float(row.total),
+            "data": row.created_at,
+            "status": row.status.value,
         }
-        for pedido in ultimos_pedidos_rows
+        for row in ultimos_pedidos_rows
     ]
 
     return {
@@ -133,6 +173,54 @@ def merchant_summary(
     }
 
 
+@router.get("/merchant/me/series", response_model=dashboard_schemas.MerchantSeries)
+def merchant_series(
+    granularity: dashboard_schemas.Granularidade = "day",
+    inicio: date | None = Query(default=None, alias="from"),
+    fim: date | None = Query(default=None, alias="to"),
+    db: Session = Depends(get_db),
+    tenant: TenantContext = Depends(get_current_active_tenant),
+    merchant: models.Merchant = Depends(get_current_merchant),
+):
+    """Faturação, pedidos pagos e itens vendidos por dia/semana/mês (dias locais do tenant).
+
+    Lê os agregados diários (`merchant_kpis_diarios`) do intervalo e agrupa-os em memória.
+    """
+
+    inicio, fim, buckets = _buckets(tenant, granularity, inicio, fim)
+    kpis = models.MerchantKpiDiario
+    diarios = (
+        db.query(kpis.dia, func.sum(kpis.pedidos), func.sum(kpis.faturacao), func.sum(kpis.itens))
+        .filter(
+            kpis.tenant_id == tenant.id,
+            kpis.merchant_id == merchant.id,
+            kpis.status.in_(PAID_PEDIDO_STATUSES),
+            kpis.dia >= inicio,
+            kpis.dia <= fim,
+        )
+        .group_by(kpis.dia)
+        .all()
+    )
+    valores = {bucket: [0, 0.0, 0] for bucket in buckets}
+    for dia, pedidos, faturacao, itens in diarios:
+        valor = valores[_inicio_bucket(dia, granularity)]
+        valor[0] += int(pedidos or 0)
+        valor[1] += float(faturacao or 0)
+        valor[2] += int(itens or 0)
+
+    return {
+        "merchant_id": merchant.id,
+        "granularity": granularity,
+        "timezone": tenant.timezone,
+        "inicio": inicio,
+        "fim": fim,
+        "buckets": [
+            {"inicio": bucket, "pedidos": pedidos, "faturacao": faturacao, "itens": itens}
+            for bucket, (pedidos, faturacao, itens) in valores.items()
+        ],
+    }
+
+
 @router.get("/prestador/me/resumo")
 def prestador_summary(
     db: Session = Depends(get_db),
@@ -142,15 +230,15 @@ def prestador_summary(
     """Mostra estatísticas básicas para o prestador autenticado."""
 
     status_counts = (
-        db.query(models.Agendamento.status, func.count(models.Agendamento.id))
+        db.query(models.PrestadorKpi.status, func.sum(models.PrestadorKpi.agendamentos))
         .filter(
-            models.Agendamento.tenant_id == tenant.id,
-            models.Agendamento.prestador_id == prestador.id,
+            models.PrestadorKpi.tenant_id == tenant.id,
+            models.PrestadorKpi.prestador_id == prestador.id,
         )
-        .group_by(models.Agendamento.status)
+        .group_by(models.PrestadorKpi.status)
         .all()
     )
-    total_por_status = {status.value: count for status, count in status_counts}
+    total_por_status = {status.value: int(count) for status, count in status_counts if count}
 
     proximos = (
         db.query(models.Agendamento)
@@ -179,3 +267,45 @@ def prestador_summary(
         "total_por_status": total_por_status,
         "proximos_agendamentos": proximos_agendamentos,
     }
+
+
+@router.get("/prestador/me/series", response_model=dashboard_schemas.PrestadorSeries)
+def prestador_series(
+    granularity: dashboard_schemas.Granularidade = "day",
+    inicio: date | None = Query(default=None, alias="from"),
+    fim: date | None = Query(default=None, alias="to"),
+    db: Session = Depends(get_db),
+    tenant: TenantContext = Depends(get_current_active_tenant),
+    prestador: models.PrestadorServico = Depends(get_current_prestador),
+):
+    """Agendamentos por dia/semana/mês da data do agendamento (dias locais do tenant)."""
+
+    inicio, fim, buckets = _buckets(tenant, granularity, inicio, fim)
+    kpis = models.PrestadorKpi
+    diarios = (
+        db.query(kpis.dia, kpis.status, kpis.agendamentos)
+        .filter(
+            kpis.tenant_id == tenant.id,
+            kpis.prestador_id == prestador.id,
+            kpis.dia >= inicio,
+            kpis.dia <= fim,
+        )
+        .all()
+    )
+    por_status: dict[date, dict[str, int]] = {bucket: {} for bucket in buckets}
+    for dia, status, agendamentos in diarios:
+        if agendamentos:
+            contagens = por_status[_inicio_bucket(dia, granularity)]
+            contagens[status.value] = contagens.get(status.value, 0) + agendamentos
+
+    return {
+        "prestador_id": prestador.id,
+        "granularity": granularity,
+        "timezone": tenant.timezone,
+        "inicio": inicio,
+        "fim": fim,
+        "buckets": [
+            {"inicio": bucket, "total": sum(contagens.values()), "por_status": contagens}
+            for bucket, contagens in por_status.items()
+        ],
+    }
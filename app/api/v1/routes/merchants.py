@@ -2,20 +2,25 @@
 
 from __future__ import annotations
 
-from datetime import datetime
+from datetime import datetime, timezone
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy import func
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, contains_eager, undefer
 
 from app.core.deps import (
     TenantContext,
+    Principal,
+    get_async_db,
+    get_async_tenant,
     get_current_active_tenant,
-    get_current_user,
+    get_current_principal,
     get_db,
-    get_tenant,
 )
+from app.core import http_cache, response_cache
+from app.core.pagination import CountMode, get_count_mode, paginate, paginate_async
 from app.infrastructure.db import models
 from app.schemas import merchant as merchant_schemas
 from app.schemas.merchant import (
@@ -30,111 +35,105 @@ from app.schemas.merchant import (
 )
 from app.schemas.pedido import PedidoDetalhe, PedidoResumo, PedidoStatusUpdate
 from app.domain.enums import PedidoStatus, UserRole
+from app.services import kpi_service, search_service, stock_service
 
 router = APIRouter()
 
+MERCHANT_KEYSET = (models.Merchant.nome, models.Merchant.id)
+PRODUTO_KEYSET = (models.Produto.nome, models.Produto.id)
+
 
 @router.get("/", response_model=merchant_schemas.MerchantListResponse)
-def list_merchants(
+async def list_merchants(
+    request: Request,
+    background_tasks: BackgroundTasks,
     destaque: bool | None = None,
     tipo: str | None = None,
     search: str | None = Query(default=None, min_length=2),
+    fuzzy: bool = Query(default=False, description="Tolera erros de escrita em `search` (semelhança de trigramas)"),
     page: int = Query(default=1, ge=1),
     page_size: int = Query(default=20, ge=1, le=100),
-    tenant: TenantContext = Depends(get_tenant),
-    db: Session = Depends(get_db),
+    cursor: str | None = None,
+    count: CountMode = Depends(get_count_mode),
+    tenant: TenantContext = Depends(get_async_tenant),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Lista merchants do tenant ativo com filtros opcionais."""
 
-    query = db.query(models.Merchant).filter(models.Merchant.tenant_id == tenant.id)
-
-    if destaque is not None:
-        query = query.filter(models.Merchant.destaque == destaque)
-    if tipo:
-        query = query.filter(models.Merchant.tipo == tipo)
-    if search:
-        ilike = f"%{search.lower()}%"
-        query = query.filter(func.lower(models.Merchant.nome).like(ilike))
-
-    total = query.count()
-    offset = (page - 1) * page_size
-    merchants = query.offset(offset).limit(page_size).all()
-    total_pages = (total + page_size - 1) // page_size if total else 0
+    async def carregar(session: AsyncSession) -> merchant_schemas.MerchantListResponse:
+        stmt = select(models.Merchant).where(models.Merchant.tenant_id == tenant.id)
+
+        if destaque is not None:
+            stmt = stmt.where(models.Merchant.destaque == destaque)
+        if tipo:
+            stmt = stmt.where(models.Merchant.tipo == tipo)
+        if search:
+            stmt = search_service.apply_name_search(
+                stmt, models.Merchant, search, fuzzy=fuzzy, dialect_name=session.get_bind().dialect.name
+            )
+
+        resultado = await paginate_async(
+            session,
+            stmt,
+            page=page,
+            page_size=page_size,
+            keyset=None if search else MERCHANT_KEYSET,
+            cursor=cursor,
+            count=count,
+            filtered=any(value is not None for value in (destaque, tipo, search)),
+        )
+        return merchant_schemas.MerchantListResponse(
+            items=resultado.items,
+            total=resultado.total,
+            page=resultado.page,
+            page_size=page_size,
+            total_pages=resultado.total_pages,
+            has_next=resultado.has_next,
+            next_cursor=resultado.next_cursor,
+        )
 
-    return merchant_schemas.MerchantListResponse(
-        items=merchants,
-        total=total,
-        page=page,
-        page_size=page_size,
-        total_pages=total_pages,
+    return await response_cache.cached_response(
+        request,
+        db=db,
+        tenant_id=tenant.id,
+        tags=[response_cache.tenant_tag(tenant.id, "merchants")],
+        loader=carregar,
+        background_tasks=background_tasks,
     )
 
 
 @router.get("/{merchant_identifier}", response_model=merchant_schemas.MerchantOut)
-def get_merchant(
+async def get_merchant(
     merchant_identifier: str,
-    tenant: TenantContext = Depends(get_tenant),
-    db: Session = Depends(get_db),
+    request: Request,
+    background_tasks: BackgroundTasks,
+    tenant: TenantContext = Depends(get_async_tenant),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Obtém um merchant por UUID ou slug dentro do tenant atual."""
 
-    query = db.query(models.Merchant).filter(models.Merchant.tenant_id == tenant.id)
-    merchant = None
+    stmt = select(models.Merchant).where(models.Merchant.tenant_id == tenant.id)
     try:
         merchant_uuid = UUID(merchant_identifier)
-        merchant = query.filter(models.Merchant.id == merchant_uuid).first()
+        stmt = stmt.where(models.Merchant.id == merchant_uuid)
     except ValueError:
-        merchant = query.filter(models.Merchant.slug == merchant_identifier).first()
-
-    if not merchant:
-        raise HTTPException(status_code=404, detail="Merchant não encontrado")
-    return merchant
-
-
-@router.get("/{merchant_id}/produtos", response_model=ProdutoListResponse)
-def list_produtos_privado(
-    merchant_id: UUID,
-    page: int = Query(1, ge=1),
-    page_size: int = Query(20, ge=1, le=100),
-    categoria_id: UUID | None = None,
-    nome: str | None = Query(default=None, min_length=2),
-    ativo: bool | None = None,
-    disponivel: bool | None = None,
-    tenant: TenantContext = Depends(get_current_active_tenant),
-    user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db),
-):
-    """Lista privada de produtos para gestão do merchant."""
+        stmt = stmt.where(models.Merchant.slug == merchant_identifier)
 
-    _get_merchant_for_user(merchant_id=merchant_id, tenant=tenant, db=db, user=user)
-    query = (
-        db.query(models.Produto)
-        .filter(
-            models.Produto.tenant_id == tenant.id,
-            models.Produto.merchant_id == merchant_id,
-        )
-        .order_by(models.Produto.nome)
-    )
-    if categoria_id:
-        query = query.filter(models.Produto.categoria_id == categoria_id)
-    if nome:
-        ilike = f"%{nome.lower()}%"
-        query = query.filter(models.Produto.nome.ilike(ilike))
-    if ativo is not None:
-        query = query.filter(models.Produto.ativo == ativo)
-    if disponivel is not None:
-        query = query.filter(models.Produto.disponivel == disponivel)
+    async def carregar(session: AsyncSession) -> merchant_schemas.MerchantOut:
+        merchant = (await session.scalars(stmt.limit(1))).first()
+        if not merchant:
+            raise HTTPException(status_code=404, detail="Merchant não encontrado")
+        return merchant_schemas.MerchantOut.model_validate(merchant)
 
-    total = query.count()
-    offset = (page - 1) * page_size
-    produtos = query.offset(offset).limit(page_size).all()
-    total_pages = (total + page_size - 1) // page_size if page_size else 1
-    return ProdutoListResponse(
-        total=total,
-        items=produtos,
-        page=page,
-        page_size=page_size,
-        total_pages=total_pages,
+    return await response_cache.cached_response(
+        request,
+        db=db,
+        tenant_id=tenant.id,
+        tags=[response_cache.tenant_tag(tenant.id, "merchants")],
+        loader=carregar,
+        background_tasks=background_tasks,
+        validators_from=stmt,
+        surrogate_keys=lambda merchant: [http_cache.tenant_key(tenant.id), http_cache.merchant_key(merchant.id)],
     )
 
 
@@ -142,8 +141,11 @@ def list_produtos_privado(
 
 
 def _get_merchant_for_user(
-    *, merchant_id: UUID, tenant: TenantContext, db: Session, user: models.User
+    *, merchant_id: UUID, tenant: TenantContext, db: Session, principal: Principal
 ) -> models.Merchant:
+    own = principal.merchant
+    if own is not None and own.id == merchant_id and own.tenant_id == tenant.id:
+        return own
     merchant = (
         db.query(models.Merchant)
         .filter(models.Merchant.tenant_id == tenant.id, models.Merchant.id == merchant_id)
@@ -151,15 +153,20 @@ def _get_merchant_for_user(
     )
     if not merchant:
         raise HTTPException(status_code=404, detail="Merchant não encontrado")
-    if user.role == UserRole.MERCHANT and merchant.owner_id != user.id:
+    if principal.claims.role == UserRole.MERCHANT and merchant.owner_id != principal.claims.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Sem permissão para este merchant")
     return merchant
 
 
 def _produto_base_query(db: Session, tenant_id: UUID, merchant_id: UUID):
-    return db.query(models.Produto).filter(
-        models.Produto.tenant_id == tenant_id,
-        models.Produto.merchant_id == merchant_id,
+    # `ProdutoOut.stock_disponivel` precisa das reservas, carregadas no mesmo SELECT.
+    return (
+        db.query(models.Produto)
+        .options(undefer(models.Produto.stock_reservado))
+        .filter(
+            models.Produto.tenant_id == tenant_id,
+            models.Produto.merchant_id == merchant_id,
+        )
     )
 
 
@@ -169,37 +176,59 @@ def _get_produto(
     tenant: TenantContext,
     merchant_id: UUID,
     produto_id: UUID,
-    user: models.User,
+    principal: Principal,
 ) -> models.Produto:
-    _get_merchant_for_user(merchant_id=merchant_id, tenant=tenant, db=db, user=user)
+    _get_merchant_for_user(merchant_id=merchant_id, tenant=tenant, db=db, principal=principal)
     produto = _produto_base_query(db, tenant.id, merchant_id).filter(models.Produto.id == produto_id).first()
     if not produto:
         raise HTTPException(status_code=404, detail="Produto não encontrado")
     return produto
 
 
-def _get_owner_merchant(
-    *, tenant: TenantContext, user: models.User, db: Session
-) -> models.Merchant:
-    if user.role != UserRole.MERCHANT:
+def _get_owner_merchant(*, tenant: TenantContext, principal: Principal) -> models.Merchant:
+    if principal.claims.role != UserRole.MERCHANT:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Apenas merchants têm acesso")
-    merchant = (
-        db.query(models.Merchant)
-        .filter(models.Merchant.tenant_id == tenant.id, models.Merchant.owner_id == user.id)
-        .first()
-    )
-    if not merchant:
+    merchant = principal.merchant
+    if not merchant or merchant.tenant_id != tenant.id:
         raise HTTPException(status_code=404, detail="Merchant não encontrado para este utilizador")
     return merchant
 
 
-def _pedido_para_schema(pedido: models.Pedido, merchant_id: UUID) -> PedidoResumo:
-    itens = [item for item in pedido.itens if item.merchant_id == merchant_id]
+def _invalidar_catalogo(merchant: models.Merchant) -> None:
+    """Invalida as respostas em cache do catálogo público afetadas por escritas do merchant."""
+
+    response_cache.invalidate(
+        response_cache.tenant_tag(merchant.tenant_id, "produtos"),
+        response_cache.tenant_tag(merchant.tenant_id, "categorias"),
+        response_cache.merchant_tag(merchant.id),
+        response_cache.merchant_slug_tag(merchant.tenant_id, merchant.slug),
+    )
+
+
+def _itens_do_merchant(db: Session, pedido_ids: list[UUID], merchant_id: UUID) -> dict[UUID, list[models.ItemPedido]]:
+    """Itens do merchant nos pedidos indicados, numa única query, agrupados por pedido."""
+
+    por_pedido: dict[UUID, list[models.ItemPedido]] = {pedido_id: [] for pedido_id in pedido_ids}
+    if not pedido_ids:
+        return por_pedido
+    itens = db.scalars(
+        select(models.ItemPedido)
+        .where(models.ItemPedido.pedido_id.in_(pedido_ids), models.ItemPedido.merchant_id == merchant_id)
+        .order_by(models.ItemPedido.pedido_id, models.ItemPedido.id)
+    )
+    for item in itens:
+        por_pedido[item.pedido_id].append(item)
+    return por_pedido
+
+
+def _pedido_para_schema(sub_pedido: models.PedidoMerchant, itens: list[models.ItemPedido]) -> PedidoResumo:
+    pedido = sub_pedido.pedido
     return PedidoResumo(
         id=pedido.id,
         subtotal=pedido.subtotal,
         total=pedido.total,
-        status=pedido.status,
+        status=sub_pedido.status,
+        subtotal_merchant=sub_pedido.subtotal,
         estado_pagamento=pedido.estado_pagamento,
         origem=pedido.origem.value if hasattr(pedido.origem, "value") else pedido.origem,
         created_at=pedido.created_at,
@@ -219,10 +248,10 @@ def create_categoria(
     merchant_id: UUID,
     payload: CategoriaCreate,
     tenant: TenantContext = Depends(get_current_active_tenant),
-    user: models.User = Depends(get_current_user),
+    principal: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
-    merchant = _get_merchant_for_user(merchant_id=merchant_id, tenant=tenant, db=db, user=user)
+    merchant = _get_merchant_for_user(merchant_id=merchant_id, tenant=tenant, db=db, principal=principal)
     categoria = models.Categoria(
         tenant_id=tenant.id,
         merchant_id=merchant.id,
@@ -235,6 +264,7 @@ def create_categoria(
     db.add(categoria)
     db.commit()
     db.refresh(categoria)
+    _invalidar_catalogo(merchant)
     return categoria
 
 
@@ -247,10 +277,10 @@ def create_produto(
     merchant_id: UUID,
     payload: ProdutoCreate,
     tenant: TenantContext = Depends(get_current_active_tenant),
-    user: models.User = Depends(get_current_user),
+    principal: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
-    _get_merchant_for_user(merchant_id=merchant_id, tenant=tenant, db=db, user=user)
+    merchant = _get_merchant_for_user(merchant_id=merchant_id, tenant=tenant, db=db, principal=principal)
     if payload.merchant_id != merchant_id:
         raise HTTPException(status_code=400, detail="merchant_id do payload não corresponde ao path")
     produto = models.Produto(
@@ -272,8 +302,12 @@ def create_produto(
         ativo=payload.ativo,
     )
     db.add(produto)
+    if payload.stock_shards:
+        db.flush()
+        stock_service.configurar_stock(db, produto, shards=payload.stock_shards)
     db.commit()
     db.refresh(produto)
+    _invalidar_catalogo(merchant)
     return produto
 
 
@@ -282,16 +316,19 @@ def list_produtos_privado(
     merchant_id: UUID,
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
+    cursor: str | None = None,
+    count: CountMode = Depends(get_count_mode),
     categoria_id: UUID | None = None,
     nome: str | None = Query(default=None, min_length=2),
+    q: str | None = Query(default=None, min_length=2, description="Pesquisa full-text ordenada por relevância"),
     ativo: bool | None = None,
     disponivel: bool | None = None,
     tenant: TenantContext = Depends(get_current_active_tenant),
-    user: models.User = Depends(get_current_user),
+    principal: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
-    _get_merchant_for_user(merchant_id=merchant_id, tenant=tenant, db=db, user=user)
-    query = _produto_base_query(db, tenant.id, merchant_id).order_by(models.Produto.nome)
+    _get_merchant_for_user(merchant_id=merchant_id, tenant=tenant, db=db, principal=principal)
+    query = _produto_base_query(db, tenant.id, merchant_id)
     if categoria_id:
         query = query.filter(models.Produto.categoria_id == categoria_id)
     if nome:
@@ -301,17 +338,26 @@ def list_produtos_privado(
         query = query.filter(models.Produto.ativo == ativo)
     if disponivel is not None:
         query = query.filter(models.Produto.disponivel == disponivel)
+    if q:
+        query = search_service.apply_search(query, models.Produto, q, dialect_name=db.get_bind().dialect.name)
 
-    total = query.count()
-    offset = (page - 1) * page_size
-    produtos = query.offset(offset).limit(page_size).all()
-    total_pages = (total + page_size - 1) // page_size if page_size else 1
-    return ProdutoListResponse(
-        total=total,
-        items=produtos,
+    resultado = paginate(
+        query,
         page=page,
         page_size=page_size,
-        total_pages=total_pages,
+        keyset=None if q else PRODUTO_KEYSET,
+        cursor=cursor,
+        count=count,
+        filtered=any(value is not None for value in (categoria_id, nome, ativo, disponivel, q)),
+    )
+    return ProdutoListResponse(
+        total=resultado.total,
+        items=resultado.items,
+        page=resultado.page,
+        page_size=page_size,
+        total_pages=resultado.total_pages,
+        has_next=resultado.has_next,
+        next_cursor=resultado.next_cursor,
     )
 
 
@@ -320,10 +366,10 @@ def get_produto_privado(
     merchant_id: UUID,
     produto_id: UUID,
     tenant: TenantContext = Depends(get_current_active_tenant),
-    user: models.User = Depends(get_current_user),
+    principal: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
-    return _get_produto(db=db, tenant=tenant, merchant_id=merchant_id, produto_id=produto_id, user=user)
+    return _get_produto(db=db, tenant=tenant, merchant_id=merchant_id, produto_id=produto_id, principal=principal)
 
 
 @router.patch("/{merchant_id}/produtos/{produto_id}", response_model=ProdutoOut)
@@ -332,16 +378,24 @@ def update_produto(
     produto_id: UUID,
     payload: ProdutoUpdate,
     tenant: TenantContext = Depends(get_current_active_tenant),
-    user: models.User = Depends(get_current_user),
+    principal: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
-    produto = _get_produto(db=db, tenant=tenant, merchant_id=merchant_id, produto_id=produto_id, user=user)
+    produto = _get_produto(db=db, tenant=tenant, merchant_id=merchant_id, produto_id=produto_id, principal=principal)
     update_data = payload.model_dump(exclude_unset=True)
+    stock = update_data.pop("stock_atual", None)
+    shards = update_data.pop("stock_shards", None)
     for key, value in update_data.items():
         setattr(produto, key, value)
+    if produto.stock_shards or shards:
+        # Em modo hot item o stock vive nos shards: o total é redistribuído por eles.
+        stock_service.configurar_stock(db, produto, stock=stock, shards=shards)
+    elif stock is not None:
+        produto.stock_atual = stock
     db.add(produto)
     db.commit()
     db.refresh(produto)
+    _invalidar_catalogo(produto.merchant)
     return produto
 
 
@@ -350,13 +404,14 @@ def delete_produto(
     merchant_id: UUID,
     produto_id: UUID,
     tenant: TenantContext = Depends(get_current_active_tenant),
-    user: models.User = Depends(get_current_user),
+    principal: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
-    produto = _get_produto(db=db, tenant=tenant, merchant_id=merchant_id, produto_id=produto_id, user=user)
+    produto = _get_produto(db=db, tenant=tenant, merchant_id=merchant_id, produto_id=produto_id, principal=principal)
     produto.ativo = False
     db.add(produto)
     db.commit()
+    _invalidar_catalogo(produto.merchant)
     return None
 
 
@@ -371,6 +426,15 @@ MERCHANT_STATUS_ALLOWED = {
 }
 
 
+def _sub_pedidos_query(db: Session, tenant: TenantContext, merchant: models.Merchant):
+    return (
+        db.query(models.PedidoMerchant)
+        .join(models.PedidoMerchant.pedido)
+        .options(contains_eager(models.PedidoMerchant.pedido))
+        .filter(models.PedidoMerchant.tenant_id == tenant.id, models.PedidoMerchant.merchant_id == merchant.id)
+    )
+
+
 def _get_pedido_para_merchant(
     *,
     db: Session,
@@ -378,17 +442,18 @@ def _get_pedido_para_merchant(
     merchant: models.Merchant,
     pedido_id: UUID,
 ):
-    pedido = (
-        db.query(models.Pedido)
-        .filter(models.Pedido.tenant_id == tenant.id, models.Pedido.id == pedido_id)
-        .first()
-    )
-    if not pedido:
+    sub_pedido = _sub_pedidos_query(db, tenant, merchant).filter(models.PedidoMerchant.pedido_id == pedido_id).first()
+    if not sub_pedido:
         raise HTTPException(status_code=404, detail="Pedido não encontrado")
-    itens = [item for item in pedido.itens if item.merchant_id == merchant.id]
-    if not itens:
-        raise HTTPException(status_code=404, detail="Pedido não contém itens deste merchant")
-    return pedido, itens
+    return sub_pedido, _itens_do_merchant(db, [pedido_id], merchant.id)[pedido_id]
+
+
+def _sincronizar_status_pedido(pedido: models.Pedido) -> None:
+    """O status do pedido acompanha os sub-pedidos quando todos os merchants estão no mesmo status."""
+
+    estados = {sub_pedido.status for sub_pedido in pedido.sub_pedidos}
+    if len(estados) == 1:
+        pedido.status = estados.pop()
 
 
 @router.get("/me/pedidos", response_model=list[PedidoResumo])
@@ -402,51 +467,46 @@ def listar_pedidos_merchant(
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
     tenant: TenantContext = Depends(get_current_active_tenant),
-    user: models.User = Depends(get_current_user),
+    principal: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
-    merchant = _get_owner_merchant(tenant=tenant, user=user, db=db)
-    query = (
-        db.query(models.Pedido)
-        .join(models.ItemPedido)
-        .filter(
-            models.Pedido.tenant_id == tenant.id,
-            models.ItemPedido.merchant_id == merchant.id,
-        )
-    )
+    merchant = _get_owner_merchant(tenant=tenant, principal=principal)
+    # Um sub-pedido por pedido e merchant: status e datas de criação são lidos pelo índice da caixa de entrada.
+    query = _sub_pedidos_query(db, tenant, merchant)
     if status_filter:
-        query = query.filter(models.Pedido.status == status_filter)
+        query = query.filter(models.PedidoMerchant.status == status_filter)
     if estado_pagamento:
         query = query.filter(models.Pedido.estado_pagamento == estado_pagamento)
     if created_inicio:
-        query = query.filter(models.Pedido.created_at >= created_inicio)
+        query = query.filter(models.PedidoMerchant.created_at >= created_inicio)
     if created_fim:
-        query = query.filter(models.Pedido.created_at <= created_fim)
+        query = query.filter(models.PedidoMerchant.created_at <= created_fim)
     if confirmacao_inicio:
         query = query.filter(models.Pedido.data_confirmacao >= confirmacao_inicio)
     if confirmacao_fim:
         query = query.filter(models.Pedido.data_confirmacao <= confirmacao_fim)
 
-    query = query.distinct(models.Pedido.id).order_by(models.Pedido.created_at.desc())
+    query = query.order_by(models.PedidoMerchant.created_at.desc(), models.PedidoMerchant.id.desc())
     offset = (page - 1) * page_size
-    pedidos = query.offset(offset).limit(page_size).all()
+    sub_pedidos = query.offset(offset).limit(page_size).all()
 
-    return [_pedido_para_schema(pedido, merchant.id) for pedido in pedidos]
+    itens = _itens_do_merchant(db, [sub.pedido_id for sub in sub_pedidos], merchant.id)
+    return [_pedido_para_schema(sub, itens[sub.pedido_id]) for sub in sub_pedidos]
 
 
 @router.get("/me/pedidos/{pedido_id}", response_model=PedidoDetalhe)
 def obter_pedido_merchant(
     pedido_id: UUID,
     tenant: TenantContext = Depends(get_current_active_tenant),
-    user: models.User = Depends(get_current_user),
+    principal: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
-    merchant = _get_owner_merchant(tenant=tenant, user=user, db=db)
-    pedido, _ = _get_pedido_para_merchant(db=db, tenant=tenant, merchant=merchant, pedido_id=pedido_id)
-    resumo = _pedido_para_schema(pedido, merchant.id)
+    merchant = _get_owner_merchant(tenant=tenant, principal=principal)
+    sub_pedido, itens = _get_pedido_para_merchant(db=db, tenant=tenant, merchant=merchant, pedido_id=pedido_id)
+    resumo = _pedido_para_schema(sub_pedido, itens)
     return PedidoDetalhe(
         **resumo.model_dump(),
-        endereco_entrega_snapshot=pedido.endereco_entrega_snapshot,
+        endereco_entrega_snapshot=sub_pedido.pedido.endereco_entrega_snapshot,
     )
 
 
@@ -455,21 +515,27 @@ def atualizar_status_pedido(
     pedido_id: UUID,
     payload: PedidoStatusUpdate,
     tenant: TenantContext = Depends(get_current_active_tenant),
-    user: models.User = Depends(get_current_user),
+    principal: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
     if payload.status not in MERCHANT_STATUS_ALLOWED:
         raise HTTPException(status_code=400, detail="Status não permitido para o merchant")
-    merchant = _get_owner_merchant(tenant=tenant, user=user, db=db)
-    pedido, _ = _get_pedido_para_merchant(db=db, tenant=tenant, merchant=merchant, pedido_id=pedido_id)
-    pedido.status = payload.status
-    db.add(pedido)
+    merchant = _get_owner_merchant(tenant=tenant, principal=principal)
+    sub_pedido, _ = _get_pedido_para_merchant(db=db, tenant=tenant, merchant=merchant, pedido_id=pedido_id)
+    # Só a parte deste merchant muda; os sub-pedidos dos outros merchants mantêm o seu status.
+    anterior = sub_pedido.status
+    sub_pedido.status = payload.status
+    if payload.status == PedidoStatus.ENVIADO:
+        sub_pedido.data_envio = datetime.now(timezone.utc)
+    elif payload.status == PedidoStatus.CONCLUIDO:
+        sub_pedido.data_conclusao = datetime.now(timezone.utc)
+    kpi_service.mudar_status_sub_pedido(db, sub_pedido, anterior)
+    _sincronizar_status_pedido(sub_pedido.pedido)
     db.commit()
-    db.refresh(pedido)
-    resumo = _pedido_para_schema(pedido, merchant.id)
+    resumo = _pedido_para_schema(sub_pedido, _itens_do_merchant(db, [pedido_id], merchant.id)[pedido_id])
     return PedidoDetalhe(
         **resumo.model_dump(),
-        endereco_entrega_snapshot=pedido.endereco_entrega_snapshot,
+        endereco_entrega_snapshot=sub_pedido.pedido.endereco_entrega_snapshot,
     )
 
 
@@ -480,10 +546,10 @@ def list_categorias_merchant(
     page_size: int = Query(20, ge=1, le=100),
     ativa: bool | None = None,
     tenant: TenantContext = Depends(get_current_active_tenant),
-    user: models.User = Depends(get_current_user),
+    principal: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
-    _get_merchant_for_user(merchant_id=merchant_id, tenant=tenant, db=db, user=user)
+    _get_merchant_for_user(merchant_id=merchant_id, tenant=tenant, db=db, principal=principal)
     query = (
         db.query(models.Categoria)
         .filter(models.Categoria.tenant_id == tenant.id, models.Categoria.merchant_id == merchant_id)
@@ -509,10 +575,10 @@ def get_categoria(
     merchant_id: UUID,
     categoria_id: UUID,
     tenant: TenantContext = Depends(get_current_active_tenant),
-    user: models.User = Depends(get_current_user),
+    principal: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
-    _get_merchant_for_user(merchant_id=merchant_id, tenant=tenant, db=db, user=user)
+    _get_merchant_for_user(merchant_id=merchant_id, tenant=tenant, db=db, principal=principal)
     categoria = (
         db.query(models.Categoria)
         .filter(
@@ -533,10 +599,10 @@ def update_categoria(
     categoria_id: UUID,
     payload: CategoriaUpdate,
     tenant: TenantContext = Depends(get_current_active_tenant),
-    user: models.User = Depends(get_current_user),
+    principal: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
-    _get_merchant_for_user(merchant_id=merchant_id, tenant=tenant, db=db, user=user)
+    merchant = _get_merchant_for_user(merchant_id=merchant_id, tenant=tenant, db=db, principal=principal)
     categoria = (
         db.query(models.Categoria)
         .filter(
@@ -555,6 +621,7 @@ def update_categoria(
     db.add(categoria)
     db.commit()
     db.refresh(categoria)
+    _invalidar_catalogo(merchant)
     return categoria
 
 
@@ -563,10 +630,10 @@ def delete_categoria(
     merchant_id: UUID,
     categoria_id: UUID,
     tenant: TenantContext = Depends(get_current_active_tenant),
-    user: models.User = Depends(get_current_user),
+    principal: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
-    _get_merchant_for_user(merchant_id=merchant_id, tenant=tenant, db=db, user=user)
+    merchant = _get_merchant_for_user(merchant_id=merchant_id, tenant=tenant, db=db, principal=principal)
     categoria = (
         db.query(models.Categoria)
         .filter(
@@ -581,4 +648,5 @@ def delete_categoria(
     categoria.ativa = False
     db.add(categoria)
     db.commit()
+    _invalidar_catalogo(merchant)
     return None
@@ -4,20 +4,35 @@ from __future__ import annotations
 
 from datetime import datetime, timezone
 from decimal import Decimal
-from math import ceil
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy import String, cast
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import String, cast, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app.core.deps import (
     TenantContext,
+    get_async_db,
+    get_async_tenant,
     get_current_active_tenant,
     get_current_prestador,
     get_db,
     get_tenant,
 )
+from app.core import response_cache
+from app.core.pagination import (
+    CountMode,
+    ListFormat,
+    apply_keyset,
+    get_count_mode,
+    get_list_limit,
+    keyset_list,
+    paginate,
+    paginate_async,
+    set_next_cursor,
+    stream_ndjson,
+)
 from app.infrastructure.db import models
 from app.schemas.merchant import (
     PrestadorListResponse,
@@ -28,16 +43,15 @@ from app.schemas.merchant import (
 )
 from app.schemas.agendamento import AgendamentoOut, AgendamentoStatusUpdate
 from app.domain.enums import AgendamentoStatus
+from app.services import kpi_service, search_service
 
 router = APIRouter()
 
 
-def _paginate(query, page: int, page_size: int):
-    total = query.count()
-    total_pages = ceil(total / page_size) if page_size else 1
-    offset = (page - 1) * page_size
-    results = query.offset(offset).limit(page_size).all()
-    return total, total_pages, results
+SERVICO_KEYSET = (models.Servico.nome, models.Servico.id)
+PRESTADOR_KEYSET = (models.PrestadorServico.nome, models.PrestadorServico.id)
+# Agenda do mais recente para o mais antigo (índice `(tenant_id, prestador_id, data_hora)`).
+AGENDAMENTO_KEYSET = (models.Agendamento.data_hora, models.Agendamento.id)
 
 
 def _get_prestador_for_user(
@@ -46,6 +60,8 @@ def _get_prestador_for_user(
     db: Session,
     current_prestador: models.PrestadorServico,
 ) -> models.PrestadorServico:
+    if current_prestador.id == prestador_id and current_prestador.tenant_id == tenant.id:
+        return current_prestador
     prestador = (
         db.query(models.PrestadorServico)
         .filter(models.PrestadorServico.tenant_id == tenant.id, models.PrestadorServico.id == prestador_id)
@@ -58,6 +74,12 @@ def _get_prestador_for_user(
     return prestador
 
 
+def _invalidar_prestadores(tenant_id: UUID) -> None:
+    """Invalida as listagens públicas de prestadores em cache (dependem dos serviços ativos)."""
+
+    response_cache.invalidate(response_cache.tenant_tag(tenant_id, "prestadores"))
+
+
 def _get_servico(
     db: Session,
     tenant: TenantContext,
@@ -137,6 +159,7 @@ def create_servico(
     db.add(servico)
     db.commit()
     db.refresh(servico)
+    _invalidar_prestadores(tenant.id)
     return servico
 
 
@@ -145,10 +168,13 @@ def list_servicos_privado(
     prestador_id: UUID,
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
+    cursor: str | None = None,
+    count: CountMode = Depends(get_count_mode),
     categoria_id: UUID | None = None,
     tipo_atendimento: str | None = None,
     ativo: bool | None = None,
     nome: str | None = Query(default=None, min_length=2),
+    q: str | None = Query(default=None, min_length=2, description="Pesquisa full-text ordenada por relevância"),
     tenant: TenantContext = Depends(get_current_active_tenant),
     current_prestador: models.PrestadorServico = Depends(get_current_prestador),
     db: Session = Depends(get_db),
@@ -159,7 +185,6 @@ def list_servicos_privado(
     query = (
         db.query(models.Servico)
         .filter(models.Servico.tenant_id == tenant.id, models.Servico.prestador_id == prestador_id)
-        .order_by(models.Servico.nome)
     )
     if categoria_id:
         query = query.filter(models.Servico.categoria_id == categoria_id)
@@ -170,14 +195,26 @@ def list_servicos_privado(
     if nome:
         ilike = f"%{nome.lower()}%"
         query = query.filter(models.Servico.nome.ilike(ilike))
+    if q:
+        query = search_service.apply_search(query, models.Servico, q, dialect_name=db.get_bind().dialect.name)
 
-    total, total_pages, servicos = _paginate(query, page, page_size)
-    return ServicoListResponse(
-        total=total,
-        items=servicos,
+    resultado = paginate(
+        query,
         page=page,
         page_size=page_size,
-        total_pages=total_pages,
+        keyset=None if q else SERVICO_KEYSET,
+        cursor=cursor,
+        count=count,
+        filtered=any(value is not None for value in (categoria_id, tipo_atendimento, ativo, nome, q)),
+    )
+    return ServicoListResponse(
+        total=resultado.total,
+        items=resultado.items,
+        page=resultado.page,
+        page_size=page_size,
+        total_pages=resultado.total_pages,
+        has_next=resultado.has_next,
+        next_cursor=resultado.next_cursor,
     )
 
 
@@ -220,6 +257,7 @@ def update_servico(
     db.add(servico)
     db.commit()
     db.refresh(servico)
+    _invalidar_prestadores(tenant.id)
     return servico
 
 
@@ -241,6 +279,7 @@ def delete_servico(
     servico.ativo = False
     db.add(servico)
     db.commit()
+    _invalidar_prestadores(tenant.id)
     return None
 
 
@@ -249,20 +288,22 @@ def delete_servico(
 
 @router.get("/prestadores/me/agendamentos", response_model=list[AgendamentoOut])
 def listar_agendamentos_prestador(
+    response: Response,
     status_filter: AgendamentoStatus | None = Query(default=None, alias="status"),
     inicio: datetime | None = None,
     fim: datetime | None = None,
+    cursor: str | None = None,
+    limit: int = Depends(get_list_limit),
+    formato: ListFormat = Query(default="json", alias="format"),
     tenant: TenantContext = Depends(get_current_active_tenant),
     prestador: models.PrestadorServico = Depends(get_current_prestador),
     db: Session = Depends(get_db),
 ):
-    query = (
-        db.query(models.Agendamento)
-        .filter(
-            models.Agendamento.tenant_id == tenant.id,
-            models.Agendamento.prestador_id == prestador.id,
-        )
-        .order_by(models.Agendamento.data_hora.desc())
+    """Agenda do prestador, mais recentes primeiro: `limit` itens por página ou toda em NDJSON (`format=ndjson`)."""
+
+    query = db.query(models.Agendamento).filter(
+        models.Agendamento.tenant_id == tenant.id,
+        models.Agendamento.prestador_id == prestador.id,
     )
     if status_filter:
         query = query.filter(models.Agendamento.status == status_filter)
@@ -270,7 +311,14 @@ def listar_agendamentos_prestador(
         query = query.filter(models.Agendamento.data_hora >= inicio)
     if fim:
         query = query.filter(models.Agendamento.data_hora <= fim)
-    return query.all()
+    if formato == "ndjson":
+        return stream_ndjson(apply_keyset(query, AGENDAMENTO_KEYSET, cursor, descending=True), AgendamentoOut)
+
+    agendamentos, next_cursor = keyset_list(
+        query, keyset=AGENDAMENTO_KEYSET, cursor=cursor, limit=limit, descending=True
+    )
+    set_next_cursor(response, next_cursor)
+    return agendamentos
 
 
 @router.get("/prestadores/me/agendamentos/{agendamento_id}", response_model=AgendamentoOut)
@@ -297,6 +345,7 @@ def atualizar_agendamento_prestador(
     agendamento = _get_agendamento_prestador(
         db=db, tenant=tenant, prestador=prestador, agendamento_id=agendamento_id
     )
+    anterior = agendamento.status
     update_data = payload.model_dump(exclude_unset=True)
     for key, value in update_data.items():
         setattr(agendamento, key, value)
@@ -306,60 +355,87 @@ def atualizar_agendamento_prestador(
         agendamento.data_cancelamento = payload.data_cancelamento or datetime.now(timezone.utc)
         agendamento.motivo_cancelamento = payload.motivo_cancelamento
     db.add(agendamento)
+    kpi_service.mudar_status_agendamento(db, agendamento, anterior)
     db.commit()
     db.refresh(agendamento)
     return agendamento
 
 
 @router.get("/public/prestadores", response_model=PrestadorListResponse)
-def listar_prestadores_publicos(
+async def listar_prestadores_publicos(
+    request: Request,
+    background_tasks: BackgroundTasks,
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
+    cursor: str | None = None,
+    count: CountMode = Depends(get_count_mode),
     categoria_id: UUID | None = None,
     tipo_atendimento: str | None = None,
     preco_min: Decimal | None = None,
     preco_max: Decimal | None = None,
     localizacao: str | None = Query(default=None, min_length=2),
     search: str | None = Query(default=None, min_length=2),
-    tenant: TenantContext = Depends(get_tenant),
-    db: Session = Depends(get_db),
+    fuzzy: bool = Query(default=False, description="Tolera erros de escrita em `search` (semelhança de trigramas)"),
+    tenant: TenantContext = Depends(get_async_tenant),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    query = db.query(models.PrestadorServico).filter(
-        models.PrestadorServico.tenant_id == tenant.id,
-        models.PrestadorServico.ativo.is_(True),
-    )
-
-    service_filters = any([categoria_id, tipo_atendimento, preco_min, preco_max])
-    if service_filters:
-        query = query.join(
-            models.Servico,
-            (models.Servico.prestador_id == models.PrestadorServico.id)
-            & (models.Servico.ativo.is_(True)),
+    async def carregar(session: AsyncSession) -> PrestadorListResponse:
+        stmt = select(models.PrestadorServico).where(
+            models.PrestadorServico.tenant_id == tenant.id,
+            models.PrestadorServico.ativo.is_(True),
         )
-        if categoria_id:
-            query = query.filter(models.Servico.categoria_id == categoria_id)
-        if tipo_atendimento:
-            query = query.filter(models.Servico.tipo_atendimento == tipo_atendimento)
-        if preco_min is not None:
-            query = query.filter(models.Servico.preco >= preco_min)
-        if preco_max is not None:
-            query = query.filter(models.Servico.preco <= preco_max)
-    if search:
-        ilike = f"%{search.lower()}%"
-        query = query.filter(models.PrestadorServico.nome.ilike(ilike))
-    if localizacao:
-        ilike = f"%{localizacao.lower()}%"
-        query = query.filter(cast(models.PrestadorServico.zona_atendimento, String).ilike(ilike))
 
-    query = query.distinct().order_by(models.PrestadorServico.nome)
+        service_filters = any([categoria_id, tipo_atendimento, preco_min, preco_max])
+        if service_filters:
+            # EXISTS em vez de JOIN + DISTINCT: evita duplicados sem restringir o ORDER BY ao SELECT.
+            servicos = select(models.Servico.id).where(
+                models.Servico.prestador_id == models.PrestadorServico.id,
+                models.Servico.ativo.is_(True),
+            )
+            if categoria_id:
+                servicos = servicos.where(models.Servico.categoria_id == categoria_id)
+            if tipo_atendimento:
+                servicos = servicos.where(models.Servico.tipo_atendimento == tipo_atendimento)
+            if preco_min is not None:
+                servicos = servicos.where(models.Servico.preco >= preco_min)
+            if preco_max is not None:
+                servicos = servicos.where(models.Servico.preco <= preco_max)
+            stmt = stmt.where(servicos.exists())
+        if search:
+            stmt = search_service.apply_name_search(
+                stmt, models.PrestadorServico, search, fuzzy=fuzzy, dialect_name=session.get_bind().dialect.name
+            )
+        if localizacao:
+            ilike = f"%{localizacao.lower()}%"
+            stmt = stmt.where(cast(models.PrestadorServico.zona_atendimento, String).ilike(ilike))
+
+        resultado = await paginate_async(
+            session,
+            stmt,
+            page=page,
+            page_size=page_size,
+            keyset=None if search else PRESTADOR_KEYSET,
+            cursor=cursor,
+            count=count,
+            filtered=service_filters or bool(search or localizacao),
+        )
+        return PrestadorListResponse(
+            total=resultado.total,
+            items=resultado.items,
+            page=resultado.page,
+            page_size=page_size,
+            total_pages=resultado.total_pages,
+            has_next=resultado.has_next,
+            next_cursor=resultado.next_cursor,
+        )
 
-    total, total_pages, prestadores = _paginate(query, page, page_size)
-    return PrestadorListResponse(
-        total=total,
-        items=prestadores,
-        page=page,
-        page_size=page_size,
-        total_pages=total_pages,
+    return await response_cache.cached_response(
+        request,
+        db=db,
+        tenant_id=tenant.id,
+        tags=[response_cache.tenant_tag(tenant.id, "prestadores")],
+        loader=carregar,
+        background_tasks=background_tasks,
     )
 
 
@@ -368,9 +444,12 @@ def listar_servicos_publicos_prestador(
     prestador_id: UUID,
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
+    cursor: str | None = None,
+    count: CountMode = Depends(get_count_mode),
     categoria_id: UUID | None = None,
     tipo_atendimento: str | None = None,
     search: str | None = Query(default=None, min_length=2),
+    q: str | None = Query(default=None, min_length=2, description="Pesquisa full-text ordenada por relevância"),
     tenant: TenantContext = Depends(get_tenant),
     db: Session = Depends(get_db),
 ):
@@ -386,13 +465,23 @@ def listar_servicos_publicos_prestador(
     if search:
         ilike = f"%{search.lower()}%"
         query = query.filter(models.Servico.nome.ilike(ilike))
-    query = query.order_by(models.Servico.nome)
-
-    total, total_pages, servicos = _paginate(query, page, page_size)
-    return ServicoListResponse(
-        total=total,
-        items=servicos,
+    if q:
+        query = search_service.apply_search(query, models.Servico, q, dialect_name=db.get_bind().dialect.name)
+    resultado = paginate(
+        query,
         page=page,
         page_size=page_size,
-        total_pages=total_pages,
+        keyset=None if q else SERVICO_KEYSET,
+        cursor=cursor,
+        count=count,
+        filtered=bool(categoria_id or tipo_atendimento or search or q),
+    )
+    return ServicoListResponse(
+        total=resultado.total,
+        items=resultado.items,
+        page=resultado.page,
+        page_size=page_size,
+        total_pages=resultado.total_pages,
+        has_next=resultado.has_next,
+        next_cursor=resultado.next_cursor,
     )
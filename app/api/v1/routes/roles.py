@@ -4,10 +4,11 @@ from __future__ import annotations
 
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
 
-from app.core.deps import get_db, require_role
+from app.core.deps import UserClaims, get_db, require_role
+from app.core.pagination import get_list_limit, keyset_list, set_next_cursor
 from app.domain.enums import UserRole
 from app.infrastructure.db import models
 from app.schemas.role import RoleCreate, RoleOut, RoleUpdate
@@ -16,17 +17,27 @@ router = APIRouter()
 
 require_superadmin = Depends(require_role(UserRole.SUPERADMIN))
 
+ROLE_KEYSET = (models.Role.name, models.Role.id)
+
 
 @router.get("/", response_model=list[RoleOut])
-def list_roles(db: Session = Depends(get_db), _: models.User = require_superadmin):
-    return db.query(models.Role).order_by(models.Role.name).all()
+def list_roles(
+    response: Response,
+    cursor: str | None = None,
+    limit: int = Depends(get_list_limit),
+    db: Session = Depends(get_db),
+    _: UserClaims = require_superadmin,
+):
+    roles, next_cursor = keyset_list(db.query(models.Role), keyset=ROLE_KEYSET, cursor=cursor, limit=limit)
+    set_next_cursor(response, next_cursor)
+    return roles
 
 
 @router.post("/", response_model=RoleOut, status_code=status.HTTP_201_CREATED)
 def create_role(
     payload: RoleCreate,
     db: Session = Depends(get_db),
-    _: models.User = require_superadmin,
+    _: UserClaims = require_superadmin,
 ):
     existing = db.query(models.Role).filter(models.Role.name == payload.name).first()
     if existing:
@@ -46,7 +57,7 @@ def create_role(
 def get_role(
     role_id: UUID,
     db: Session = Depends(get_db),
-    _: models.User = require_superadmin,
+    _: UserClaims = require_superadmin,
 ):
     role = db.get(models.Role, role_id)
     if not role:
@@ -59,7 +70,7 @@ def update_role(
     role_id: UUID,
     payload: RoleUpdate,
     db: Session = Depends(get_db),
-    _: models.User = require_superadmin,
+    _: UserClaims = require_superadmin,
 ):
     role = db.get(models.Role, role_id)
     if not role:
@@ -77,7 +88,7 @@ def update_role(
 def delete_role(
     role_id: UUID,
     db: Session = Depends(get_db),
-    _: models.User = require_superadmin,
+    _: UserClaims = require_superadmin,
 ):
     role = db.get(models.Role, role_id)
     if not role:
@@ -4,12 +4,12 @@ from __future__ import annotations
 
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
 
-from app.core.deps import get_db, require_role
+from app.core.deps import UserClaims, get_db, require_role
+from app.core.pagination import get_list_limit, set_next_cursor
 from app.domain.enums import UserRole
-from app.infrastructure.db import models
 from app.schemas.tenant import TenantCreate, TenantOut, TenantUpdate
 from app.services import tenant_service
 
@@ -20,7 +20,7 @@ router = APIRouter()
 def create_tenant(
     payload: TenantCreate,
     db: Session = Depends(get_db),
-    _: models.User = Depends(require_role(UserRole.SUPERADMIN)),
+    _: UserClaims = Depends(require_role(UserRole.SUPERADMIN)),
 ):
     """Cria um novo tenant multi-tenant."""
 
@@ -32,24 +32,30 @@ def create_tenant(
         nome=payload.nome,
         slug=payload.slug,
         ativo=payload.ativo,
+        timezone=payload.timezone,
     )
 
 
 @router.get("/", response_model=list[TenantOut])
 def list_tenants(
+    response: Response,
+    cursor: str | None = None,
+    limit: int = Depends(get_list_limit),
     db: Session = Depends(get_db),
-    _: models.User = Depends(require_role(UserRole.SUPERADMIN)),
+    _: UserClaims = Depends(require_role(UserRole.SUPERADMIN)),
 ):
-    """Lista todos os tenants existentes."""
+    """Lista os tenants por nome, `limit` de cada vez (cursor seguinte em `X-Next-Cursor`)."""
 
-    return list(tenant_service.list_tenants(db))
+    tenants, next_cursor = tenant_service.list_tenants(db, cursor=cursor, limit=limit)
+    set_next_cursor(response, next_cursor)
+    return tenants
 
 
 @router.get("/{tenant_id}", response_model=TenantOut)
 def get_tenant(
     tenant_id: UUID,
     db: Session = Depends(get_db),
-    _: models.User = Depends(require_role(UserRole.SUPERADMIN)),
+    _: UserClaims = Depends(require_role(UserRole.SUPERADMIN)),
 ):
     """Obtém detalhes de um tenant específico."""
 
@@ -64,12 +70,14 @@ def update_tenant(
     tenant_id: UUID,
     payload: TenantUpdate,
     db: Session = Depends(get_db),
-    _: models.User = Depends(require_role(UserRole.SUPERADMIN)),
+    _: UserClaims = Depends(require_role(UserRole.SUPERADMIN)),
 ):
-    """Atualiza parcialmente um tenant (nome ou estado)."""
+    """Atualiza parcialmente um tenant (nome, estado ou fuso horário)."""
 
     tenant = tenant_service.get_tenant_by_id(db, tenant_id)
     if not tenant:
         raise HTTPException(status_code=404, detail="Tenant não encontrado")
 
-    return tenant_service.update_tenant(db, tenant, nome=payload.nome, ativo=payload.ativo)
+    return tenant_service.update_tenant(
+        db, tenant, nome=payload.nome, ativo=payload.ativo, timezone=payload.timezone
+    )
@@ -1,4 +1,5 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 from app.core.config import settings
@@ -6,6 +7,15 @@ from app.core.config import settings
 engine = create_engine(settings.database_url, pool_pre_ping=True)
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
 
+# Engine assíncrono (psycopg3 async) usado pelos endpoints públicos de leitura intensiva.
+async_engine = create_async_engine(
+    settings.async_database_url or settings.database_url,
+    pool_pre_ping=True,
+    pool_size=settings.async_pool_size,
+    max_overflow=settings.async_max_overflow,
+)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
 
 def get_session():
     db = SessionLocal()
@@ -13,3 +23,8 @@ def get_session():
         yield db
     finally:
         db.close()
+
+
+async def get_async_session():
+    async with AsyncSessionLocal() as db:
+        yield db
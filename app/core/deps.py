@@ -3,57 +3,77 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Generator
+from typing import AsyncGenerator, Generator
 from uuid import UUID
 
 from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app.core import database
 from app.core.config import settings
 from app.core.security import decode_token
 from app.domain.enums import UserRole
+from app.domain.tenant import TenantContext
 from app.infrastructure.db import models
-from app.services import tenant_service
+from app.services import auth_service, tenant_service
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 
 
-@dataclass
-class TenantContext:
-    """Estrutura simples com o tenant ativo a ser usado pelo request."""
-
-    id: UUID
-    slug: str
-    is_active: bool
-
-
 def get_db() -> Generator[Session, None, None]:
     """Gera sessões de base de dados com cleanup automático."""
 
     yield from database.get_session()
 
 
-def get_tenant(request: Request, db: Session = Depends(get_db)) -> TenantContext:
-    """Resolve o tenant através do header X-Tenant-ID (UUID ou slug)."""
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """Gera sessões assíncronas para endpoints `async def` (não ocupam o threadpool)."""
+
+    async for db in database.get_async_session():
+        yield db
 
-    tenant_header = settings.tenant_header
-    tenant_identifier = request.headers.get(tenant_header)
+
+def _tenant_identifier(request: Request) -> str:
+    tenant_identifier = request.headers.get(settings.tenant_header)
     if not tenant_identifier:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Tenant não informado")
+    return tenant_identifier
 
-    tenant = tenant_service.get_tenant_by_identifier(db, tenant_identifier)
 
-    if not tenant or not tenant.ativo:
+def _ensure_active(tenant: TenantContext | None) -> TenantContext:
+    if not tenant or not tenant.is_active:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Tenant inválido/inativo")
+    return tenant
 
-    return TenantContext(id=tenant.id, slug=tenant.slug, is_active=tenant.ativo)
 
+def get_tenant(request: Request, db: Session = Depends(get_db)) -> TenantContext:
+    """Resolve o tenant através do header X-Tenant-ID (UUID ou slug), com cache em memória."""
+
+    tenant = tenant_service.resolve_tenant_context(db, _tenant_identifier(request))
+    return _ensure_active(tenant)
+
+
+async def get_async_tenant(request: Request, db: AsyncSession = Depends(get_async_db)) -> TenantContext:
+    """Equivalente assíncrono de `get_tenant` para endpoints públicos `async def`."""
+
+    tenant = await tenant_service.resolve_tenant_context_async(db, _tenant_identifier(request))
+    return _ensure_active(tenant)
+
+
+@dataclass(frozen=True)
+class UserClaims:
+    """Identidade autenticada derivada das claims verificadas do JWT."""
+
+    id: UUID
+    tenant_id: UUID | None
+    role: UserRole
+    is_active: bool
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> models.User:
-    """Obtém o utilizador autenticado a partir do JWT bearer."""
 
+def _decode_payload(token: str | None) -> tuple[dict, UUID]:
     if not token:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token ausente")
 
@@ -70,15 +90,55 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         user_uuid = UUID(user_id)
     except ValueError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token inválido") from None
+    return payload, user_uuid
 
+
+def _claims_from_payload(payload: dict, user_uuid: UUID) -> UserClaims | None:
+    try:
+        role = UserRole(payload["role"])
+        tenant_id = UUID(payload["tenant_id"]) if payload.get("tenant_id") else None
+    except (KeyError, ValueError):
+        return None
+    return UserClaims(id=user_uuid, tenant_id=tenant_id, role=role, is_active=True)
+
+
+def get_current_claims(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> UserClaims:
+    """Valida o JWT e devolve as claims do utilizador sem carregar a linha `User`.
+
+    Apenas a versão do token (cache em memória com TTL curto) é confirmada, para que
+    desativações/revogações invalidem tokens já emitidos. Tokens sem claims de role/tenant
+    (ou com o modo stateless desligado) seguem o caminho clássico de carregar o utilizador.
+    """
+
+    payload, user_uuid = _decode_payload(token)
+    claims = _claims_from_payload(payload, user_uuid) if settings.jwt_stateless_claims else None
+    if claims is None:
+        user = _load_active_user(db, user_uuid)
+        return UserClaims(id=user.id, tenant_id=user.tenant_id, role=user.role, is_active=user.is_active)
+
+    state = auth_service.get_token_state(db, user_uuid)
+    if state is None or not state.is_active or int(payload.get("ver", 0)) != state.version:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Utilizador não encontrado")
+    return claims
+
+
+def _load_active_user(db: Session, user_uuid: UUID) -> models.User:
     user = db.get(models.User, user_uuid)
     if not user or not user.is_active:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Utilizador não encontrado")
     return user
 
 
+def get_current_user(
+    claims: UserClaims = Depends(get_current_claims), db: Session = Depends(get_db)
+) -> models.User:
+    """Obtém o utilizador autenticado (linha completa) a partir do JWT bearer."""
+
+    return _load_active_user(db, claims.id)
+
+
 def get_current_active_tenant(
-    tenant: TenantContext = Depends(get_tenant), user: models.User = Depends(get_current_user)
+    tenant: TenantContext = Depends(get_tenant), user: UserClaims = Depends(get_current_claims)
 ) -> TenantContext:
     """Garante que o utilizador está autorizado a agir sobre o tenant corrente."""
 
@@ -88,9 +148,9 @@ def get_current_active_tenant(
 
 
 def require_role(required_role: UserRole):
-    """Dependência factory para validar roles específicos."""
+    """Dependência factory para validar roles específicos (respondida a partir das claims)."""
 
-    def dependency(user: models.User = Depends(get_current_user)) -> models.User:
+    def dependency(user: UserClaims = Depends(get_current_claims)) -> UserClaims:
         if user.role != required_role:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Permissões insuficientes")
         return user
@@ -98,34 +158,86 @@ def require_role(required_role: UserRole):
     return dependency
 
 
-def get_current_cliente(
-    user: models.User = Depends(require_role(UserRole.CLIENTE)), db: Session = Depends(get_db)
-) -> models.Cliente:
-    """Carrega o cliente associado ao utilizador autenticado."""
+@dataclass
+class Principal:
+    """Utilizador autenticado e respetivo perfil funcional, carregados uma vez por request."""
+
+    claims: UserClaims
+    user: models.User
+    cliente: models.Cliente | None = None
+    merchant: models.Merchant | None = None
+    prestador: models.PrestadorServico | None = None
+
+
+def get_current_principal(
+    claims: UserClaims = Depends(get_current_claims), db: Session = Depends(get_db)
+) -> Principal:
+    """Carrega o `User` e o perfil do seu role (cliente/merchant/prestador) numa única query.
+
+    O FastAPI guarda o resultado em cache durante o request, pelo que todas as dependências e
+    helpers que precisem do perfil reutilizam as mesmas instâncias da sessão.
+    """
+
+    profile = None
+    stmt = select(models.User)
+    if claims.role == UserRole.CLIENTE:
+        profile = models.Cliente
+        stmt = select(models.User, models.Cliente).outerjoin(
+            models.Cliente, models.Cliente.user_id == models.User.id
+        )
+    elif claims.role == UserRole.MERCHANT:
+        profile = models.Merchant
+        stmt = select(models.User, models.Merchant).outerjoin(
+            models.Merchant,
+            (models.Merchant.owner_id == models.User.id) & (models.Merchant.tenant_id == models.User.tenant_id),
+        )
+    elif claims.role == UserRole.PRESTADOR:
+        profile = models.PrestadorServico
+        stmt = select(models.User, models.PrestadorServico).outerjoin(
+            models.PrestadorServico, models.PrestadorServico.user_id == models.User.id
+        )
+
+    row = db.execute(stmt.where(models.User.id == claims.id).limit(1)).first()
+    if row is None or not row[0].is_active:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Utilizador não encontrado")
+
+    principal = Principal(claims=claims, user=row[0])
+    if profile is models.Cliente:
+        principal.cliente = row[1]
+    elif profile is models.Merchant:
+        principal.merchant = row[1]
+    elif profile is models.PrestadorServico:
+        principal.prestador = row[1]
+    return principal
+
+
+def _require_principal_role(principal: Principal, required_role: UserRole) -> None:
+    if principal.claims.role != required_role:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Permissões insuficientes")
+
+
+def get_current_cliente(principal: Principal = Depends(get_current_principal)) -> models.Cliente:
+    """Devolve o cliente associado ao utilizador autenticado."""
 
-    cliente = db.query(models.Cliente).filter(models.Cliente.user_id == user.id).first()
-    if not cliente:
+    _require_principal_role(principal, UserRole.CLIENTE)
+    if not principal.cliente:
         raise HTTPException(status_code=404, detail="Cliente não encontrado")
-    return cliente
+    return principal.cliente
 
 
-def get_current_merchant(
-    user: models.User = Depends(require_role(UserRole.MERCHANT)), db: Session = Depends(get_db)
-) -> models.Merchant:
-    """Carrega o merchant dono do utilizador autenticado."""
+def get_current_merchant(principal: Principal = Depends(get_current_principal)) -> models.Merchant:
+    """Devolve o merchant dono do utilizador autenticado."""
 
-    merchant = db.query(models.Merchant).filter(models.Merchant.owner_id == user.id).first()
-    if not merchant:
+    _require_principal_role(principal, UserRole.MERCHANT)
+    if not principal.merchant:
         raise HTTPException(status_code=404, detail="Merchant não encontrado para o utilizador")
-    return merchant
+    return principal.merchant
 
 
-def get_current_prestador(
-    user: models.User = Depends(require_role(UserRole.PRESTADOR)), db: Session = Depends(get_db)
-) -> models.PrestadorServico:
-    """Carrega o prestador associado ao utilizador autenticado."""
+def get_current_prestador(principal: Principal = Depends(get_current_principal)) -> models.PrestadorServico:
+    """Devolve o prestador associado ao utilizador autenticado."""
 
-    prestador = db.query(models.PrestadorServico).filter(models.PrestadorServico.user_id == user.id).first()
-    if not prestador:
+    _require_principal_role(principal, UserRole.PRESTADOR)
+    if not principal.prestador:
         raise HTTPException(status_code=404, detail="Prestador não encontrado para o utilizador")
-    return prestador
+    return principal.prestador
@@ -0,0 +1,136 @@
+"""Validadores HTTP (ETag/Last-Modified) e cabeçalhos de cache para leituras públicas.
+
+Os validadores derivam de `max(updated_at)` e `count(*)` da query filtrada (o `count` apanha
+remoções) mais o caminho e os parâmetros do pedido, por isso podem ser calculados com uma
+agregação barata antes de carregar e serializar a página. Um `If-None-Match` coincidente é
+respondido com 304 sem tocar no resto do endpoint.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Iterable
+from uuid import UUID
+
+from fastapi import Request, Response, status
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+
+
+@dataclass(frozen=True)
+class Validators:
+    """ETag (fraca) e data de última modificação de um recurso ou listagem."""
+
+    etag: str
+    last_modified: datetime | None
+
+    def headers(self) -> dict[str, str]:
+        headers = {"ETag": self.etag}
+        if self.last_modified is not None:
+            headers["Last-Modified"] = format_datetime(self.last_modified, usegmt=True)
+        return headers
+
+
+def _as_utc(value: datetime | None) -> datetime | None:
+    if value is None:
+        return None
+    # SQLite devolve datetimes sem timezone; as colunas guardam sempre UTC.
+    value = value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+async def compute_validators(
+    session: AsyncSession, stmt, request: Request, tenant_id: UUID, versions: Iterable[int] = ()
+) -> Validators:
+    """Calcula os validadores de `stmt` (query filtrada, antes de paginar) para este pedido.
+
+    `versions` são as versões das tags da cache de respostas de que a listagem depende: mudam com
+    escritas que não tocam `updated_at` (p.ex. vendas e reservas de stock) e por isso entram na ETag.
+    """
+
+    subquery = stmt.order_by(None).subquery()
+    updated_at, total = (
+        await session.execute(select(func.max(subquery.c.updated_at), func.count()).select_from(subquery))
+    ).one()
+    updated_at = _as_utc(updated_at)
+    params = "&".join(f"{name}={value}" for name, value in sorted(request.query_params.multi_items()))
+    # A ETag usa a precisão total; o Last-Modified (HTTP-date) só tem segundos.
+    fingerprint = "|".join(
+        [
+            str(tenant_id),
+            request.url.path,
+            params,
+            updated_at.isoformat() if updated_at else "",
+            str(total),
+            ",".join(str(version) for version in versions),
+        ]
+    )
+    return Validators(
+        etag=f'W/"{hashlib.sha1(fingerprint.encode()).hexdigest()}"',
+        last_modified=updated_at.replace(microsecond=0) if updated_at else None,
+    )
+
+
+def _opaque(etag: str) -> str:
+    return etag.strip().removeprefix("W/")
+
+
+def is_not_modified(request: Request, etag: str | None, last_modified: str | None) -> bool:
+    """Avalia `If-None-Match` (comparação fraca) ou, na sua ausência, `If-Modified-Since`."""
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if etag is None:
+            return False
+        candidates = [_opaque(token) for token in if_none_match.split(",")]
+        return "*" in candidates or _opaque(etag) in candidates
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+
+
+def surrogate_key_header(keys: Iterable[str]) -> str:
+    """Lista de surrogate keys (sem duplicados, pela ordem) para purga seletiva na CDN."""
+
+    return " ".join(dict.fromkeys(keys))
+
+
+def tenant_key(tenant_id: UUID) -> str:
+    return f"tenant-{tenant_id}"
+
+
+def merchant_key(merchant_id: UUID) -> str:
+    return f"merchant-{merchant_id}"
+
+
+def categoria_key(categoria_id: UUID) -> str:
+    return f"categoria-{categoria_id}"
+
+
+def cache_headers() -> dict[str, str]:
+    """`Cache-Control` partilhável e `Vary` pelo header de tenant (o URL não identifica o tenant)."""
+
+    return {
+        "Cache-Control": (
+            f"public, max-age={settings.http_cache_max_age_seconds}, "
+            f"stale-while-revalidate={settings.http_cache_stale_while_revalidate_seconds}"
+        ),
+        "Vary": settings.tenant_header,
+    }
+
+
+def not_modified(headers: dict[str, str]) -> Response:
+    """Resposta 304 com os validadores e cabeçalhos de cache (sem corpo)."""
+
+    kept = {name: value for name, value in headers.items() if name in ("ETag", "Last-Modified")}
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={**kept, **cache_headers()})
@@ -0,0 +1,360 @@
+"""Paginação partilhada pelos endpoints de listagem (offset clássico e cursor/keyset).
+
+As listagens que devolvem uma lista simples usam `keyset_list` (página limitada, cursor seguinte no
+header `X-Next-Cursor`) e podem exportar tudo em NDJSON com `stream_ndjson`.
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from enum import Enum
+from math import ceil
+from typing import Any, Literal, Sequence
+from uuid import UUID
+
+from fastapi import HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# `?format=`: lista JSON paginada ou exportação NDJSON completa
+ListFormat = Literal["json", "ndjson"]
+
+
+class CountMode(str, Enum):
+    """Estratégia usada para calcular `total` numa listagem paginada."""
+
+    exact = "exact"
+    estimated = "estimated"
+    none = "none"
+
+
+@dataclass
+class Page:
+    """Resultado de uma página; `next_cursor` permite continuar em modo keyset."""
+
+    items: list[Any]
+    total: int | None
+    total_pages: int | None
+    has_next: bool = False
+    page: int | None = None
+    next_cursor: str | None = None
+
+
+# Contagens estimadas por (SQL compilado, parâmetros): o tenant e os filtros fazem parte da chave.
+_count_cache = TTLCache(
+    maxsize=settings.pagination_count_cache_max_entries,
+    ttl=settings.pagination_count_cache_ttl_seconds,
+)
+
+
+def get_count_mode(
+    count: CountMode | None = Query(
+        default=None,
+        description="Cálculo do total: `exact` (COUNT), `estimated` (cache/planner) ou `none` (apenas `has_next`)",
+    ),
+) -> CountMode:
+    """Dependência que resolve `?count=` com fallback para `settings.pagination_count_mode`."""
+
+    return count or CountMode(settings.pagination_count_mode)
+
+
+def get_list_limit(
+    limit: int = Query(
+        default=settings.list_limit_default,
+        ge=1,
+        le=settings.list_limit_max,
+        description="Máximo de itens devolvidos; a página seguinte pede-se com o cursor em `X-Next-Cursor`",
+    ),
+) -> int:
+    """Dependência com o `?limit=` das listagens simples."""
+
+    return limit
+
+
+def clear_count_cache() -> None:
+    """Esvazia a cache de contagens estimadas (usado em testes)."""
+
+    _count_cache.clear()
+
+
+def _encode_value(value: Any) -> list[str]:
+    if isinstance(value, UUID):
+        return ["u", str(value)]
+    if isinstance(value, datetime):
+        return ["d", value.isoformat()]
+    if isinstance(value, Decimal):
+        return ["n", str(value)]
+    return ["s", value]
+
+
+def _decode_value(tagged: list) -> Any:
+    tag, value = tagged
+    if tag == "u":
+        return UUID(value)
+    if tag == "d":
+        return datetime.fromisoformat(value)
+    if tag == "n":
+        return Decimal(value)
+    return value
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Serializa os valores da chave de ordenação num cursor opaco (base64 url-safe)."""
+
+    raw = json.dumps([_encode_value(value) for value in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> list[Any]:
+    """Reverte `encode_cursor`, validando o número de colunas esperado."""
+
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = [_decode_value(item) for item in json.loads(base64.urlsafe_b64decode(padded))]
+    except (ValueError, TypeError, json.JSONDecodeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor inválido") from None
+    if len(values) != size:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor inválido")
+    return values
+
+
+def apply_keyset(query, keyset: Sequence, cursor: str | None, *, descending: bool = False):
+    """Ordena pela chave `keyset` e, havendo cursor, filtra as linhas depois dele.
+
+    Funciona tanto com `Query` (ORM clássico) como com `select()` (sessões assíncronas), já que
+    ambos expõem `filter()`/`order_by()`. A comparação por tuplo `(nome, id) > (:a, :b)` é
+    resolvida pelos índices compostos `(tenant_id, nome, id)`.
+    """
+
+    query = query.order_by(*[column.desc() if descending else column.asc() for column in keyset])
+    if cursor:
+        values = decode_cursor(cursor, len(keyset))
+        # Os valores do cursor são ligados com o tipo das colunas (datas/UUIDs no formato gravado).
+        row, after = tuple_(*keyset), tuple_(*values, types=[column.type for column in keyset])
+        query = query.filter(row < after if descending else row > after)
+    return query
+
+
+def _ordered(query, keyset: Sequence | None, cursor: str | None):
+    if keyset is not None:
+        return apply_keyset(query, keyset, cursor)
+    if cursor:
+        # Ordenações sem chave estável (ex.: relevância da pesquisa) só paginam por offset.
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor não suportado nesta ordenação"
+        )
+    return query
+
+
+def _trim(rows: list[Any], keyset: Sequence | None, page_size: int) -> tuple[list[Any], bool, str | None]:
+    if len(rows) <= page_size:
+        return rows, False, None
+    rows = rows[:page_size]
+    if keyset is None:
+        return rows, True, None
+    last = rows[-1]
+    return rows, True, encode_cursor([getattr(last, column.key) for column in keyset])
+
+
+def _total_pages(total: int | None, page_size: int) -> int | None:
+    if total is None:
+        return None
+    return ceil(total / page_size) if page_size else 1
+
+
+def _count_key(stmt, dialect) -> tuple[str, str]:
+    compiled = stmt.compile(dialect=dialect, compile_kwargs={"render_postcompile": True})
+    return str(compiled), json.dumps(compiled.params, default=str, sort_keys=True)
+
+
+def _explain_sql(stmt, dialect) -> tuple[str, dict]:
+    compiled = stmt.compile(dialect=dialect, compile_kwargs={"render_postcompile": True})
+    return f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params
+
+
+def _plan_rows(plan: Any) -> int:
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def _use_planner(dialect, filtered: bool) -> bool:
+    # As estatísticas do planner só são fiáveis para varrimentos sem filtros de texto/opcionais.
+    return dialect.name == "postgresql" and not filtered
+
+
+def _settle_estimate(key, *, offset: int | None, rows: list[Any], has_next: bool, total: int) -> int:
+    """Corrige a estimativa quando a página observada revela o total real (última página)."""
+
+    if offset is None or has_next or (not rows and offset):
+        return total
+    exact = offset + len(rows)
+    if exact != total:
+        _count_cache.set(key, exact)
+    return exact
+
+
+def _count_sync(query, count: CountMode, filtered: bool) -> tuple[int | None, Any]:
+    if count is CountMode.none:
+        return None, None
+    if count is CountMode.exact:
+        return query.count(), None
+
+    dialect = query.session.get_bind().dialect
+    key = _count_key(query.statement, dialect)
+    total = _count_cache.get(key)
+    if total is None:
+        if _use_planner(dialect, filtered):
+            sql, params = _explain_sql(query.statement, dialect)
+            total = _plan_rows(query.session.connection().exec_driver_sql(sql, params).scalar())
+        else:
+            total = query.count()
+        _count_cache.set(key, total)
+    return total, key
+
+
+async def _count_async(db: AsyncSession, stmt, count: CountMode, filtered: bool) -> tuple[int | None, Any]:
+    if count is CountMode.none:
+        return None, None
+    count_stmt = select(func.count()).select_from(stmt.subquery())
+    if count is CountMode.exact:
+        return await db.scalar(count_stmt), None
+
+    dialect = db.get_bind().dialect
+    key = _count_key(stmt, dialect)
+    total = _count_cache.get(key)
+    if total is None:
+        if _use_planner(dialect, filtered):
+            sql, params = _explain_sql(stmt, dialect)
+            connection = await db.connection()
+            total = _plan_rows((await connection.exec_driver_sql(sql, params)).scalar())
+        else:
+            total = await db.scalar(count_stmt)
+        _count_cache.set(key, total)
+    return total, key
+
+
+def paginate(
+    query,
+    *,
+    page: int,
+    page_size: int,
+    keyset: Sequence | None,
+    cursor: str | None = None,
+    count: CountMode = CountMode.exact,
+    filtered: bool = True,
+) -> Page:
+    """Pagina uma `Query` síncrona por offset (`page`) ou por cursor quando indicado.
+
+    `count` escolhe como obter `total`: `exact` faz `COUNT(*)`, `estimated` usa a cache de
+    contagens (ou o planner do Postgres quando `filtered=False`) e `none` omite o total,
+    devolvendo apenas `has_next` a partir da linha extra pedida em `page_size + 1`.
+    Com `keyset=None` mantém-se a ordenação já aplicada à query e só é aceite paginação por offset.
+    """
+
+    total, key = _count_sync(query.order_by(None), count, filtered)
+    offset = None if cursor else (page - 1) * page_size
+    query = _ordered(query, keyset, cursor)
+    if offset is not None:
+        query = query.offset(offset)
+    rows, has_next, next_cursor = _trim(query.limit(page_size + 1).all(), keyset, page_size)
+    if key is not None:
+        total = _settle_estimate(key, offset=offset, rows=rows, has_next=has_next, total=total)
+    return Page(
+        items=rows,
+        total=total,
+        total_pages=_total_pages(total, page_size),
+        has_next=has_next,
+        page=page if offset is not None else None,
+        next_cursor=next_cursor,
+    )
+
+
+async def paginate_async(
+    db: AsyncSession,
+    stmt,
+    *,
+    page: int,
+    page_size: int,
+    keyset: Sequence | None,
+    cursor: str | None = None,
+    count: CountMode = CountMode.exact,
+    filtered: bool = True,
+) -> Page:
+    """Equivalente de `paginate` para `select()` executados numa `AsyncSession`."""
+
+    total, key = await _count_async(db, stmt.order_by(None), count, filtered)
+    offset = None if cursor else (page - 1) * page_size
+    stmt = _ordered(stmt, keyset, cursor)
+    if offset is not None:
+        stmt = stmt.offset(offset)
+    rows, has_next, next_cursor = _trim(list((await db.scalars(stmt.limit(page_size + 1))).all()), keyset, page_size)
+    if key is not None:
+        total = _settle_estimate(key, offset=offset, rows=rows, has_next=has_next, total=total)
+    return Page(
+        items=rows,
+        total=total,
+        total_pages=_total_pages(total, page_size),
+        has_next=has_next,
+        page=page if offset is not None else None,
+        next_cursor=next_cursor,
+    )
+
+
+def keyset_list(
+    query,
+    *,
+    keyset: Sequence,
+    cursor: str | None,
+    limit: int,
+    descending: bool = False,
+) -> tuple[list[Any], str | None]:
+    """Página keyset limitada de uma `Query`: devolve as linhas e o cursor seguinte (ou `None`)."""
+
+    rows, _, next_cursor = _trim(
+        apply_keyset(query, keyset, cursor, descending=descending).limit(limit + 1).all(), keyset, limit
+    )
+    return rows, next_cursor
+
+
+def set_next_cursor(response: Response, next_cursor: str | None) -> None:
+    """Expõe o cursor da página seguinte no header `X-Next-Cursor` (ausente na última página)."""
+
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
+
+def stream_ndjson(query, schema: type[BaseModel], *, batch_size: int | None = None) -> StreamingResponse:
+    """Exporta todas as linhas da `Query` em NDJSON (um objeto `schema` por linha).
+
+    As linhas são lidas em lotes de `batch_size` por um cursor do lado do servidor (`yield_per`) e
+    serializadas à medida que são enviadas, pelo que a memória não cresce com o resultado. O corpo
+    é enviado depois de a dependência fechar a sessão do pedido, por isso o stream usa uma sessão
+    própria (no mesmo engine) que fecha no fim.
+    """
+
+    bind = query.session.get_bind()
+
+    def linhas():
+        session = Session(bind=bind, autoflush=False)
+        try:
+            for row in query.with_session(session).yield_per(batch_size or settings.ndjson_yield_per):
+                yield schema.model_validate(row).model_dump_json() + "\n"
+        finally:
+            session.close()
+
+    return StreamingResponse(linhas(), media_type=NDJSON_MEDIA_TYPE)
@@ -0,0 +1,361 @@
+"""Cache partilhada de respostas para os GET anónimos do catálogo público.
+
+Cada entrada guarda o corpo JSON já serializado e as versões das tags de que depende
+(`tenant_tag`/`merchant_tag`). Os endpoints de escrita incrementam essas versões
+(`invalidate`), o que torna as entradas afetadas obsoletas sem ser preciso conhecer as
+chaves. Uma entrada é servida diretamente enquanto for recente; depois disso, e até
+`response_cache_stale_seconds`, é servida obsoleta enquanto uma tarefa em segundo plano a
+recalcula (stale-while-revalidate); um lock curto por chave garante que só um pedido agenda essa
+tarefa. Se a base de dados falhar, a última entrada conhecida é servida até
+`response_cache_stale_if_error_seconds`.
+
+O backend é Redis quando `REDIS_URL` está definido; caso contrário usa-se memória do processo.
+Falhas do Redis nunca falham o pedido: são tratadas como cache miss.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Awaitable, Callable, Iterable
+from uuid import UUID
+
+from fastapi import BackgroundTasks, Request, Response
+from pydantic import BaseModel
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import http_cache
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.deps import get_async_db
+
+logger = logging.getLogger(__name__)
+
+Loader = Callable[[AsyncSession], Awaitable[BaseModel]]
+SurrogateKeys = Callable[[BaseModel], Iterable[str]]
+
+
+@dataclass
+class CacheEntry:
+    """Resposta serializada mais o contexto necessário para decidir se ainda é válida."""
+
+    body: str
+    stored_at: float
+    versions: list[int]
+    headers: dict[str, str] = field(default_factory=dict)
+
+    def dumps(self) -> str:
+        return json.dumps(asdict(self), separators=(",", ":"))
+
+    @classmethod
+    def loads(cls, raw: str | bytes) -> CacheEntry:
+        return cls(**json.loads(raw))
+
+
+class MemoryBackend:
+    """Backend em memória do processo (fallback quando não há Redis configurado)."""
+
+    def __init__(self) -> None:
+        self._entries = TTLCache(
+            maxsize=settings.response_cache_max_entries, ttl=_retention_seconds()
+        )
+        self._versions: dict[str, int] = {}
+        self._refreshing: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    async def get(self, key: str) -> str | None:
+        return self._entries.get(key)
+
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        self._entries.set(key, value, ttl=ttl)
+
+    async def versions(self, tags: list[str]) -> list[int]:
+        with self._lock:
+            return [self._versions.get(tag, 0) for tag in tags]
+
+    async def lock_refresh(self, key: str, ttl: float) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            if self._refreshing.get(key, 0) > now:
+                return False
+            self._refreshing[key] = now + ttl
+            return True
+
+    async def unlock_refresh(self, key: str) -> None:
+        with self._lock:
+            self._refreshing.pop(key, None)
+
+    def bump(self, tags: Iterable[str]) -> None:
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._versions.clear()
+            self._refreshing.clear()
+        self._entries.clear()
+
+
+class RedisBackend:
+    """Backend Redis partilhado entre workers; leituras assíncronas, invalidação síncrona."""
+
+    def __init__(self, url: str) -> None:
+        import redis
+        import redis.asyncio as redis_async
+
+        self._async = redis_async.Redis.from_url(url)
+        self._sync = redis.Redis.from_url(url)
+        self._prefix = settings.response_cache_prefix
+
+    def _tag_key(self, tag: str) -> str:
+        return f"{self._prefix}:tag:{tag}"
+
+    async def get(self, key: str) -> str | None:
+        return await self._async.get(f"{self._prefix}:{key}")
+
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        await self._async.set(f"{self._prefix}:{key}", value, ex=max(1, int(ttl)))
+
+    async def versions(self, tags: list[str]) -> list[int]:
+        if not tags:
+            return []
+        values = await self._async.mget([self._tag_key(tag) for tag in tags])
+        return [int(value or 0) for value in values]
+
+    async def lock_refresh(self, key: str, ttl: float) -> bool:
+        # SET NX PX: só o primeiro pedido obsoleto fica com o lock; expira sozinho se o worker morrer.
+        return bool(await self._async.set(f"{self._prefix}:refresh:{key}", "1", nx=True, px=max(1, int(ttl * 1000))))
+
+    async def unlock_refresh(self, key: str) -> None:
+        await self._async.delete(f"{self._prefix}:refresh:{key}")
+
+    def bump(self, tags: Iterable[str]) -> None:
+        pipeline = self._sync.pipeline(transaction=False)
+        for tag in tags:
+            pipeline.incr(self._tag_key(tag))
+        pipeline.execute()
+
+    def clear(self) -> None:
+        for key in self._sync.scan_iter(f"{self._prefix}:*"):
+            self._sync.delete(key)
+
+
+def _retention_seconds() -> float:
+    return settings.response_cache_ttl_seconds + max(
+        settings.response_cache_stale_seconds, settings.response_cache_stale_if_error_seconds
+    )
+
+
+_backend: MemoryBackend | RedisBackend | None = None
+
+
+def get_backend() -> MemoryBackend | RedisBackend:
+    """Instancia (uma vez) o backend configurado."""
+
+    global _backend
+    if _backend is None:
+        _backend = RedisBackend(settings.redis_url) if settings.redis_url else MemoryBackend()
+    return _backend
+
+
+def tenant_tag(tenant_id: UUID, resource: str) -> str:
+    """Tag de um recurso (`produtos`, `categorias`, `merchants`, `prestadores`, `stock`) num tenant."""
+
+    return f"t:{tenant_id}:{resource}"
+
+
+def merchant_tag(merchant_id: UUID) -> str:
+    """Tag do catálogo de um merchant concreto."""
+
+    return f"m:{merchant_id}"
+
+
+def merchant_slug_tag(tenant_id: UUID, slug: str) -> str:
+    """Tag do catálogo de um merchant quando o endpoint só conhece o slug."""
+
+    return f"ms:{tenant_id}:{slug}"
+
+
+def invalidate(*tags: str) -> None:
+    """Torna obsoletas todas as respostas que dependem de `tags` (chamado após commit).
+
+    As versões são incrementadas mesmo com a cache desligada, porque também entram na ETag.
+    """
+
+    try:
+        get_backend().bump(tags)
+    except Exception:  # noqa: BLE001 - a cache nunca deve falhar uma escrita
+        logger.warning("Falha ao invalidar tags da cache de respostas: %s", tags, exc_info=True)
+
+
+def clear() -> None:
+    """Esvazia a cache de respostas (usado em testes)."""
+
+    if _backend is not None:
+        _backend.clear()
+
+
+def _cache_key(request: Request, tenant_id: UUID) -> str:
+    params = "&".join(f"{name}={value}" for name, value in sorted(request.query_params.multi_items()))
+    digest = hashlib.sha1(f"{request.url.path}?{params}".encode()).hexdigest()
+    return f"{tenant_id}:{digest}"
+
+
+def _response(body: str, headers: dict[str, str], status: str | None = None) -> Response:
+    extra = {"X-Cache": status} if status else {}
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={**headers, **http_cache.cache_headers(), **extra},
+    )
+
+
+@dataclass
+class _View:
+    """Como carregar, validar e etiquetar uma resposta cacheável."""
+
+    request: Request
+    tenant_id: UUID
+    loader: Loader
+    validators_from: Any | None
+    surrogate_keys: SurrogateKeys | None
+
+    async def validators(self, session: AsyncSession, versions: list[int]) -> dict[str, str]:
+        if self.validators_from is None:
+            return {}
+        validators = await http_cache.compute_validators(
+            session, self.validators_from, self.request, self.tenant_id, versions
+        )
+        return validators.headers()
+
+    async def render(self, session: AsyncSession, headers: dict[str, str]) -> tuple[str, dict[str, str]]:
+        payload = await self.loader(session)
+        if self.surrogate_keys is not None:
+            headers = {**headers, "Surrogate-Key": http_cache.surrogate_key_header(self.surrogate_keys(payload))}
+        return payload.model_dump_json(), headers
+
+
+def _is_not_modified(request: Request, headers: dict[str, str]) -> bool:
+    return http_cache.is_not_modified(request, headers.get("ETag"), headers.get("Last-Modified"))
+
+
+async def _store(backend, key: str, versions: list[int], body: str, headers: dict[str, str]) -> CacheEntry:
+    entry = CacheEntry(body=body, stored_at=time.time(), versions=versions, headers=headers)
+    try:
+        await backend.set(key, entry.dumps(), _retention_seconds())
+    except Exception:  # noqa: BLE001
+        logger.warning("Falha ao gravar entrada na cache de respostas", exc_info=True)
+    return entry
+
+
+async def _refresh(view: _View, key: str, tags: list[str]) -> None:
+    # A sessão do pedido já foi fechada quando as background tasks correm: abre-se uma nova
+    # a partir da mesma dependência (respeitando overrides, p.ex. nos testes).
+    provider = view.request.app.dependency_overrides.get(get_async_db, get_async_db)
+    sessions = provider()
+    backend = get_backend()
+    try:
+        session = await sessions.__anext__()
+        versions = await backend.versions(tags)
+        body, headers = await view.render(session, await view.validators(session, versions))
+        await _store(backend, key, versions, body, headers)
+    except Exception:  # noqa: BLE001 - o pedido original já foi respondido com a entrada obsoleta
+        logger.warning("Falha ao revalidar entrada da cache de respostas %s", key, exc_info=True)
+    finally:
+        await sessions.aclose()
+        try:
+            await backend.unlock_refresh(key)
+        except Exception:  # noqa: BLE001 - o lock expira sozinho
+            logger.warning("Falha ao libertar o lock de revalidação %s", key, exc_info=True)
+
+
+async def _lock_refresh(backend, key: str) -> bool:
+    """Tenta ficar com a revalidação de `key`; `False` se outro pedido já a agendou."""
+
+    try:
+        return await backend.lock_refresh(key, settings.response_cache_refresh_lock_seconds)
+    except Exception:  # noqa: BLE001 - sem lock serve-se a entrada obsoleta sem revalidar
+        logger.warning("Falha ao obter o lock de revalidação %s", key, exc_info=True)
+        return False
+
+
+async def _uncached(view: _View, db: AsyncSession, tags: list[str]) -> Response:
+    # Sem cache as versões das tags continuam a contar para a ETag (escritas de stock não tocam `updated_at`).
+    try:
+        versions = await get_backend().versions(tags)
+    except Exception:  # noqa: BLE001
+        logger.warning("Cache de respostas indisponível; ETag sem versões das tags", exc_info=True)
+        versions = []
+    headers = await view.validators(db, versions)
+    if _is_not_modified(view.request, headers):
+        return http_cache.not_modified(headers)
+    return _response(*await view.render(db, headers))
+
+
+async def cached_response(
+    request: Request,
+    *,
+    db: AsyncSession,
+    tenant_id: UUID,
+    tags: list[str],
+    loader: Loader,
+    background_tasks: BackgroundTasks,
+    validators_from: Any | None = None,
+    surrogate_keys: SurrogateKeys | None = None,
+) -> Response:
+    """Devolve a resposta de `loader` a partir da cache sempre que possível.
+
+    `loader` recebe a sessão a usar e devolve o schema de resposta; só é chamado em cache
+    miss, quando uma escrita invalidou as `tags`, ou em segundo plano para revalidar.
+    Com `validators_from` (a query filtrada, antes de paginar) a resposta leva ETag e
+    Last-Modified e um `If-None-Match` coincidente recebe 304 sem carregar a página;
+    `surrogate_keys` deriva do payload as chaves de purga para a CDN.
+    """
+
+    view = _View(
+        request=request,
+        tenant_id=tenant_id,
+        loader=loader,
+        validators_from=validators_from,
+        surrogate_keys=surrogate_keys,
+    )
+    if not settings.response_cache_enabled:
+        return await _uncached(view, db, tags)
+
+    backend = get_backend()
+    key = _cache_key(request, tenant_id)
+    try:
+        raw, versions = await backend.get(key), await backend.versions(tags)
+    except Exception:  # noqa: BLE001
+        logger.warning("Cache de respostas indisponível; a ler da base de dados", exc_info=True)
+        return await _uncached(view, db, tags)
+
+    entry = CacheEntry.loads(raw) if raw else None
+    if entry is not None and entry.versions == versions:
+        age = time.time() - entry.stored_at
+        if age < settings.response_cache_ttl_seconds + settings.response_cache_stale_seconds:
+            fresh = age < settings.response_cache_ttl_seconds
+            if not fresh and await _lock_refresh(backend, key):
+                background_tasks.add_task(_refresh, view, key, tags)
+            if _is_not_modified(request, entry.headers):
+                return http_cache.not_modified(entry.headers)
+            return _response(entry.body, entry.headers, "HIT" if fresh else "STALE")
+
+    try:
+        headers = await view.validators(db, versions)
+        if _is_not_modified(request, headers):
+            return http_cache.not_modified(headers)
+        body, headers = await view.render(db, headers)
+    except SQLAlchemyError:
+        if entry is not None and time.time() - entry.stored_at < _retention_seconds():
+            logger.warning("Base de dados indisponível; a servir entrada obsoleta %s", key, exc_info=True)
+            return _response(entry.body, entry.headers, "STALE")
+        raise
+    entry = await _store(backend, key, versions, body, headers)
+    return _response(entry.body, entry.headers, "MISS")
@@ -8,6 +8,9 @@ from app.core.config import settings
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Audiência dos tokens de cotação: `decode_token` rejeita-os, pelo que não servem de access token.
+QUOTE_TOKEN_AUDIENCE = "checkout-quote"
+
 
 def create_access_token(subject: str, expires_delta: Optional[int] = None, **claims: Any) -> str:
     expire_minutes = expires_delta or settings.access_token_expire_minutes
@@ -20,6 +23,18 @@ def decode_token(token: str) -> dict[str, Any]:
     return jwt.decode(token, settings.jwt_secret_key, algorithms=[settings.jwt_algorithm])
 
 
+def create_quote_token(subject: str, expires_seconds: int, **claims: Any) -> str:
+    expire = datetime.now(timezone.utc) + timedelta(seconds=expires_seconds)
+    payload = {"sub": subject, "aud": QUOTE_TOKEN_AUDIENCE, "exp": expire, **claims}
+    return jwt.encode(payload, settings.jwt_secret_key, algorithm=settings.jwt_algorithm)
+
+
+def decode_quote_token(token: str) -> dict[str, Any]:
+    return jwt.decode(
+        token, settings.jwt_secret_key, algorithms=[settings.jwt_algorithm], audience=QUOTE_TOKEN_AUDIENCE
+    )
+
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
@@ -0,0 +1,17 @@
+"""Primitivas de domínio relacionadas com tenants."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from uuid import UUID
+
+
+@dataclass(frozen=True)
+class TenantContext:
+    """Estrutura simples (imutável) com o tenant ativo a ser usado pelo request."""
+
+    id: UUID
+    slug: str
+    is_active: bool
+    # Fuso IANA usado para agrupar métricas por dia local (dashboards).
+    timezone: str = "UTC"
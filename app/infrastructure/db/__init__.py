@@ -1,2 +1,3 @@
 from app.infrastructure.db.base_class import Base  # noqa: F401
 from app.infrastructure.db import models  # noqa: F401
+from app.infrastructure.db import search  # noqa: F401
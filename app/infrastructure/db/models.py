@@ -3,11 +3,27 @@
 from __future__ import annotations
 
 import uuid
-from datetime import datetime
+from datetime import date, datetime
 from typing import List, Optional
 
-from sqlalchemy import Boolean, DateTime, Enum, ForeignKey, Index, Integer, JSON, Numeric, String, Text
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy import (
+    JSON,
+    Boolean,
+    Date,
+    DateTime,
+    Enum,
+    ForeignKey,
+    Index,
+    Integer,
+    Numeric,
+    String,
+    Text,
+    UniqueConstraint,
+    case,
+    func,
+    select,
+)
+from sqlalchemy.orm import Mapped, column_property, mapped_column, relationship
 
 from app.domain.enums import (
     AgendamentoStatus,
@@ -74,6 +90,7 @@ class User(Base, TimestampMixin, TenantScopedMixin):
     password_hash: Mapped[str] = mapped_column(String(255), nullable=False)
     role: Mapped[UserRole] = mapped_column(Enum(UserRole), nullable=False)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
+    token_version: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
 
     tenant: Mapped[Tenant] = relationship()
     cliente: Mapped[Optional["Cliente"]] = relationship(back_populates="user", uselist=False)
@@ -85,7 +102,11 @@ class Merchant(Base, TimestampMixin, TenantScopedMixin):
     """Loja do marketplace, dona de produtos."""
 
     __tablename__ = "merchants"
-    __table_args__ = (Index("ix_merchants_slug", "slug"),)
+    __table_args__ = (
+        Index("ix_merchants_slug", "slug"),
+        Index("ix_merchants_tenant_nome_id", "tenant_id", "nome", "id"),
+        Index("ix_merchants_nome_trgm", "nome", postgresql_using="gin", postgresql_ops={"nome": "gin_trgm_ops"}),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(GUID(), primary_key=True, default=uuid.uuid4)
     nome: Mapped[str] = mapped_column(String(150), nullable=False)
@@ -122,7 +143,10 @@ class Categoria(Base, TimestampMixin, TenantScopedMixin):
     """Categoria de produtos dentro de um merchant."""
 
     __tablename__ = "categorias"
-    __table_args__ = (Index("ix_categoria_tenant_merchant", "tenant_id", "merchant_id"),)
+    __table_args__ = (
+        Index("ix_categoria_tenant_merchant", "tenant_id", "merchant_id"),
+        Index("ix_categorias_tenant_nome_id", "tenant_id", "nome", "id"),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(GUID(), primary_key=True, default=uuid.uuid4)
     nome: Mapped[str] = mapped_column(String(120), nullable=False)
@@ -141,7 +165,11 @@ class Produto(Base, TimestampMixin, TenantScopedMixin):
     """Produto físico associado a um merchant."""
 
     __tablename__ = "produtos"
-    __table_args__ = (Index("ix_produtos_tenant_merchant", "tenant_id", "merchant_id"),)
+    __table_args__ = (
+        Index("ix_produtos_tenant_merchant", "tenant_id", "merchant_id"),
+        Index("ix_produtos_tenant_nome_id", "tenant_id", "nome", "id"),
+        Index("ix_produtos_tenant_merchant_nome_id", "tenant_id", "merchant_id", "nome", "id"),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(GUID(), primary_key=True, default=uuid.uuid4)
     nome: Mapped[str] = mapped_column(String(150), nullable=False)
@@ -160,16 +188,90 @@ class Produto(Base, TimestampMixin, TenantScopedMixin):
     atributos_extras: Mapped[dict] = mapped_column(JSON, default=dict)
     permitir_backorder: Mapped[bool] = mapped_column(Boolean, default=False)
     max_por_pedido: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    # Modo "hot item": com N > 0 o stock vive em N sub-contadores (`ProdutoStockShard`).
+    stock_shards: Mapped[int] = mapped_column(Integer, default=0)
     ativo: Mapped[bool] = mapped_column(Boolean, default=True)
 
     merchant: Mapped[Merchant] = relationship(back_populates="produtos")
     categoria: Mapped[Optional["Categoria"]] = relationship(back_populates="produtos")
 
+    @property
+    def stock_disponivel(self) -> int:
+        """Stock disponível para venda: stock total menos as reservas ativas de carrinhos."""
+
+        return self.stock_total - self.stock_reservado
+
+
+class ProdutoStockShard(Base, TimestampMixin, TenantScopedMixin):
+    """Sub-contador do stock de um produto em modo "hot item"."""
+
+    __tablename__ = "produto_stock_shards"
+    __table_args__ = (UniqueConstraint("produto_id", "shard", name="uq_produto_stock_shards_produto_shard"),)
+
+    id: Mapped[uuid.UUID] = mapped_column(GUID(), primary_key=True, default=uuid.uuid4)
+    produto_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("produtos.id", ondelete="CASCADE"), nullable=False)
+    shard: Mapped[int] = mapped_column(Integer, nullable=False)
+    stock: Mapped[int] = mapped_column(Integer, default=0)
+
+
+# Stock total exposto pelos read models: com shards é `stock_atual` mais a soma dos sub-contadores
+# (o CASE evita a subquery para produtos fora do modo "hot item").
+Produto.stock_total = column_property(
+    case(
+        (
+            Produto.stock_shards > 0,
+            Produto.stock_atual
+            + select(func.coalesce(func.sum(ProdutoStockShard.stock), 0))
+            .where(ProdutoStockShard.produto_id == Produto.id)
+            .correlate_except(ProdutoStockShard)
+            .scalar_subquery(),
+        ),
+        else_=Produto.stock_atual,
+    )
+)
+
+
+class ReservaStock(Base, TimestampMixin, TenantScopedMixin):
+    """Reserva temporária de stock de um produto no carrinho de um cliente."""
+
+    __tablename__ = "reservas_stock"
+    __table_args__ = (
+        UniqueConstraint("cliente_id", "produto_id", name="uq_reservas_stock_cliente_produto"),
+        # Agregado das reservas ativas por produto servido só pelo índice.
+        Index(
+            "ix_reservas_stock_produto_expira",
+            "produto_id",
+            "expira_em",
+            postgresql_include=["quantidade"],
+        ),
+        Index("ix_reservas_stock_expira", "expira_em"),
+    )
+
+    id: Mapped[uuid.UUID] = mapped_column(GUID(), primary_key=True, default=uuid.uuid4)
+    produto_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("produtos.id", ondelete="CASCADE"), nullable=False)
+    cliente_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("clientes.id", ondelete="CASCADE"), nullable=False)
+    quantidade: Mapped[int] = mapped_column(Integer, nullable=False)
+    expira_em: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+
+
+# Diferido: a subquery só entra nos SELECT que pedem `undefer` (read models com `stock_disponivel`).
+Produto.stock_reservado = column_property(
+    select(func.coalesce(func.sum(ReservaStock.quantidade), 0))
+    .where(ReservaStock.produto_id == Produto.id, ReservaStock.expira_em > func.now())
+    .correlate_except(ReservaStock)
+    .scalar_subquery(),
+    deferred=True,
+)
+
 
 class PrestadorServico(Base, TimestampMixin, TenantScopedMixin):
     """Prestador de serviços (profissional) multi-tenant."""
 
     __tablename__ = "prestadores"
+    __table_args__ = (
+        Index("ix_prestadores_tenant_nome_id", "tenant_id", "nome", "id"),
+        Index("ix_prestadores_nome_trgm", "nome", postgresql_using="gin", postgresql_ops={"nome": "gin_trgm_ops"}),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(GUID(), primary_key=True, default=uuid.uuid4)
     nome: Mapped[str] = mapped_column(String(150), nullable=False)
@@ -195,6 +297,7 @@ class Servico(Base, TimestampMixin, TenantScopedMixin):
     """Serviço comercializado por um prestador."""
 
     __tablename__ = "servicos"
+    __table_args__ = (Index("ix_servicos_tenant_prestador_nome_id", "tenant_id", "prestador_id", "nome", "id"),)
 
     id: Mapped[uuid.UUID] = mapped_column(GUID(), primary_key=True, default=uuid.uuid4)
     nome: Mapped[str] = mapped_column(String(150), nullable=False)
@@ -237,7 +340,7 @@ class Cliente(Base, TimestampMixin, TenantScopedMixin):
     pedidos: Mapped[List["Pedido"]] = relationship(back_populates="cliente")
     agendamentos: Mapped[List["Agendamento"]] = relationship(back_populates="cliente")
     enderecos: Mapped[List["ClienteEndereco"]] = relationship(
-        back_populates="cliente", cascade="all, delete-orphan"
+        back_populates="cliente", cascade="all, delete-orphan", foreign_keys="ClienteEndereco.cliente_id"
     )
     default_address: Mapped[Optional["ClienteEndereco"]] = relationship(
         "ClienteEndereco", foreign_keys=[default_address_id], post_update=True
@@ -262,14 +365,17 @@ class ClienteEndereco(Base, TimestampMixin, TenantScopedMixin):
     longitude: Mapped[Optional[float]] = mapped_column(Numeric(10, 7), nullable=True)
     ativo: Mapped[bool] = mapped_column(Boolean, default=True)
 
-    cliente: Mapped[Cliente] = relationship(back_populates="enderecos")
+    cliente: Mapped[Cliente] = relationship(back_populates="enderecos", foreign_keys=[cliente_id])
 
 
 class CartItem(Base, TimestampMixin, TenantScopedMixin):
     """Item de carrinho persistido do lado do servidor."""
 
     __tablename__ = "cart_items"
-    __table_args__ = (Index("ix_cart_item_cliente", "tenant_id", "cliente_id"),)
+    __table_args__ = (
+        Index("ix_cart_item_cliente", "tenant_id", "cliente_id"),
+        UniqueConstraint("cliente_id", "tipo", "ref_id", name="uq_cart_items_cliente_tipo_ref"),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(GUID(), primary_key=True, default=uuid.uuid4)
     cliente_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("clientes.id", ondelete="CASCADE"))
@@ -285,7 +391,10 @@ class Pedido(Base, TimestampMixin, TenantScopedMixin):
     """Pedido de checkout composto por itens."""
 
     __tablename__ = "pedidos"
-    __table_args__ = (Index("ix_pedido_cliente", "tenant_id", "cliente_id"),)
+    __table_args__ = (
+        Index("ix_pedido_cliente", "tenant_id", "cliente_id"),
+        Index("ix_pedido_tenant_created", "tenant_id", "created_at"),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(GUID(), primary_key=True, default=uuid.uuid4)
     cliente_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("clientes.id", ondelete="CASCADE"))
@@ -306,12 +415,23 @@ class Pedido(Base, TimestampMixin, TenantScopedMixin):
 
     cliente: Mapped[Cliente] = relationship(back_populates="pedidos")
     itens: Mapped[List["ItemPedido"]] = relationship(back_populates="pedido", cascade="all, delete-orphan")
+    sub_pedidos: Mapped[List["PedidoMerchant"]] = relationship(back_populates="pedido", cascade="all, delete-orphan")
 
 
 class ItemPedido(Base, TimestampMixin, TenantScopedMixin):
     """Item pertencente a um pedido (produto ou serviço)."""
 
     __tablename__ = "itens_pedido"
+    __table_args__ = (
+        # Pedidos/agregados de um merchant lidos só pelo índice (dashboard, listagens, rebuild dos rollups).
+        Index(
+            "ix_itens_pedido_tenant_merchant",
+            "tenant_id",
+            "merchant_id",
+            "pedido_id",
+            postgresql_include=["tipo", "ref_id", "quantidade", "preco_unitario"],
+        ),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(GUID(), primary_key=True, default=uuid.uuid4)
     pedido_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("pedidos.id", ondelete="CASCADE"))
@@ -332,11 +452,37 @@ class ItemPedido(Base, TimestampMixin, TenantScopedMixin):
     pedido: Mapped[Pedido] = relationship(back_populates="itens")
 
 
+class PedidoMerchant(Base, TimestampMixin, TenantScopedMixin):
+    """Parte de um pedido que cabe a um merchant (sub-pedido), com status de preparação próprio."""
+
+    __tablename__ = "pedidos_merchant"
+    __table_args__ = (
+        UniqueConstraint("pedido_id", "merchant_id", name="uq_pedidos_merchant_pedido_merchant"),
+        # Caixa de entrada do merchant (filtro por status, mais recentes primeiro) num range scan.
+        Index("ix_pedidos_merchant_inbox", "tenant_id", "merchant_id", "status", "created_at"),
+    )
+
+    id: Mapped[uuid.UUID] = mapped_column(GUID(), primary_key=True, default=uuid.uuid4)
+    pedido_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("pedidos.id", ondelete="CASCADE"), nullable=False)
+    merchant_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("merchants.id", ondelete="CASCADE"), nullable=False)
+    subtotal: Mapped[float] = mapped_column(Numeric(10, 2), nullable=False)
+    total_itens: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    status: Mapped[PedidoStatus] = mapped_column(Enum(PedidoStatus), nullable=False, default=PedidoStatus.CRIADO)
+    data_envio: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    data_conclusao: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    pedido: Mapped[Pedido] = relationship(back_populates="sub_pedidos")
+
+
 class Agendamento(Base, TimestampMixin, TenantScopedMixin):
     """Agendamento de serviço entre cliente e prestador."""
 
     __tablename__ = "agendamentos"
-    __table_args__ = (Index("ix_agendamento_cliente", "tenant_id", "cliente_id"),)
+    __table_args__ = (
+        Index("ix_agendamento_cliente", "tenant_id", "cliente_id"),
+        Index("ix_agendamento_prestador_status", "tenant_id", "prestador_id", "status"),
+        Index("ix_agendamento_prestador_data", "tenant_id", "prestador_id", "data_hora"),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(GUID(), primary_key=True, default=uuid.uuid4)
     cliente_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("clientes.id", ondelete="CASCADE"))
@@ -356,3 +502,84 @@ class Agendamento(Base, TimestampMixin, TenantScopedMixin):
     cliente: Mapped[Cliente] = relationship(back_populates="agendamentos")
     prestador: Mapped[PrestadorServico] = relationship()
     servico: Mapped[Servico] = relationship()
+
+
+class IdempotencyKey(Base, TimestampMixin, TenantScopedMixin):
+    """Resposta guardada de um pedido com `Idempotency-Key` (checkout, agendamentos)."""
+
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        UniqueConstraint("tenant_id", "cliente_id", "chave", name="uq_idempotency_keys_tenant_cliente_chave"),
+        Index("ix_idempotency_keys_expira", "expira_em"),
+    )
+
+    id: Mapped[uuid.UUID] = mapped_column(GUID(), primary_key=True, default=uuid.uuid4)
+    cliente_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("clientes.id", ondelete="CASCADE"), nullable=False)
+    chave: Mapped[str] = mapped_column(String(255), nullable=False)
+    request_hash: Mapped[str] = mapped_column(String(64), nullable=False)
+    # Nulo enquanto o pedido original está em curso.
+    resposta: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
+    expira_em: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    # Fim do lease do pedido em curso; depois dele (sem resposta) a chave pode ser retomada. Passa a
+    # nulo quando a operação faz commit: a partir daí a chave nunca é retomada.
+    em_curso_ate: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    # Token do pedido que detém a chave; o commit da operação só passa se ainda for o dono.
+    dono: Mapped[Optional[uuid.UUID]] = mapped_column(GUID(), nullable=True)
+
+
+# Rollups dos dashboards, mantidos incrementalmente (`app/services/kpi_service.py`).
+
+
+class MerchantKpiDiario(Base, TimestampMixin, TenantScopedMixin):
+    """Pedidos, faturação e itens vendidos de um merchant por dia (local do tenant) e status do pedido."""
+
+    __tablename__ = "merchant_kpis_diarios"
+    __table_args__ = (
+        UniqueConstraint(
+            "merchant_id", "dia", "status", "shard", name="uq_merchant_kpis_diarios_merchant_dia_status_shard"
+        ),
+    )
+
+    id: Mapped[uuid.UUID] = mapped_column(GUID(), primary_key=True, default=uuid.uuid4)
+    merchant_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("merchants.id", ondelete="CASCADE"), nullable=False)
+    dia: Mapped[date] = mapped_column(Date, nullable=False)
+    status: Mapped[PedidoStatus] = mapped_column(Enum(PedidoStatus), nullable=False)
+    # Cada chave é repartida por `KPI_ROLLUP_SHARDS` linhas (somadas na leitura), como o stock "hot item".
+    shard: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    pedidos: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    faturacao: Mapped[float] = mapped_column(Numeric(14, 2), nullable=False, default=0)
+    itens: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class MerchantProdutoVendas(Base, TimestampMixin, TenantScopedMixin):
+    """Quantidade vendida de cada produto por status do pedido."""
+
+    __tablename__ = "merchant_produto_vendas"
+    __table_args__ = (
+        UniqueConstraint("produto_id", "status", "shard", name="uq_merchant_produto_vendas_produto_status_shard"),
+        Index("ix_merchant_produto_vendas_merchant", "merchant_id", "status"),
+    )
+
+    id: Mapped[uuid.UUID] = mapped_column(GUID(), primary_key=True, default=uuid.uuid4)
+    merchant_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("merchants.id", ondelete="CASCADE"), nullable=False)
+    produto_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("produtos.id", ondelete="CASCADE"), nullable=False)
+    status: Mapped[PedidoStatus] = mapped_column(Enum(PedidoStatus), nullable=False)
+    shard: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    quantidade: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class PrestadorKpi(Base, TimestampMixin, TenantScopedMixin):
+    """Número de agendamentos de um prestador por dia do agendamento (local do tenant) e status."""
+
+    __tablename__ = "prestador_kpis"
+    __table_args__ = (
+        UniqueConstraint("prestador_id", "dia", "status", name="uq_prestador_kpis_prestador_dia_status"),
+    )
+
+    id: Mapped[uuid.UUID] = mapped_column(GUID(), primary_key=True, default=uuid.uuid4)
+    prestador_id: Mapped[uuid.UUID] = mapped_column(
+        ForeignKey("prestadores.id", ondelete="CASCADE"), nullable=False
+    )
+    dia: Mapped[date] = mapped_column(Date, nullable=False)
+    status: Mapped[AgendamentoStatus] = mapped_column(Enum(AgendamentoStatus), nullable=False)
+    agendamentos: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
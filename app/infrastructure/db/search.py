@@ -0,0 +1,133 @@
+"""Estruturas de pesquisa full-text mantidas pela base de dados.
+
+Em Postgres cada tabela pesquisável tem uma coluna gerada `search_vector` (tsvector ponderado)
+com índice GIN, criada por migration e deliberadamente fora do mapeamento ORM. Em SQLite
+(testes) é criada uma tabela espelho FTS5 `<tabela>_fts`, sincronizada por triggers.
+
+A pesquisa por nome de merchants/prestadores usa índices GIN de trigramas (pg_trgm); em SQLite
+as funções `similarity`/`word_similarity` são registadas em Python em cada ligação.
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+
+from sqlalchemy import DDL, event
+from sqlalchemy.engine import Engine
+
+from app.infrastructure.db import models
+
+SEARCH_VECTOR_COLUMN = "search_vector"
+# Deve coincidir com a configuração usada na coluna gerada (migration 7b2e4f90d1a6).
+SEARCH_CONFIG = "portuguese"
+
+
+@dataclass(frozen=True)
+class SearchableTable:
+    """Colunas indexadas de uma tabela e respetivo peso (A > B > C)."""
+
+    table: str
+    columns: tuple[tuple[str, str], ...]
+
+    @property
+    def fts_table(self) -> str:
+        return f"{self.table}_fts"
+
+
+_WEIGHTS = (("nome", "A"), ("descricao_curta", "B"), ("descricao_detalhada", "C"))
+
+PRODUTOS = SearchableTable(table=models.Produto.__tablename__, columns=_WEIGHTS)
+SERVICOS = SearchableTable(table=models.Servico.__tablename__, columns=_WEIGHTS)
+
+# Pesos bm25 do FTS5 equivalentes aos pesos A/B/C (a primeira coluna é o id, não indexado).
+FTS5_WEIGHTS = {"A": 10.0, "B": 4.0, "C": 1.0}
+
+
+def _sqlite_mirror_ddl(searchable: SearchableTable) -> list[DDL]:
+    columns = [column for column, _ in searchable.columns]
+    fts = searchable.fts_table
+    new_values = ", ".join(f"new.{column}" for column in columns)
+    return [
+        DDL(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+            f"doc_id UNINDEXED, {', '.join(columns)}, tokenize='unicode61 remove_diacritics 2')"
+        ),
+        DDL(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {searchable.table} BEGIN "
+            f"INSERT INTO {fts} (doc_id, {', '.join(columns)}) VALUES (new.id, {new_values}); END"
+        ),
+        DDL(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {searchable.table} BEGIN "
+            f"DELETE FROM {fts} WHERE doc_id = old.id; "
+            f"INSERT INTO {fts} (doc_id, {', '.join(columns)}) VALUES (new.id, {new_values}); END"
+        ),
+        DDL(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {searchable.table} BEGIN "
+            f"DELETE FROM {fts} WHERE doc_id = old.id; END"
+        ),
+    ]
+
+
+for _model, _searchable in ((models.Produto, PRODUTOS), (models.Servico, SERVICOS)):
+    for _ddl in _sqlite_mirror_ddl(_searchable):
+        event.listen(_model.__table__, "after_create", _ddl.execute_if(dialect="sqlite"))
+    event.listen(
+        _model.__table__,
+        "before_drop",
+        DDL(f"DROP TABLE IF EXISTS {_searchable.fts_table}").execute_if(dialect="sqlite"),
+    )
+
+
+# --- Trigramas (pg_trgm) ---------------------------------------------------------------------
+# Limiares por omissão do pg_trgm (`pg_trgm.similarity_threshold` / `word_similarity_threshold`).
+SIMILARITY_THRESHOLD = 0.3
+WORD_SIMILARITY_THRESHOLD = 0.6
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def _words(value: str | None) -> list[str]:
+    return _WORD.findall((value or "").lower())
+
+
+def _trigrams(words: list[str]) -> set[str]:
+    grams: set[str] = set()
+    for word in words:
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _ratio(left: set[str], right: set[str]) -> float:
+    if not left or not right:
+        return 0.0
+    shared = len(left & right)
+    return shared / (len(left) + len(right) - shared)
+
+
+def trigram_similarity(left: str | None, right: str | None) -> float:
+    """Equivalente Python de `similarity()` do pg_trgm (usado pelo fallback SQLite)."""
+
+    return _ratio(_trigrams(_words(left)), _trigrams(_words(right)))
+
+
+def trigram_word_similarity(term: str | None, value: str | None) -> float:
+    """Aproximação de `word_similarity()`: melhor semelhança entre `term` e janelas de palavras de `value`."""
+
+    term_words, words = _words(term), _words(value)
+    if not term_words or not words:
+        return 0.0
+    wanted = _trigrams(term_words)
+    size = min(len(term_words), len(words))
+    return max(_ratio(wanted, _trigrams(words[i : i + size])) for i in range(len(words) - size + 1))
+
+
+@event.listens_for(Engine, "connect")
+def _register_sqlite_trigram_functions(dbapi_connection, connection_record):
+    # Só os drivers SQLite (sqlite3/aiosqlite) expõem `create_function`; Postgres usa o pg_trgm.
+    create_function = getattr(dbapi_connection, "create_function", None)
+    if create_function is None:
+        return
+    create_function("similarity", 2, trigram_similarity, deterministic=True)
+    create_function("word_similarity", 2, trigram_word_similarity, deterministic=True)
@@ -6,6 +6,7 @@ from alembic import context
 from app.core.config import settings
 from app.infrastructure.db.base_class import Base
 from app.infrastructure.db import models  # noqa: F401
+from app.infrastructure.db.search import SEARCH_VECTOR_COLUMN
 
 config = context.config
 config.set_main_option("sqlalchemy.url", settings.database_url)
@@ -16,9 +17,20 @@ if config.config_file_name is not None:
 target_metadata = Base.metadata
 
 
+def include_object(object_, name, type_, reflected, compare_to):
+    # `search_vector` (coluna gerada e índice GIN) é gerido apenas por migrations, não existe no ORM.
+    if type_ == "column" and name == SEARCH_VECTOR_COLUMN:
+        return False
+    if type_ == "index" and name and name.endswith(f"_{SEARCH_VECTOR_COLUMN}"):
+        return False
+    return True
+
+
 def run_migrations_offline():
     url = config.get_main_option("sqlalchemy.url")
-    context.configure(url=url, target_metadata=target_metadata, literal_binds=True)
+    context.configure(
+        url=url, target_metadata=target_metadata, literal_binds=True, include_object=include_object
+    )
 
     with context.begin_transaction():
         context.run_migrations()
@@ -32,7 +44,9 @@ def run_migrations_online():
     )
 
     with connectable.connect() as connection:
-        context.configure(connection=connection, target_metadata=target_metadata)
+        context.configure(
+            connection=connection, target_metadata=target_metadata, include_object=include_object
+        )
 
         with context.begin_transaction():
             context.run_migrations()
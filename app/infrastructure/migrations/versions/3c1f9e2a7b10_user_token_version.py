@@ -0,0 +1,29 @@
+"""user token version
+
+Revision ID: 3c1f9e2a7b10
+Revises: 28a839dca61f
+Create Date: 2026-10-16 09:12:40.118204
+
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c1f9e2a7b10'
+down_revision = '28a839dca61f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Apply upgrade migrations."""
+    op.add_column('users', sa.Column('token_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Revert upgrade migrations."""
+    op.drop_column('users', 'token_version')
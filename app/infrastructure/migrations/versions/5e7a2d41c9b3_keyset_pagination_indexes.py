@@ -0,0 +1,42 @@
+"""keyset pagination indexes
+
+Revision ID: 5e7a2d41c9b3
+Revises: 3c1f9e2a7b10
+Create Date: 2026-10-16 10:02:11.540771
+
+"""
+
+from __future__ import annotations
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '5e7a2d41c9b3'
+down_revision = '3c1f9e2a7b10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Apply upgrade migrations."""
+    op.create_index('ix_merchants_tenant_nome_id', 'merchants', ['tenant_id', 'nome', 'id'], unique=False)
+    op.create_index('ix_categorias_tenant_nome_id', 'categorias', ['tenant_id', 'nome', 'id'], unique=False)
+    op.create_index('ix_produtos_tenant_nome_id', 'produtos', ['tenant_id', 'nome', 'id'], unique=False)
+    op.create_index(
+        'ix_produtos_tenant_merchant_nome_id', 'produtos', ['tenant_id', 'merchant_id', 'nome', 'id'], unique=False
+    )
+    op.create_index('ix_prestadores_tenant_nome_id', 'prestadores', ['tenant_id', 'nome', 'id'], unique=False)
+    op.create_index(
+        'ix_servicos_tenant_prestador_nome_id', 'servicos', ['tenant_id', 'prestador_id', 'nome', 'id'], unique=False
+    )
+
+
+def downgrade() -> None:
+    """Revert upgrade migrations."""
+    op.drop_index('ix_servicos_tenant_prestador_nome_id', table_name='servicos')
+    op.drop_index('ix_prestadores_tenant_nome_id', table_name='prestadores')
+    op.drop_index('ix_produtos_tenant_merchant_nome_id', table_name='produtos')
+    op.drop_index('ix_produtos_tenant_nome_id', table_name='produtos')
+    op.drop_index('ix_categorias_tenant_nome_id', table_name='categorias')
+    op.drop_index('ix_merchants_tenant_nome_id', table_name='merchants')
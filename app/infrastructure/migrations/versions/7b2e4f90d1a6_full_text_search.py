@@ -0,0 +1,45 @@
+"""full text search vectors
+
+Revision ID: 7b2e4f90d1a6
+Revises: 5e7a2d41c9b3
+Create Date: 2026-10-16 11:20:37.402915
+
+"""
+
+from __future__ import annotations
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '7b2e4f90d1a6'
+down_revision = '5e7a2d41c9b3'
+branch_labels = None
+depends_on = None
+
+SEARCH_VECTOR = (
+    "setweight(to_tsvector('portuguese', coalesce(nome, '')), 'A') || "
+    "setweight(to_tsvector('portuguese', coalesce(descricao_curta, '')), 'B') || "
+    "setweight(to_tsvector('portuguese', coalesce(descricao_detalhada, '')), 'C')"
+)
+TABLES = ('produtos', 'servicos')
+
+
+def upgrade() -> None:
+    """Apply upgrade migrations."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table in TABLES:
+        op.execute(
+            f"ALTER TABLE {table} ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ({SEARCH_VECTOR}) STORED"
+        )
+        op.create_index(f'ix_{table}_search_vector', table, ['search_vector'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    """Revert upgrade migrations."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table in reversed(TABLES):
+        op.drop_index(f'ix_{table}_search_vector', table_name=table)
+        op.drop_column(table, 'search_vector')
@@ -0,0 +1,49 @@
+"""trigram name indexes
+
+Revision ID: 9d4c1b7e3f58
+Revises: 7b2e4f90d1a6
+Create Date: 2026-10-16 12:05:19.873140
+
+"""
+
+from __future__ import annotations
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '9d4c1b7e3f58'
+down_revision = '7b2e4f90d1a6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Apply upgrade migrations."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index(
+        'ix_merchants_nome_trgm',
+        'merchants',
+        ['nome'],
+        unique=False,
+        postgresql_using='gin',
+        postgresql_ops={'nome': 'gin_trgm_ops'},
+    )
+    op.create_index(
+        'ix_prestadores_nome_trgm',
+        'prestadores',
+        ['nome'],
+        unique=False,
+        postgresql_using='gin',
+        postgresql_ops={'nome': 'gin_trgm_ops'},
+    )
+
+
+def downgrade() -> None:
+    """Revert upgrade migrations."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.drop_index('ix_prestadores_nome_trgm', table_name='prestadores')
+    op.drop_index('ix_merchants_nome_trgm', table_name='merchants')
@@ -0,0 +1,53 @@
+"""dashboard merchant prestador indexes
+
+Revision ID: a6d3e8f1c274
+Revises: f4c7a2e9b561
+Create Date: 2026-10-16 19:48:03.117920
+
+"""
+
+from __future__ import annotations
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6d3e8f1c274'
+down_revision = 'f4c7a2e9b561'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Apply upgrade migrations."""
+    # Itens antigos sem snapshot do merchant: o dashboard e os rollups passam a depender dele.
+    op.execute(
+        """
+        UPDATE itens_pedido SET merchant_id = (
+            SELECT produtos.merchant_id FROM produtos WHERE produtos.id = itens_pedido.ref_id
+        )
+        WHERE itens_pedido.tipo = 'produto' AND itens_pedido.merchant_id IS NULL
+        """
+    )
+    op.create_index(
+        'ix_itens_pedido_tenant_merchant',
+        'itens_pedido',
+        ['tenant_id', 'merchant_id', 'pedido_id'],
+        unique=False,
+        postgresql_include=['tipo', 'ref_id', 'quantidade', 'preco_unitario'],
+    )
+    op.create_index('ix_pedido_tenant_created', 'pedidos', ['tenant_id', 'created_at'], unique=False)
+    op.create_index(
+        'ix_agendamento_prestador_status', 'agendamentos', ['tenant_id', 'prestador_id', 'status'], unique=False
+    )
+    op.create_index(
+        'ix_agendamento_prestador_data', 'agendamentos', ['tenant_id', 'prestador_id', 'data_hora'], unique=False
+    )
+
+
+def downgrade() -> None:
+    """Revert upgrade migrations."""
+    op.drop_index('ix_agendamento_prestador_data', table_name='agendamentos')
+    op.drop_index('ix_agendamento_prestador_status', table_name='agendamentos')
+    op.drop_index('ix_pedido_tenant_created', table_name='pedidos')
+    op.drop_index('ix_itens_pedido_tenant_merchant', table_name='itens_pedido')
@@ -0,0 +1,50 @@
+"""produto stock shards
+
+Revision ID: b3f6a9d2c4e1
+Revises: 9d4c1b7e3f58
+Create Date: 2026-10-16 15:21:47.302914
+
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3f6a9d2c4e1'
+down_revision = '9d4c1b7e3f58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Apply upgrade migrations."""
+    guid = postgresql.UUID(as_uuid=True)
+    op.add_column('produtos', sa.Column('stock_shards', sa.Integer(), server_default='0', nullable=False))
+    op.create_table(
+        'produto_stock_shards',
+        sa.Column('id', guid, nullable=False),
+        sa.Column('produto_id', guid, nullable=False),
+        sa.Column('shard', sa.Integer(), nullable=False),
+        sa.Column('stock', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('tenant_id', guid, nullable=False),
+        sa.ForeignKeyConstraint(['produto_id'], ['produtos.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['tenant_id'], ['tenants.id'], ondelete='RESTRICT'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('produto_id', 'shard', name='uq_produto_stock_shards_produto_shard'),
+    )
+    op.create_index(
+        op.f('ix_produto_stock_shards_tenant_id'), 'produto_stock_shards', ['tenant_id'], unique=False
+    )
+
+
+def downgrade() -> None:
+    """Revert upgrade migrations."""
+    op.drop_index(op.f('ix_produto_stock_shards_tenant_id'), table_name='produto_stock_shards')
+    op.drop_table('produto_stock_shards')
+    op.drop_column('produtos', 'stock_shards')
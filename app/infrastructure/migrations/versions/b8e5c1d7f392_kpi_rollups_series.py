@@ -0,0 +1,42 @@
+"""kpi rollups series
+
+Revision ID: b8e5c1d7f392
+Revises: a6d3e8f1c274
+Create Date: 2026-10-16 20:31:47.360218
+
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8e5c1d7f392'
+down_revision = 'a6d3e8f1c274'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Apply upgrade migrations."""
+    # Os dias passam a ser locais ao tenant e os agendamentos ganham o dia: os rollups são dados
+    # derivados, pelo que são esvaziados aqui e repostos com `scripts/rebuild_kpi_rollups.py`.
+    op.execute("DELETE FROM merchant_kpis_diarios")
+    op.execute("DELETE FROM prestador_kpis")
+    op.add_column('merchant_kpis_diarios', sa.Column('itens', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('prestador_kpis', sa.Column('dia', sa.Date(), nullable=False))
+    op.drop_constraint('uq_prestador_kpis_prestador_status', 'prestador_kpis', type_='unique')
+    op.create_unique_constraint(
+        'uq_prestador_kpis_prestador_dia_status', 'prestador_kpis', ['prestador_id', 'dia', 'status']
+    )
+
+
+def downgrade() -> None:
+    """Revert upgrade migrations."""
+    op.execute("DELETE FROM prestador_kpis")
+    op.drop_constraint('uq_prestador_kpis_prestador_dia_status', 'prestador_kpis', type_='unique')
+    op.create_unique_constraint('uq_prestador_kpis_prestador_status', 'prestador_kpis', ['prestador_id', 'status'])
+    op.drop_column('prestador_kpis', 'dia')
+    op.drop_column('merchant_kpis_diarios', 'itens')
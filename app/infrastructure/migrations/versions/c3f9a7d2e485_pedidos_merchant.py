@@ -0,0 +1,83 @@
+"""pedidos merchant
+
+Revision ID: c3f9a7d2e485
+Revises: b8e5c1d7f392
+Create Date: 2026-10-16 21:05:41.392817
+
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from app.domain.enums import PedidoStatus
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f9a7d2e485'
+down_revision = 'b8e5c1d7f392'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Apply upgrade migrations."""
+    guid = postgresql.UUID(as_uuid=True)
+    pedido_enum = postgresql.ENUM(
+        *[status.value for status in PedidoStatus], name="pedidostatus", create_type=False
+    )
+
+    op.create_table(
+        'pedidos_merchant',
+        sa.Column('id', guid, nullable=False),
+        sa.Column('pedido_id', guid, nullable=False),
+        sa.Column('merchant_id', guid, nullable=False),
+        sa.Column('subtotal', sa.Numeric(10, 2), nullable=False),
+        sa.Column('total_itens', sa.Integer(), nullable=False),
+        sa.Column('status', pedido_enum, nullable=False),
+        sa.Column('data_envio', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('data_conclusao', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('tenant_id', guid, nullable=False),
+        sa.ForeignKeyConstraint(['pedido_id'], ['pedidos.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['merchant_id'], ['merchants.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['tenant_id'], ['tenants.id'], ondelete='RESTRICT'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('pedido_id', 'merchant_id', name='uq_pedidos_merchant_pedido_merchant'),
+    )
+    op.create_index(op.f('ix_pedidos_merchant_tenant_id'), 'pedidos_merchant', ['tenant_id'], unique=False)
+    op.create_index(
+        'ix_pedidos_merchant_inbox',
+        'pedidos_merchant',
+        ['tenant_id', 'merchant_id', 'status', 'created_at'],
+        unique=False,
+    )
+
+    # Sub-pedidos dos pedidos existentes, com o status e as datas do pedido.
+    op.execute(
+        """
+        INSERT INTO pedidos_merchant (
+            id, pedido_id, merchant_id, subtotal, total_itens, status,
+            data_envio, data_conclusao, created_at, updated_at, tenant_id
+        )
+        SELECT
+            gen_random_uuid(), pedidos.id, itens_pedido.merchant_id,
+            SUM(itens_pedido.preco_unitario * itens_pedido.quantidade), SUM(itens_pedido.quantidade),
+            pedidos.status, pedidos.data_envio, pedidos.data_conclusao,
+            pedidos.created_at, pedidos.updated_at, pedidos.tenant_id
+        FROM itens_pedido
+        JOIN pedidos ON pedidos.id = itens_pedido.pedido_id
+        WHERE itens_pedido.tipo = 'produto' AND itens_pedido.merchant_id IS NOT NULL
+        GROUP BY pedidos.id, itens_pedido.merchant_id
+        """
+    )
+
+
+def downgrade() -> None:
+    """Revert upgrade migrations."""
+    op.drop_index('ix_pedidos_merchant_inbox', table_name='pedidos_merchant')
+    op.drop_index(op.f('ix_pedidos_merchant_tenant_id'), table_name='pedidos_merchant')
+    op.drop_table('pedidos_merchant')
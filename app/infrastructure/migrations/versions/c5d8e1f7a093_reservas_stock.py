@@ -0,0 +1,58 @@
+"""reservas stock
+
+Revision ID: c5d8e1f7a093
+Revises: b3f6a9d2c4e1
+Create Date: 2026-10-16 16:40:12.918455
+
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5d8e1f7a093'
+down_revision = 'b3f6a9d2c4e1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Apply upgrade migrations."""
+    guid = postgresql.UUID(as_uuid=True)
+    op.create_table(
+        'reservas_stock',
+        sa.Column('id', guid, nullable=False),
+        sa.Column('produto_id', guid, nullable=False),
+        sa.Column('cliente_id', guid, nullable=False),
+        sa.Column('quantidade', sa.Integer(), nullable=False),
+        sa.Column('expira_em', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('tenant_id', guid, nullable=False),
+        sa.ForeignKeyConstraint(['cliente_id'], ['clientes.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['produto_id'], ['produtos.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['tenant_id'], ['tenants.id'], ondelete='RESTRICT'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('cliente_id', 'produto_id', name='uq_reservas_stock_cliente_produto'),
+    )
+    op.create_index(op.f('ix_reservas_stock_tenant_id'), 'reservas_stock', ['tenant_id'], unique=False)
+    op.create_index(
+        'ix_reservas_stock_produto_expira',
+        'reservas_stock',
+        ['produto_id', 'expira_em'],
+        unique=False,
+        postgresql_include=['quantidade'],
+    )
+    op.create_index('ix_reservas_stock_expira', 'reservas_stock', ['expira_em'], unique=False)
+
+
+def downgrade() -> None:
+    """Revert upgrade migrations."""
+    op.drop_index('ix_reservas_stock_expira', table_name='reservas_stock')
+    op.drop_index('ix_reservas_stock_produto_expira', table_name='reservas_stock')
+    op.drop_index(op.f('ix_reservas_stock_tenant_id'), table_name='reservas_stock')
+    op.drop_table('reservas_stock')
@@ -0,0 +1,29 @@
+"""idempotency lease
+
+Revision ID: d5b2e8c4f617
+Revises: c3f9a7d2e485
+Create Date: 2026-10-17 10:12:08.614302
+
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5b2e8c4f617'
+down_revision = 'c3f9a7d2e485'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Apply upgrade migrations."""
+    op.add_column('idempotency_keys', sa.Column('em_curso_ate', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    """Revert upgrade migrations."""
+    op.drop_column('idempotency_keys', 'em_curso_ate')
@@ -0,0 +1,55 @@
+"""cart items unique line
+
+Revision ID: d7a1c3e5b820
+Revises: c5d8e1f7a093
+Create Date: 2026-10-16 17:55:03.611872
+
+"""
+
+from __future__ import annotations
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7a1c3e5b820'
+down_revision = 'c5d8e1f7a093'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Apply upgrade migrations."""
+    if op.get_bind().dialect.name == 'postgresql':
+        # Funde linhas duplicadas (criadas pela corrida do antigo SELECT + INSERT) na mais antiga.
+        op.execute(
+            """
+            WITH agregados AS (
+                SELECT (array_agg(id ORDER BY created_at, id))[1] AS manter, sum(quantidade) AS total
+                FROM cart_items
+                GROUP BY cliente_id, tipo, ref_id
+                HAVING count(*) > 1
+            )
+            UPDATE cart_items SET quantidade = agregados.total
+            FROM agregados
+            WHERE cart_items.id = agregados.manter
+            """
+        )
+        op.execute(
+            """
+            DELETE FROM cart_items a
+            USING cart_items b
+            WHERE a.cliente_id = b.cliente_id
+              AND a.tipo = b.tipo
+              AND a.ref_id = b.ref_id
+              AND (a.created_at, a.id) > (b.created_at, b.id)
+            """
+        )
+    op.create_unique_constraint(
+        'uq_cart_items_cliente_tipo_ref', 'cart_items', ['cliente_id', 'tipo', 'ref_id']
+    )
+
+
+def downgrade() -> None:
+    """Revert upgrade migrations."""
+    op.drop_constraint('uq_cart_items_cliente_tipo_ref', 'cart_items', type_='unique')
@@ -0,0 +1,50 @@
+"""idempotency keys
+
+Revision ID: e2b9f4a6c318
+Revises: d7a1c3e5b820
+Create Date: 2026-10-16 18:05:44.201733
+
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b9f4a6c318'
+down_revision = 'd7a1c3e5b820'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Apply upgrade migrations."""
+    guid = postgresql.UUID(as_uuid=True)
+    op.create_table(
+        'idempotency_keys',
+        sa.Column('id', guid, nullable=False),
+        sa.Column('cliente_id', guid, nullable=False),
+        sa.Column('chave', sa.String(length=255), nullable=False),
+        sa.Column('request_hash', sa.String(length=64), nullable=False),
+        sa.Column('resposta', sa.JSON(), nullable=True),
+        sa.Column('expira_em', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('tenant_id', guid, nullable=False),
+        sa.ForeignKeyConstraint(['cliente_id'], ['clientes.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['tenant_id'], ['tenants.id'], ondelete='RESTRICT'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('tenant_id', 'cliente_id', 'chave', name='uq_idempotency_keys_tenant_cliente_chave'),
+    )
+    op.create_index(op.f('ix_idempotency_keys_tenant_id'), 'idempotency_keys', ['tenant_id'], unique=False)
+    op.create_index('ix_idempotency_keys_expira', 'idempotency_keys', ['expira_em'], unique=False)
+
+
+def downgrade() -> None:
+    """Revert upgrade migrations."""
+    op.drop_index('ix_idempotency_keys_expira', table_name='idempotency_keys')
+    op.drop_index(op.f('ix_idempotency_keys_tenant_id'), table_name='idempotency_keys')
+    op.drop_table('idempotency_keys')
@@ -0,0 +1,55 @@
+"""kpi rollup shards
+
+Revision ID: e8c4a1f6b295
+Revises: d5b2e8c4f617
+Create Date: 2026-10-17 14:05:31.208447
+
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8c4a1f6b295'
+down_revision = 'd5b2e8c4f617'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Apply upgrade migrations."""
+    # As linhas existentes ficam no shard 0; o checkout passa a somar num shard ao acaso.
+    op.add_column('merchant_kpis_diarios', sa.Column('shard', sa.Integer(), nullable=False, server_default='0'))
+    op.drop_constraint('uq_merchant_kpis_diarios_merchant_dia_status', 'merchant_kpis_diarios', type_='unique')
+    op.create_unique_constraint(
+        'uq_merchant_kpis_diarios_merchant_dia_status_shard',
+        'merchant_kpis_diarios',
+        ['merchant_id', 'dia', 'status', 'shard'],
+    )
+    op.add_column('merchant_produto_vendas', sa.Column('shard', sa.Integer(), nullable=False, server_default='0'))
+    op.drop_constraint('uq_merchant_produto_vendas_produto_status', 'merchant_produto_vendas', type_='unique')
+    op.create_unique_constraint(
+        'uq_merchant_produto_vendas_produto_status_shard',
+        'merchant_produto_vendas',
+        ['produto_id', 'status', 'shard'],
+    )
+
+
+def downgrade() -> None:
+    """Revert upgrade migrations."""
+    # Os rollups são derivados: são esvaziados e repostos com `scripts/rebuild_kpi_rollups.py`.
+    op.execute("DELETE FROM merchant_produto_vendas")
+    op.execute("DELETE FROM merchant_kpis_diarios")
+    op.drop_constraint('uq_merchant_produto_vendas_produto_status_shard', 'merchant_produto_vendas', type_='unique')
+    op.create_unique_constraint(
+        'uq_merchant_produto_vendas_produto_status', 'merchant_produto_vendas', ['produto_id', 'status']
+    )
+    op.drop_column('merchant_produto_vendas', 'shard')
+    op.drop_constraint('uq_merchant_kpis_diarios_merchant_dia_status_shard', 'merchant_kpis_diarios', type_='unique')
+    op.create_unique_constraint(
+        'uq_merchant_kpis_diarios_merchant_dia_status', 'merchant_kpis_diarios', ['merchant_id', 'dia', 'status']
+    )
+    op.drop_column('merchant_kpis_diarios', 'shard')
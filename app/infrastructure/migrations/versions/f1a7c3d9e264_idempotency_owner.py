@@ -0,0 +1,31 @@
+"""idempotency owner
+
+Revision ID: f1a7c3d9e264
+Revises: e8c4a1f6b295
+Create Date: 2026-10-17 16:22:09.581734
+
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1a7c3d9e264'
+down_revision = 'e8c4a1f6b295'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Apply upgrade migrations."""
+    guid = postgresql.UUID(as_uuid=True)
+    op.add_column('idempotency_keys', sa.Column('dono', guid, nullable=True))
+
+
+def downgrade() -> None:
+    """Revert upgrade migrations."""
+    op.drop_column('idempotency_keys', 'dono')
@@ -0,0 +1,101 @@
+"""kpi rollups
+
+Revision ID: f4c7a2e9b561
+Revises: e2b9f4a6c318
+Create Date: 2026-10-16 19:12:30.554102
+
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from app.domain.enums import AgendamentoStatus, PedidoStatus
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4c7a2e9b561'
+down_revision = 'e2b9f4a6c318'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Apply upgrade migrations."""
+    guid = postgresql.UUID(as_uuid=True)
+    pedido_enum = postgresql.ENUM(
+        *[status.value for status in PedidoStatus], name="pedidostatus", create_type=False
+    )
+    agendamento_enum = postgresql.ENUM(
+        *[status.value for status in AgendamentoStatus], name="agendamentostatus", create_type=False
+    )
+
+    op.create_table(
+        'merchant_kpis_diarios',
+        sa.Column('id', guid, nullable=False),
+        sa.Column('merchant_id', guid, nullable=False),
+        sa.Column('dia', sa.Date(), nullable=False),
+        sa.Column('status', pedido_enum, nullable=False),
+        sa.Column('pedidos', sa.Integer(), nullable=False),
+        sa.Column('faturacao', sa.Numeric(14, 2), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('tenant_id', guid, nullable=False),
+        sa.ForeignKeyConstraint(['merchant_id'], ['merchants.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['tenant_id'], ['tenants.id'], ondelete='RESTRICT'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('merchant_id', 'dia', 'status', name='uq_merchant_kpis_diarios_merchant_dia_status'),
+    )
+    op.create_index(op.f('ix_merchant_kpis_diarios_tenant_id'), 'merchant_kpis_diarios', ['tenant_id'], unique=False)
+
+    op.create_table(
+        'merchant_produto_vendas',
+        sa.Column('id', guid, nullable=False),
+        sa.Column('merchant_id', guid, nullable=False),
+        sa.Column('produto_id', guid, nullable=False),
+        sa.Column('status', pedido_enum, nullable=False),
+        sa.Column('quantidade', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('tenant_id', guid, nullable=False),
+        sa.ForeignKeyConstraint(['merchant_id'], ['merchants.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['produto_id'], ['produtos.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['tenant_id'], ['tenants.id'], ondelete='RESTRICT'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('produto_id', 'status', name='uq_merchant_produto_vendas_produto_status'),
+    )
+    op.create_index(
+        op.f('ix_merchant_produto_vendas_tenant_id'), 'merchant_produto_vendas', ['tenant_id'], unique=False
+    )
+    op.create_index(
+        'ix_merchant_produto_vendas_merchant', 'merchant_produto_vendas', ['merchant_id', 'status'], unique=False
+    )
+
+    op.create_table(
+        'prestador_kpis',
+        sa.Column('id', guid, nullable=False),
+        sa.Column('prestador_id', guid, nullable=False),
+        sa.Column('status', agendamento_enum, nullable=False),
+        sa.Column('agendamentos', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('tenant_id', guid, nullable=False),
+        sa.ForeignKeyConstraint(['prestador_id'], ['prestadores.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['tenant_id'], ['tenants.id'], ondelete='RESTRICT'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('prestador_id', 'status', name='uq_prestador_kpis_prestador_status'),
+    )
+    op.create_index(op.f('ix_prestador_kpis_tenant_id'), 'prestador_kpis', ['tenant_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Revert upgrade migrations."""
+    op.drop_index(op.f('ix_prestador_kpis_tenant_id'), table_name='prestador_kpis')
+    op.drop_table('prestador_kpis')
+    op.drop_index('ix_merchant_produto_vendas_merchant', table_name='merchant_produto_vendas')
+    op.drop_index(op.f('ix_merchant_produto_vendas_tenant_id'), table_name='merchant_produto_vendas')
+    op.drop_table('merchant_produto_vendas')
+    op.drop_index(op.f('ix_merchant_kpis_diarios_tenant_id'), table_name='merchant_kpis_diarios')
+    op.drop_table('merchant_kpis_diarios')
@@ -18,6 +18,10 @@ class CartItemCreate(CartItemBase):
     quantidade: int = Field(ge=1)
 
 
+class CartItemBatchCreate(BaseModel):
+    itens: list[CartItemCreate] = Field(min_length=1, max_length=100)
+
+
 class CartItemUpdate(BaseModel):
     quantidade: int = Field(ge=1)
 
@@ -28,3 +32,34 @@ class CartItemOut(CartItemBase):
     preco_unitario: Decimal
 
     model_config = ConfigDict(from_attributes=True)
+
+
+class CartResumoItem(CartItemOut):
+    """Linha do carrinho com preço, disponibilidade e stock atuais."""
+
+    nome: str | None = None
+    preco_atual: Decimal | None = None
+    total_linha: Decimal = Decimal("0.00")
+    disponivel: bool
+    stock_disponivel: int | None = None
+    preco_alterado: bool = False
+
+
+class CartResumoGrupo(BaseModel):
+    """Itens agrupados por merchant (produtos) ou prestador (serviços)."""
+
+    tipo: Literal["merchant", "prestador"]
+    id: UUID
+    nome: str
+    subtotal: Decimal
+    itens: list[CartResumoItem]
+
+
+class CartResumo(BaseModel):
+    subtotal: Decimal
+    total_itens: int
+    tem_precos_alterados: bool
+    tem_indisponiveis: bool
+    grupos: list[CartResumoGrupo]
+    # Itens cujo produto/serviço já não existe ou deixou de estar ativo.
+    indisponiveis: list[CartResumoItem]
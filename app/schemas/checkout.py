@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+from datetime import datetime
 from decimal import Decimal
 from typing import List
 from uuid import UUID
@@ -27,6 +28,35 @@ class CheckoutRequest(BaseModel):
     metodo_pagamento: str | None = None
     estado_pagamento: str | None = None
     endereco_id: UUID | None = None
+    # Token devolvido por `POST /checkout/quote`: linhas inalteradas usam os preços cotados.
+    quote_token: str | None = None
+
+
+class CheckoutQuoteRequest(BaseModel):
+    """Itens a cotar (sem itens, cota o carrinho)."""
+
+    itens: List[CheckoutItem] | None = None
+
+
+class CheckoutQuoteItemOut(BaseModel):
+    """Linha cotada."""
+
+    tipo: str
+    ref_id: UUID
+    nome: str
+    quantidade: int
+    preco_unitario: Decimal
+    total_linha: Decimal
+
+
+class CheckoutQuoteOut(BaseModel):
+    """Cotação com preços fixados até `expira_em`."""
+
+    quote_token: str
+    expira_em: datetime
+    subtotal: Decimal
+    total: Decimal
+    itens: List[CheckoutQuoteItemOut]
 
 
 class PedidoItemOut(BaseModel):
@@ -28,8 +28,12 @@ class Timestamped(BaseModel):
 class PaginatedResponse(GenericModel, Generic[T]):
     """Resposta genérica paginada."""
 
-    total: int
+    total: int | None = Field(default=None, description="Total de registos; omitido com `?count=none`")
     items: list[T]
     page: int | None = None
     page_size: int | None = None
     total_pages: int | None = None
+    has_next: bool = False
+    next_cursor: str | None = Field(
+        default=None, description="Cursor opaco para pedir a página seguinte via `?cursor=`"
+    )
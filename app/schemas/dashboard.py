@@ -2,8 +2,8 @@
 
 from __future__ import annotations
 
-from datetime import datetime
-from typing import Dict, List
+from datetime import date, datetime
+from typing import Dict, List, Literal
 from uuid import UUID
 
 from pydantic import BaseModel
@@ -37,8 +37,54 @@ class MerchantSummary(BaseModel):
     ultimos_pedidos: List[MerchantPedidoRecente]
 
 
+Granularidade = Literal["day", "week", "month"]
+
+
+class MerchantSeriesBucket(BaseModel):
+    """Pedidos pagos, faturação e itens vendidos num intervalo da série."""
+
+    inicio: date
+    pedidos: int
+    faturacao: float
+    itens: int
+
+
+class MerchantSeries(BaseModel):
+    """Série temporal do merchant, em dias locais do tenant."""
+
+    merchant_id: UUID
+    granularity: Granularidade
+    timezone: str
+    inicio: date
+    fim: date
+    buckets: List[MerchantSeriesBucket]
+
+
+class PrestadorSeriesBucket(BaseModel):
+    """Agendamentos (pela data do agendamento) num intervalo da série."""
+
+    inicio: date
+    total: int
+    por_status: Dict[str, int]
+
+
+class PrestadorSeries(BaseModel):
+    """Série temporal de agendamentos do prestador, em dias locais do tenant."""
+
+    prestador_id: UUID
+    granularity: Granularidade
+    timezone: str
+    inicio: date
+    fim: date
+    buckets: List[PrestadorSeriesBucket]
+
+
 __all__ = [
     "MerchantSummary",
     "MerchantTopProduto",
     "MerchantPedidoRecente",
+    "MerchantSeries",
+    "MerchantSeriesBucket",
+    "PrestadorSeries",
+    "PrestadorSeriesBucket",
 ]
@@ -6,7 +6,7 @@ from decimal import Decimal
 from typing import Any
 from uuid import UUID
 
-from pydantic import BaseModel, ConfigDict, EmailStr, Field
+from pydantic import AliasChoices, BaseModel, ConfigDict, EmailStr, Field
 
 from app.domain.enums import ServicoTipoAtendimento
 from app.schemas.common import PaginatedResponse
@@ -141,6 +141,7 @@ class ProdutoBase(BaseModel):
     atributos_extras: dict[str, Any] | None = None
     permitir_backorder: bool = False
     max_por_pedido: int | None = None
+    stock_shards: int = Field(default=0, ge=0, le=64, description="Sub-contadores de stock (modo hot item); 0 desativa")
     disponivel: bool = True
     ativo: bool = True
 
@@ -162,12 +163,17 @@ class ProdutoUpdate(BaseModel):
     atributos_extras: dict[str, Any] | None = None
     permitir_backorder: bool | None = None
     max_por_pedido: int | None = None
+    stock_shards: int | None = Field(default=None, ge=0, le=64)
     disponivel: bool | None = None
     ativo: bool | None = None
 
 
 class ProdutoOut(ProdutoBase):
     id: UUID
+    # Em modo hot item o stock é a soma dos shards (`Produto.stock_total`).
+    stock_atual: int = Field(default=0, validation_alias=AliasChoices("stock_total", "stock_atual"))
+    # Stock menos as reservas ativas de carrinhos.
+    stock_disponivel: int | None = None
 
     model_config = ConfigDict(from_attributes=True)
 
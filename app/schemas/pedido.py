@@ -21,6 +21,7 @@ class ItemPedidoResumo(BaseModel):
     preco_unitario: Decimal
     total_linha: Decimal
     categoria_id_snapshot: UUID | None
+    merchant_id: UUID | None = None
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -33,6 +34,8 @@ class PedidoResumo(BaseModel):
     estado_pagamento: str | None
     origem: str
     created_at: datetime | None
+    # Na vista do merchant: subtotal da sua parte do pedido (`status` é o do seu sub-pedido).
+    subtotal_merchant: Decimal | None = None
 
     cliente_nome_snapshot: str | None
     cliente_email_snapshot: str | None
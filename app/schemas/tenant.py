@@ -3,8 +3,21 @@
 from __future__ import annotations
 
 from uuid import UUID
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
+
+
+def _validar_timezone(valor: str | None) -> str | None:
+    """Aceita apenas nomes IANA conhecidos (ex.: `Africa/Maputo`)."""
+
+    if valor is None:
+        return valor
+    try:
+        ZoneInfo(valor)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError("Fuso horário inválido") from None
+    return valor
 
 
 class TenantBase(BaseModel):
@@ -13,6 +26,9 @@ class TenantBase(BaseModel):
     nome: str = Field(..., max_length=150)
     slug: str = Field(..., max_length=150)
     ativo: bool = True
+    timezone: str = Field("UTC", max_length=64)
+
+    _timezone = field_validator("timezone")(_validar_timezone)
 
 
 class TenantCreate(TenantBase):
@@ -26,6 +42,9 @@ class TenantUpdate(BaseModel):
 
     nome: str | None = None
     ativo: bool | None = None
+    timezone: str | None = Field(None, max_length=64)
+
+    _timezone = field_validator("timezone")(_validar_timezone)
 
 
 class TenantOut(TenantBase):
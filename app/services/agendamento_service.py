@@ -8,8 +8,10 @@ from uuid import UUID
 from fastapi import HTTPException, status
 from sqlalchemy.orm import Session
 
+from app.domain.enums import AgendamentoStatus
 from app.infrastructure.db import models
 from app.schemas.agendamento import AgendamentoCreate
+from app.services import kpi_service
 
 
 def criar_agendamento(
@@ -40,6 +42,7 @@ def criar_agendamento(
         prestador_id=prestador.id,
         servico_id=servico.id,
         data_hora=payload.data_hora,
+        status=AgendamentoStatus.PENDENTE,
         metadados_formulario={
             "nome": payload.nome,
             "contacto": payload.contacto,
@@ -50,6 +53,7 @@ def criar_agendamento(
         endereco_atendimento=payload.endereco_atendimento or {},
     )
     db.add(agendamento)
+    kpi_service.registar_agendamento(db, agendamento)
     db.commit()
     db.refresh(agendamento)
     return agendamento
@@ -0,0 +1,84 @@
+"""Serviços de autenticação: emissão de tokens e revogação por versão."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from uuid import UUID
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.security import create_access_token
+from app.infrastructure.db import models
+
+# Estado mínimo por utilizador usado para validar tokens sem carregar a linha completa.
+# O TTL curto limita o tempo em que um token revogado ainda é aceite noutros workers.
+_token_state_cache = TTLCache(
+    maxsize=settings.token_state_cache_max_entries, ttl=settings.token_state_cache_ttl_seconds
+)
+
+
+@dataclass(frozen=True)
+class TokenState:
+    """Versão corrente dos tokens e estado de ativação de um utilizador."""
+
+    version: int
+    is_active: bool
+
+
+def issue_access_token(user: models.User) -> str:
+    """Emite o JWT com as claims verificáveis (role, tenant, estado e versão)."""
+
+    return create_access_token(
+        str(user.id),
+        tenant_id=str(user.tenant_id),
+        role=user.role.value,
+        is_active=user.is_active,
+        ver=user.token_version or 0,
+    )
+
+
+def get_token_state(db: Session, user_id: UUID) -> TokenState | None:
+    """Obtém (com cache) a versão de token e o estado do utilizador; None se não existir."""
+
+    state = _token_state_cache.get(user_id)
+    if state is not None:
+        return state
+    row = db.execute(
+        select(models.User.token_version, models.User.is_active).where(models.User.id == user_id)
+    ).first()
+    if row is None:
+        return None
+    state = TokenState(version=row.token_version or 0, is_active=bool(row.is_active))
+    _token_state_cache.set(user_id, state)
+    return state
+
+
+def revoke_user_tokens(db: Session, user: models.User) -> None:
+    """Invalida todos os tokens emitidos para o utilizador incrementando a versão."""
+
+    db.execute(
+        update(models.User)
+        .where(models.User.id == user.id)
+        .values(token_version=models.User.token_version + 1)
+    )
+    db.commit()
+    db.refresh(user)
+    _token_state_cache.delete(user.id)
+
+
+def deactivate_user(db: Session, user: models.User) -> models.User:
+    """Desativa o utilizador e revoga imediatamente os tokens em circulação."""
+
+    user.is_active = False
+    db.add(user)
+    revoke_user_tokens(db, user)
+    return user
+
+
+def clear_token_state_cache() -> None:
+    """Esvazia a cache de estado de tokens do processo corrente."""
+
+    _token_state_cache.clear()
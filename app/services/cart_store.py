@@ -0,0 +1,461 @@
+"""Armazenamento do carrinho com backends intercambiáveis (SQL, Redis ou memória).
+
+Os carrinhos são dados de vida curta e com muitas escritas, descartados no checkout. O backend
+`sql` usa a tabela `cart_items`; `redis` guarda cada carrinho num hash (`{CART_STORE_PREFIX}:{tenant}:{cliente}`,
+um campo por `tipo:ref_id`, com expiração) e `memory` é o equivalente em memória do processo (testes/desenvolvimento).
+Escolhe-se com `CART_STORE_BACKEND`.
+
+Todas as implementações seguem o mesmo ciclo: as operações ficam pendentes até `commit()`. Nos
+backends em hash o commit grava primeiro os campos alterados do carrinho (reaplicando as operações
+sobre o estado atual, de forma atómica) e só depois confirma a transação SQL da sessão (reservas de
+stock, pedido); se esta falhar, os campos são repostos. Um pedido que falhe a meio não deixa o
+carrinho alterado nem reservas sem linha. Como a quantidade gravada pode diferir da vista local do
+pedido, os callbacks registados com `ao_gravar` correm entre a escrita do carrinho e o commit SQL
+(p.ex. para acertar as reservas com `quantidade`).
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, replace
+from datetime import datetime
+from decimal import Decimal
+from functools import partial
+from typing import Callable, Iterator, Protocol
+from uuid import UUID
+
+from fastapi import Depends
+from sqlalchemy import delete
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.deps import get_db
+from app.infrastructure.db import models
+
+
+@dataclass
+class CartLine:
+    """Linha do carrinho, independente do backend."""
+
+    id: UUID
+    tipo: str
+    ref_id: UUID
+    quantidade: int
+    preco_unitario: Decimal
+    created_at: datetime
+
+
+# (tipo, ref_id, quantidade a somar, preço unitário atual)
+NovaLinha = tuple[str, UUID, int, Decimal]
+
+
+class CartStore(Protocol):
+    def listar(self, tenant_id: UUID, cliente_id: UUID) -> list[CartLine]: ...
+
+    def obter(self, tenant_id: UUID, cliente_id: UUID, item_id: UUID) -> CartLine | None: ...
+
+    def adicionar(self, tenant_id: UUID, cliente_id: UUID, linhas: list[NovaLinha]) -> list[CartLine]:
+        """Soma as linhas ao carrinho (upsert por `tipo`/`ref_id`) e devolve-as com a quantidade final."""
+        ...
+
+    def atualizar(self, tenant_id: UUID, cliente_id: UUID, item_id: UUID, quantidade: int) -> CartLine: ...
+
+    def remover(self, tenant_id: UUID, cliente_id: UUID, item_id: UUID) -> None: ...
+
+    def limpar(self, tenant_id: UUID, cliente_id: UUID) -> None: ...
+
+    def quantidade(self, tenant_id: UUID, cliente_id: UUID, tipo: str, ref_id: UUID) -> int:
+        """Quantidade gravada da linha (0 se não existir), lida do armazenamento e não da vista local."""
+        ...
+
+    def ao_gravar(self, callback: Callable[[], None]) -> None:
+        """Regista `callback` para correr no commit, depois de gravado o carrinho e antes do commit SQL."""
+        ...
+
+    def commit(self) -> None: ...
+
+    def rollback(self) -> None:
+        """Descarta as operações pendentes e reverte a transação SQL (pedido recusado a meio)."""
+        ...
+
+
+def _linha(item: models.CartItem) -> CartLine:
+    return CartLine(
+        id=item.id,
+        tipo=item.tipo,
+        ref_id=item.ref_id,
+        quantidade=item.quantidade,
+        preco_unitario=Decimal(item.preco_unitario),
+        created_at=item.created_at,
+    )
+
+
+class SqlCartStore:
+    """Carrinho na tabela `cart_items`, na transação da sessão do pedido."""
+
+    def __init__(self, db: Session) -> None:
+        self.db = db
+        self._callbacks: list[Callable[[], None]] = []
+
+    def _query(self, tenant_id: UUID, cliente_id: UUID):
+        return self.db.query(models.CartItem).filter(
+            models.CartItem.cliente_id == cliente_id,
+            models.CartItem.tenant_id == tenant_id,
+        )
+
+    def listar(self, tenant_id: UUID, cliente_id: UUID) -> list[CartLine]:
+        itens = self._query(tenant_id, cliente_id).order_by(models.CartItem.created_at.asc()).all()
+        return [_linha(item) for item in itens]
+
+    def obter(self, tenant_id: UUID, cliente_id: UUID, item_id: UUID) -> CartLine | None:
+        item = self._query(tenant_id, cliente_id).filter(models.CartItem.id == item_id).first()
+        return _linha(item) if item else None
+
+    def adicionar(self, tenant_id: UUID, cliente_id: UUID, linhas: list[NovaLinha]) -> list[CartLine]:
+        # Um único INSERT ... ON CONFLICT DO UPDATE na chave única (cliente_id, tipo, ref_id).
+        insert = postgresql.insert if self.db.get_bind().dialect.name == "postgresql" else sqlite.insert
+        agora = datetime.utcnow()
+        stmt = insert(models.CartItem).values(
+            [
+                {
+                    "id": uuid.uuid4(),
+                    "tenant_id": tenant_id,
+                    "cliente_id": cliente_id,
+                    "tipo": tipo,
+                    "ref_id": ref_id,
+                    "quantidade": quantidade,
+                    "preco_unitario": preco,
+                    "created_at": agora,
+                    "updated_at": agora,
+                }
+                for tipo, ref_id, quantidade, preco in linhas
+            ]
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["cliente_id", "tipo", "ref_id"],
+            set_={
+                "quantidade": models.CartItem.quantidade + stmt.excluded.quantidade,
+                "preco_unitario": stmt.excluded.preco_unitario,
+                "updated_at": stmt.excluded.updated_at,
+            },
+        )
+        guardados = self.db.scalars(
+            stmt.returning(models.CartItem), execution_options={"populate_existing": True}
+        ).all()
+        return [_linha(item) for item in guardados]
+
+    def atualizar(self, tenant_id: UUID, cliente_id: UUID, item_id: UUID, quantidade: int) -> CartLine:
+        item = self._query(tenant_id, cliente_id).filter(models.CartItem.id == item_id).one()
+        item.quantidade = quantidade
+        self.db.flush()
+        return _linha(item)
+
+    def remover(self, tenant_id: UUID, cliente_id: UUID, item_id: UUID) -> None:
+        self._query(tenant_id, cliente_id).filter(models.CartItem.id == item_id).delete(synchronize_session=False)
+
+    def limpar(self, tenant_id: UUID, cliente_id: UUID) -> None:
+        self.db.execute(
+            delete(models.CartItem).where(
+                models.CartItem.cliente_id == cliente_id,
+                models.CartItem.tenant_id == tenant_id,
+            )
+        )
+
+    def quantidade(self, tenant_id: UUID, cliente_id: UUID, tipo: str, ref_id: UUID) -> int:
+        quantidade = (
+            self._query(tenant_id, cliente_id)
+            .filter(models.CartItem.tipo == tipo, models.CartItem.ref_id == ref_id)
+            .with_entities(models.CartItem.quantidade)
+            .scalar()
+        )
+        return quantidade or 0
+
+    def ao_gravar(self, callback: Callable[[], None]) -> None:
+        self._callbacks.append(callback)
+
+    def commit(self) -> None:
+        # O upsert já está na transação: os callbacks leem as linhas gravadas por este pedido.
+        try:
+            for callback in self._callbacks:
+                callback()
+            self.db.commit()
+        finally:
+            self._callbacks.clear()
+
+    def rollback(self) -> None:
+        self._callbacks.clear()
+        self.db.rollback()
+
+
+# Alterações a gravar num hash: campo -> valor serializado (`None` apaga o campo).
+Alteracoes = dict[str, str | None]
+
+
+def _serializar(linha: CartLine) -> str:
+    return json.dumps(
+        {
+            "id": str(linha.id),
+            "tipo": linha.tipo,
+            "ref_id": str(linha.ref_id),
+            "quantidade": linha.quantidade,
+            "preco_unitario": str(linha.preco_unitario),
+            "created_at": linha.created_at.isoformat(),
+        }
+    )
+
+
+def _deserializar(valor: str) -> CartLine:
+    dados = json.loads(valor)
+    return CartLine(
+        id=UUID(dados["id"]),
+        tipo=dados["tipo"],
+        ref_id=UUID(dados["ref_id"]),
+        quantidade=dados["quantidade"],
+        preco_unitario=Decimal(dados["preco_unitario"]),
+        created_at=datetime.fromisoformat(dados["created_at"]),
+    )
+
+
+class HashCartStore(ABC):
+    """Base dos backends em hash: cada carrinho é um mapa `tipo:ref_id -> linha (JSON)`.
+
+    Lê o hash uma vez por carrinho e regista as operações (somar, atualizar, remover, limpar) até
+    `commit()`. O commit reaplica-as sobre o estado atual do hash numa escrita atómica por carrinho e
+    grava só os campos alterados, pelo que pedidos concorrentes do mesmo cliente não se apagam.
+    """
+
+    def __init__(self, db: Session) -> None:
+        self.db = db
+        self._carrinhos: dict[str, dict[str, CartLine]] = {}
+        self._operacoes: dict[str, list[Callable[[dict[str, CartLine]], None]]] = {}
+        self._callbacks: list[Callable[[], None]] = []
+
+    # Operações de armazenamento implementadas por cada backend.
+    @abstractmethod
+    def _ler(self, chave: str) -> dict[str, str]:
+        """Conteúdo atual do hash."""
+
+    @abstractmethod
+    def _aplicar(self, chave: str, alterar: Callable[[dict[str, str]], Alteracoes]) -> Alteracoes:
+        """Lê o hash, grava as alterações calculadas por `alterar` atomicamente e devolve os valores anteriores."""
+
+    @staticmethod
+    def _chave(tenant_id: UUID, cliente_id: UUID) -> str:
+        return f"{settings.cart_store_prefix}:{tenant_id}:{cliente_id}"
+
+    @staticmethod
+    def _campo(tipo: str, ref_id: UUID) -> str:
+        return f"{tipo}:{ref_id}"
+
+    def _carrinho(self, tenant_id: UUID, cliente_id: UUID) -> dict[str, CartLine]:
+        chave = self._chave(tenant_id, cliente_id)
+        if chave not in self._carrinhos:
+            self._carrinhos[chave] = {campo: _deserializar(valor) for campo, valor in self._ler(chave).items()}
+        return self._carrinhos[chave]
+
+    def _registar(self, tenant_id: UUID, cliente_id: UUID, operacao: Callable[[dict[str, CartLine]], None]) -> None:
+        """Aplica `operacao` à vista local do carrinho e guarda-a para o commit."""
+
+        operacao(self._carrinho(tenant_id, cliente_id))
+        self._operacoes.setdefault(self._chave(tenant_id, cliente_id), []).append(operacao)
+
+    @staticmethod
+    def _alteracoes(operacoes: list[Callable[[dict[str, CartLine]], None]], atual: dict[str, str]) -> Alteracoes:
+        carrinho = {campo: _deserializar(valor) for campo, valor in atual.items()}
+        for operacao in operacoes:
+            operacao(carrinho)
+        alteracoes: Alteracoes = {}
+        for campo in atual.keys() | carrinho.keys():
+            novo = _serializar(carrinho[campo]) if campo in carrinho else None
+            if novo != atual.get(campo):
+                alteracoes[campo] = novo
+        return alteracoes
+
+    def listar(self, tenant_id: UUID, cliente_id: UUID) -> list[CartLine]:
+        return sorted(self._carrinho(tenant_id, cliente_id).values(), key=lambda linha: linha.created_at)
+
+    def obter(self, tenant_id: UUID, cliente_id: UUID, item_id: UUID) -> CartLine | None:
+        return next((linha for linha in self._carrinho(tenant_id, cliente_id).values() if linha.id == item_id), None)
+
+    def adicionar(self, tenant_id: UUID, cliente_id: UUID, linhas: list[NovaLinha]) -> list[CartLine]:
+        carrinho = self._carrinho(tenant_id, cliente_id)
+        resultado = []
+        for tipo, ref_id, quantidade, preco in linhas:
+            campo = self._campo(tipo, ref_id)
+            existente = carrinho.get(campo)
+            nova = CartLine(
+                id=existente.id if existente else uuid.uuid4(),
+                tipo=tipo,
+                ref_id=ref_id,
+                quantidade=0,
+                preco_unitario=preco,
+                created_at=existente.created_at if existente else datetime.utcnow(),
+            )
+
+            def somar(carrinho: dict[str, CartLine], campo=campo, nova=nova, quantidade=quantidade) -> None:
+                linha = carrinho.setdefault(campo, replace(nova))
+                linha.quantidade += quantidade
+                linha.preco_unitario = nova.preco_unitario
+
+            self._registar(tenant_id, cliente_id, somar)
+            resultado.append(carrinho[campo])
+        return resultado
+
+    def atualizar(self, tenant_id: UUID, cliente_id: UUID, item_id: UUID, quantidade: int) -> CartLine:
+        def definir(carrinho: dict[str, CartLine]) -> None:
+            for linha in carrinho.values():
+                if linha.id == item_id:
+                    linha.quantidade = quantidade
+
+        self._registar(tenant_id, cliente_id, definir)
+        return self.obter(tenant_id, cliente_id, item_id)
+
+    def remover(self, tenant_id: UUID, cliente_id: UUID, item_id: UUID) -> None:
+        def apagar(carrinho: dict[str, CartLine]) -> None:
+            for campo, linha in list(carrinho.items()):
+                if linha.id == item_id:
+                    del carrinho[campo]
+
+        self._registar(tenant_id, cliente_id, apagar)
+
+    def limpar(self, tenant_id: UUID, cliente_id: UUID) -> None:
+        self._registar(tenant_id, cliente_id, dict.clear)
+
+    def quantidade(self, tenant_id: UUID, cliente_id: UUID, tipo: str, ref_id: UUID) -> int:
+        valor = self._ler(self._chave(tenant_id, cliente_id)).get(self._campo(tipo, ref_id))
+        return _deserializar(valor).quantidade if valor else 0
+
+    def ao_gravar(self, callback: Callable[[], None]) -> None:
+        self._callbacks.append(callback)
+
+    def commit(self) -> None:
+        """Grava os carrinhos, corre os callbacks e depois a transação SQL; se algo falhar, repõe os campos."""
+
+        aplicadas: list[tuple[str, Alteracoes]] = []
+        try:
+            for chave, operacoes in self._operacoes.items():
+                anteriores = self._aplicar(chave, partial(self._alteracoes, operacoes))
+                aplicadas.append((chave, anteriores))
+            for callback in self._callbacks:
+                callback()
+            self.db.commit()
+        except Exception:
+            for chave, anteriores in aplicadas:
+                self._aplicar(chave, lambda _atual, anteriores=anteriores: anteriores)
+            raise
+        finally:
+            self._operacoes.clear()
+            self._carrinhos.clear()
+            self._callbacks.clear()
+
+    def rollback(self) -> None:
+        # Nada foi gravado no hash antes do commit: basta esquecer as operações.
+        self._operacoes.clear()
+        self._carrinhos.clear()
+        self._callbacks.clear()
+        self.db.rollback()
+
+
+_memoria: dict[str, dict[str, str]] = {}
+_memoria_lock = threading.Lock()
+
+
+class MemoryCartStore(HashCartStore):
+    """Carrinhos em memória do processo (testes e desenvolvimento local)."""
+
+    def _ler(self, chave: str) -> dict[str, str]:
+        with _memoria_lock:
+            return dict(_memoria.get(chave, {}))
+
+    def _aplicar(self, chave: str, alterar: Callable[[dict[str, str]], Alteracoes]) -> Alteracoes:
+        with _memoria_lock:
+            atual = _memoria.setdefault(chave, {})
+            alteracoes = alterar(dict(atual))
+            anteriores = {campo: atual.get(campo) for campo in alteracoes}
+            for campo, valor in alteracoes.items():
+                if valor is None:
+                    atual.pop(campo, None)
+                else:
+                    atual[campo] = valor
+            if not atual:
+                del _memoria[chave]
+            return anteriores
+
+
+_redis = None
+
+
+class RedisCartStore(HashCartStore):
+    """Carrinhos em hashes Redis, com expiração renovada a cada escrita."""
+
+    def __init__(self, db: Session) -> None:
+        super().__init__(db)
+        global _redis
+        if _redis is None:
+            import redis
+
+            _redis = redis.Redis.from_url(settings.redis_url, decode_responses=True)
+        self._client = _redis
+
+    def _ler(self, chave: str) -> dict[str, str]:
+        return self._client.hgetall(chave)
+
+    def _aplicar(self, chave: str, alterar: Callable[[dict[str, str]], Alteracoes]) -> Alteracoes:
+        # WATCH/MULTI: se outro pedido alterar o hash entre a leitura e o EXEC, recalcula-se sobre o novo estado.
+        from redis.exceptions import WatchError
+
+        with self._client.pipeline(transaction=True) as pipeline:
+            while True:
+                try:
+                    pipeline.watch(chave)
+                    atual = pipeline.hgetall(chave)
+                    alteracoes = alterar(atual)
+                    gravar = {campo: valor for campo, valor in alteracoes.items() if valor is not None}
+                    apagar = [campo for campo, valor in alteracoes.items() if valor is None]
+                    pipeline.multi()
+                    if gravar:
+                        pipeline.hset(chave, mapping=gravar)
+                    if apagar:
+                        pipeline.hdel(chave, *apagar)
+                    pipeline.expire(chave, settings.cart_store_ttl_seconds)
+                    pipeline.execute()
+                    return {campo: atual.get(campo) for campo in alteracoes}
+                except WatchError:
+                    continue
+
+
+def build_cart_store(db: Session) -> CartStore:
+    """Instancia o backend configurado em `CART_STORE_BACKEND` para a sessão do pedido."""
+
+    if settings.cart_store_backend == "redis":
+        return RedisCartStore(db)
+    if settings.cart_store_backend == "memory":
+        return MemoryCartStore(db)
+    return SqlCartStore(db)
+
+
+def get_cart_store(db: Session = Depends(get_db)) -> Iterator[CartStore]:
+    """Dependência FastAPI com o carrinho do backend configurado.
+
+    É a dona da unidade de trabalho do pedido: o endpoint faz `commit()` e, se levantar uma exceção
+    (p.ex. uma reserva recusada por falta de stock), as operações pendentes são revertidas aqui.
+    """
+
+    store = build_cart_store(db)
+    try:
+        yield store
+    except Exception:
+        store.rollback()
+        raise
+
+
+def clear() -> None:
+    """Esvazia os carrinhos em memória (usado em testes)."""
+
+    with _memoria_lock:
+        _memoria.clear()
+
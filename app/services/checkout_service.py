@@ -2,32 +2,31 @@
 
 from __future__ import annotations
 
+from datetime import datetime, timedelta, timezone
 from decimal import Decimal
 from typing import Iterable, List
 from uuid import UUID
 
+import jwt
 from fastapi import HTTPException, status
+from sqlalchemy import or_, update
 from sqlalchemy.orm import Session
 
+from app.core.config import settings
+from app.core.security import create_quote_token, decode_quote_token
 from app.domain.enums import PedidoOrigem, PedidoStatus
 from app.infrastructure.db import models
 from app.schemas.checkout import CheckoutItem
+from app.services import kpi_service, stock_service
+from app.services.cart_store import CartStore, build_cart_store
 
 
 def _cart_items_for_cliente(
-    *, db: Session, cliente: models.Cliente, tenant_id: UUID
+    *, store: CartStore, cliente: models.Cliente, tenant_id: UUID
 ) -> List[CheckoutItem]:
-    itens = (
-        db.query(models.CartItem)
-        .filter(
-            models.CartItem.cliente_id == cliente.id,
-            models.CartItem.tenant_id == tenant_id,
-        )
-        .all()
-    )
     return [
         CheckoutItem(tipo=item.tipo, ref_id=item.ref_id, quantidade=item.quantidade)
-        for item in itens
+        for item in store.listar(tenant_id, cliente.id)
     ]
 
 
@@ -72,64 +71,202 @@ def _endereco_snapshot(
     }
 
 
-def create_pedido(
+def _carregar_produtos(
+    *, db: Session, tenant_id: UUID, ids: set[UUID]
+) -> dict[UUID, models.Produto]:
+    """Carrega numa só query os produtos vendáveis referenciados no pedido.
+
+    A leitura não bloqueia as linhas: o stock é validado e decrementado atomicamente em
+    `_decrementar_stock`, que é o único ponto onde o pedido adquire locks de produto.
+    """
+
+    if not ids:
+        return {}
+    produtos = (
+        db.query(models.Produto)
+        .filter(
+            models.Produto.id.in_(ids),
+            models.Produto.tenant_id == tenant_id,
+            models.Produto.ativo.is_(True),
+            models.Produto.disponivel.is_(True),
+        )
+        .all()
+    )
+    return {produto.id: produto for produto in produtos}
+
+
+def _decrementar_stock(
     *,
     db: Session,
     tenant_id: UUID,
-    cliente: models.Cliente,
-    itens_payload: Iterable[CheckoutItem] | None,
-    origem: PedidoOrigem | str | None,
-    metodo_pagamento: str | None,
-    estado_pagamento: str | None,
-    endereco_id: UUID | None,
-) -> models.Pedido:
-    """Valida itens/carrinho, recalcula preços e cria o pedido."""
+    cliente_id: UUID,
+    produtos: dict[UUID, models.Produto],
+    quantidades: dict[UUID, int],
+) -> None:
+    """Decrementa o stock com um `UPDATE ... WHERE stock_atual >= :q OR permitir_backorder`.
 
-    itens = (
-        list(itens_payload)
-        if itens_payload
-        else _cart_items_for_cliente(db=db, cliente=cliente, tenant_id=tenant_id)
+    O stock reservado por outros clientes não conta como disponível; as reservas do próprio
+    cliente são consumidas no fim.
+
+    A condição e a escrita são um único statement, por isso dois checkouts concorrentes nunca
+    vendem a mesma unidade (sem read-modify-write em Python). Os produtos são atualizados por
+    ordem de `id` para que os locks de linha sejam adquiridos sempre pela mesma ordem. Produtos
+    em modo "hot item" decrementam um dos seus shards (`stock_service.decrementar`).
+    """
+
+    for produto_id in sorted(quantidades):
+        quantidade = quantidades[produto_id]
+        produto = produtos[produto_id]
+        if produto.stock_shards == 0:
+            restante = db.execute(
+                update(models.Produto)
+                .where(
+                    models.Produto.id == produto_id,
+                    models.Produto.tenant_id == tenant_id,
+                    models.Produto.stock_shards == 0,
+                    or_(
+                        models.Produto.stock_atual - stock_service.reservado_por_outros(cliente_id) >= quantidade,
+                        models.Produto.permitir_backorder.is_(True),
+                    ),
+                )
+                .values(stock_atual=models.Produto.stock_atual - quantidade)
+                .returning(models.Produto.stock_atual)
+                .execution_options(synchronize_session=False)
+            ).scalar_one_or_none()
+            if restante is not None:
+                stock_service.marcar_stock_alterado(db, tenant_id)
+                continue
+            # O produto pode ter passado entretanto a "hot item" (ex.: cotação anterior à mudança).
+            db.refresh(produto)
+        if produto.stock_shards == 0 or not stock_service.decrementar(db, produto, quantidade):
+            db.rollback()
+            raise HTTPException(status_code=400, detail="Stock insuficiente para o produto")
+
+    stock_service.libertar_reservas(db, cliente_id=cliente_id, produto_ids=quantidades)
+
+
+def _carregar_servicos(
+    *, db: Session, tenant_id: UUID, ids: set[UUID]
+) -> dict[UUID, models.Servico]:
+    """Carrega numa só query os serviços ativos (de prestadores ativos) referenciados no pedido.
+
+    Serviços não têm stock, por isso não são bloqueados.
+    """
+
+    if not ids:
+        return {}
+    servicos = (
+        db.query(models.Servico)
+        .join(models.PrestadorServico)
+        .filter(
+            models.Servico.id.in_(ids),
+            models.Servico.tenant_id == tenant_id,
+            models.Servico.ativo.is_(True),
+            models.PrestadorServico.ativo.is_(True),
+        )
+        .all()
+    )
+    return {servico.id: servico for servico in servicos}
+
+
+def _verificar_stock(
+    *,
+    db: Session,
+    cliente_id: UUID,
+    produtos: dict[UUID, models.Produto],
+    quantidades: dict[UUID, int],
+) -> None:
+    """Confirma, sem locks nem escritas, que há stock disponível para as quantidades pedidas."""
+
+    ids = [produto_id for produto_id in quantidades if not produtos[produto_id].permitir_backorder]
+    if not ids:
+        return
+    disponivel = dict(
+        db.query(
+            models.Produto.id,
+            models.Produto.stock_total - stock_service.reservado_por_outros(cliente_id),
+        )
+        .filter(models.Produto.id.in_(ids))
+        .all()
+    )
+    if any(disponivel.get(produto_id, 0) < quantidades[produto_id] for produto_id in ids):
+        raise HTTPException(status_code=400, detail="Stock insuficiente para o produto")
+
+
+def _quantidades_por_ref(itens: Iterable[CheckoutItem]) -> dict[tuple[str, UUID], int]:
+    totais: dict[tuple[str, UUID], int] = {}
+    for item in itens:
+        totais[(item.tipo, item.ref_id)] = totais.get((item.tipo, item.ref_id), 0) + item.quantidade
+    return totais
+
+
+def _uuid(valor: str | None) -> UUID | None:
+    return UUID(valor) if valor else None
+
+
+def _precificar(
+    *,
+    db: Session,
+    tenant_id: UUID,
+    itens: list[CheckoutItem],
+    fixados: dict[tuple[str, UUID], dict] | None = None,
+) -> tuple[list[models.ItemPedido], Decimal, dict[UUID, int], dict[UUID, models.Produto]]:
+    """Valida e precifica as linhas; devolve (itens do pedido, subtotal, quantidades por produto, produtos).
+
+    `fixados` são as linhas de uma cotação válida (por `tipo`/`ref_id`). Referências cuja quantidade
+    total não mudou desde a cotação usam o preço e o snapshot cotados; as restantes são
+    re-precificadas. Todas são lidas na mesma query por tipo, para que um produto/serviço
+    desativado (ou de um prestador desativado) depois da cotação deixe de ser vendido.
+    """
+
+    totais = _quantidades_por_ref(itens)
+    fixos = {
+        chave: linha
+        for chave, linha in (fixados or {}).items()
+        if totais.get(chave) == linha["quantidade"]
+    }
+    produtos = _carregar_produtos(
+        db=db, tenant_id=tenant_id, ids={ref_id for tipo, ref_id in totais if tipo == "produto"}
+    )
+    servicos = _carregar_servicos(
+        db=db, tenant_id=tenant_id, ids={ref_id for tipo, ref_id in totais if tipo == "servico"}
     )
-    if not itens:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Carrinho vazio")
 
     subtotal = Decimal("0.00")
     pedido_itens: list[models.ItemPedido] = []
+    quantidades: dict[UUID, int] = {}
 
     for payload_item in itens:
-        if payload_item.tipo == "produto":
-            produto = (
-                db.query(models.Produto)
-                .filter(
-                    models.Produto.id == payload_item.ref_id,
-                    models.Produto.tenant_id == tenant_id,
-                    models.Produto.ativo.is_(True),
-                    models.Produto.disponivel.is_(True),
+        fixo = fixos.get((payload_item.tipo, payload_item.ref_id))
+        if fixo is not None:
+            vendavel = produtos if payload_item.tipo == "produto" else servicos
+            if payload_item.ref_id not in vendavel:
+                raise HTTPException(
+                    status_code=404,
+                    detail="Produto indisponível" if payload_item.tipo == "produto" else "Serviço indisponível",
                 )
-                .first()
-            )
+            # O máximo por pedido foi validado na cotação, para a mesma quantidade total.
+            if payload_item.tipo == "produto":
+                quantidades[payload_item.ref_id] = quantidades.get(payload_item.ref_id, 0) + payload_item.quantidade
+            preco = Decimal(fixo["preco"])
+            merchant_id = _uuid(fixo["merchant_id"])
+            prestador_id = _uuid(fixo["prestador_id"])
+            categoria_snapshot = _uuid(fixo["categoria_id"])
+            nome_snapshot = fixo["nome"]
+        elif payload_item.tipo == "produto":
+            produto = produtos.get(payload_item.ref_id)
             if not produto:
                 raise HTTPException(status_code=404, detail="Produto indisponível")
-            if produto.stock_atual < payload_item.quantidade:
-                raise HTTPException(status_code=400, detail="Stock insuficiente para o produto")
-            produto.stock_atual -= payload_item.quantidade
+            quantidades[produto.id] = quantidades.get(produto.id, 0) + payload_item.quantidade
+            if produto.max_por_pedido is not None and quantidades[produto.id] > produto.max_por_pedido:
+                raise HTTPException(status_code=400, detail="Quantidade acima do máximo por pedido")
             preco = Decimal(produto.preco)
             merchant_id = produto.merchant_id
             prestador_id = None
             categoria_snapshot = produto.categoria_id
             nome_snapshot = produto.nome
         elif payload_item.tipo == "servico":
-            servico = (
-                db.query(models.Servico)
-                .join(models.PrestadorServico)
-                .filter(
-                    models.Servico.id == payload_item.ref_id,
-                    models.Servico.tenant_id == tenant_id,
-                    models.Servico.ativo.is_(True),
-                    models.PrestadorServico.ativo.is_(True),
-                )
-                .first()
-            )
+            servico = servicos.get(payload_item.ref_id)
             if not servico:
                 raise HTTPException(status_code=404, detail="Serviço indisponível")
             preco = Decimal(servico.preco)
@@ -157,11 +294,163 @@ def create_pedido(
             )
         )
 
+    return pedido_itens, subtotal, quantidades, produtos
+
+
+def _itens_do_pedido(
+    *,
+    store: CartStore,
+    cliente: models.Cliente,
+    tenant_id: UUID,
+    itens_payload: Iterable[CheckoutItem] | None,
+) -> list[CheckoutItem]:
+    itens = (
+        list(itens_payload)
+        if itens_payload
+        else _cart_items_for_cliente(store=store, cliente=cliente, tenant_id=tenant_id)
+    )
+    if not itens:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Carrinho vazio")
+    return itens
+
+
+def _linhas_cotadas(
+    *, quote_token: str, tenant_id: UUID, cliente: models.Cliente
+) -> dict[tuple[str, UUID], dict]:
+    try:
+        payload = decode_quote_token(quote_token)
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Cotação expirada") from None
+    except jwt.InvalidTokenError:
+        raise HTTPException(status_code=400, detail="Cotação inválida") from None
+    if payload.get("sub") != str(cliente.id) or payload.get("tenant") != str(tenant_id):
+        raise HTTPException(status_code=400, detail="Cotação inválida")
+    return {(linha["tipo"], UUID(linha["ref_id"])): linha for linha in payload["linhas"]}
+
+
+def cotar_pedido(
+    *,
+    db: Session,
+    tenant_id: UUID,
+    cliente: models.Cliente,
+    itens_payload: Iterable[CheckoutItem] | None,
+    store: CartStore | None = None,
+) -> dict:
+    """Corre a validação e o cálculo de preços do checkout sem escrever nada e devolve a cotação.
+
+    O token (JWT assinado, `checkout_quote_ttl_seconds`) fixa por `tipo`/`ref_id` a quantidade total,
+    o preço e o snapshot de cada linha; `create_pedido` aceita-o e não volta a precificar as linhas
+    inalteradas. O stock é verificado aqui mas só é decrementado (atomicamente) no submit.
+    """
+
+    store = store or build_cart_store(db)
+    itens = _itens_do_pedido(store=store, cliente=cliente, tenant_id=tenant_id, itens_payload=itens_payload)
+    pedido_itens, subtotal, quantidades, produtos = _precificar(db=db, tenant_id=tenant_id, itens=itens)
+    _verificar_stock(db=db, cliente_id=cliente.id, produtos=produtos, quantidades=quantidades)
+
+    linhas: dict[tuple[str, UUID], dict] = {}
+    for item in pedido_itens:
+        linha = linhas.setdefault(
+            (item.tipo, item.ref_id),
+            {
+                "tipo": item.tipo,
+                "ref_id": str(item.ref_id),
+                "quantidade": 0,
+                "preco": str(item.preco_unitario),
+                "nome": item.nome_snapshot,
+                "merchant_id": str(item.merchant_id) if item.merchant_id else None,
+                "prestador_id": str(item.prestador_id) if item.prestador_id else None,
+                "categoria_id": str(item.categoria_id_snapshot) if item.categoria_id_snapshot else None,
+            },
+        )
+        linha["quantidade"] += item.quantidade
+
+    expira_em = datetime.now(timezone.utc) + timedelta(seconds=settings.checkout_quote_ttl_seconds)
+    token = create_quote_token(
+        str(cliente.id),
+        settings.checkout_quote_ttl_seconds,
+        tenant=str(tenant_id),
+        linhas=list(linhas.values()),
+    )
+    return {
+        "quote_token": token,
+        "expira_em": expira_em,
+        "subtotal": subtotal,
+        "total": subtotal,
+        "itens": [
+            {
+                "tipo": item.tipo,
+                "ref_id": item.ref_id,
+                "nome": item.nome_snapshot,
+                "quantidade": item.quantidade,
+                "preco_unitario": item.preco_unitario,
+                "total_linha": item.total_linha,
+            }
+            for item in pedido_itens
+        ],
+    }
+
+
+def sub_pedidos_por_merchant(
+    itens: Iterable[models.ItemPedido], *, status: PedidoStatus = PedidoStatus.CRIADO
+) -> list[models.PedidoMerchant]:
+    """Um sub-pedido por merchant dos itens de produto, com o subtotal e a quantidade desse merchant."""
+
+    sub_pedidos: dict[UUID, models.PedidoMerchant] = {}
+    for item in itens:
+        if item.tipo != "produto" or item.merchant_id is None:
+            continue
+        sub = sub_pedidos.get(item.merchant_id)
+        if sub is None:
+            sub = sub_pedidos[item.merchant_id] = models.PedidoMerchant(
+                tenant_id=item.tenant_id,
+                merchant_id=item.merchant_id,
+                subtotal=Decimal("0"),
+                total_itens=0,
+                status=status,
+            )
+        sub.subtotal += Decimal(item.preco_unitario) * item.quantidade
+        sub.total_itens += item.quantidade
+    return list(sub_pedidos.values())
+
+
+def create_pedido(
+    *,
+    db: Session,
+    tenant_id: UUID,
+    cliente: models.Cliente,
+    itens_payload: Iterable[CheckoutItem] | None,
+    origem: PedidoOrigem | str | None,
+    metodo_pagamento: str | None,
+    estado_pagamento: str | None,
+    endereco_id: UUID | None,
+    store: CartStore | None = None,
+    quote_token: str | None = None,
+) -> models.Pedido:
+    """Valida itens/carrinho, recalcula preços e cria o pedido.
+
+    Os produtos e serviços referenciados são lidos com uma query por tipo (independente do
+    número de linhas); a validação e o cálculo de preços correm em memória sobre esse resultado.
+    Com `quote_token` (ver `cotar_pedido`) as linhas inalteradas usam os preços cotados.
+    """
+
+    store = store or build_cart_store(db)
+    itens = _itens_do_pedido(store=store, cliente=cliente, tenant_id=tenant_id, itens_payload=itens_payload)
+    fixados = (
+        _linhas_cotadas(quote_token=quote_token, tenant_id=tenant_id, cliente=cliente) if quote_token else None
+    )
+    pedido_itens, subtotal, quantidades, produtos = _precificar(
+        db=db, tenant_id=tenant_id, itens=itens, fixados=fixados
+    )
+
     try:
         origem_enum = PedidoOrigem(origem) if origem else PedidoOrigem.WEB
     except ValueError as exc:
         raise HTTPException(status_code=400, detail="Origem inválida") from exc
 
+    _decrementar_stock(
+        db=db, tenant_id=tenant_id, cliente_id=cliente.id, produtos=produtos, quantidades=quantidades
+    )
     pedido = models.Pedido(
         tenant_id=tenant_id,
         cliente_id=cliente.id,
@@ -178,13 +467,13 @@ def create_pedido(
         cliente_email_snapshot=cliente.email,
         cliente_telefone_snapshot=cliente.telefone,
         itens=pedido_itens,
+        sub_pedidos=sub_pedidos_por_merchant(pedido_itens),
     )
 
     db.add(pedido)
-    db.query(models.CartItem).filter(
-        models.CartItem.cliente_id == cliente.id, models.CartItem.tenant_id == tenant_id
-    ).delete(synchronize_session=False)
+    kpi_service.registar_pedido(db, pedido)
+    store.limpar(tenant_id, cliente.id)
 
-    db.commit()
+    store.commit()
     db.refresh(pedido)
     return pedido
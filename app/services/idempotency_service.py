@@ -0,0 +1,231 @@
+"""Suporte a `Idempotency-Key` nos endpoints de criação (checkout, agendamentos).
+
+Cada chave é única por (tenant, cliente, chave) e guarda o hash do pedido e a resposta serializada.
+O primeiro pedido reclama a chave numa transação curta (a constraint única impede dois pedidos
+concorrentes com a mesma chave), executa a operação e grava a resposta. Repetições devolvem a
+resposta guardada sem tocar nas tabelas de domínio; uma chave reutilizada com outro corpo é
+recusada. Se a operação falhar a chave é libertada, para que o cliente possa tentar de novo.
+
+Enquanto a operação corre a chave tem um lease curto (`idempotency_lease_seconds`), renovado em
+segundo plano: se o processo morrer antes de gravar a resposta, uma repetição com o mesmo corpo
+retoma a chave quando o lease expira, em vez de receber 409 até a chave expirar. Cada pedido que
+reclama a chave grava um token (`dono`) e o commit da operação só passa se ainda for o dono
+(`before_commit` na mesma transação das escritas de domínio, que também fecha o lease): um pedido
+original mais lento do que o lease que tenha perdido a chave falha sem efeitos, em vez de duplicar
+o pedido.
+
+As chaves expiram após `idempotency_ttl_seconds`; `apagar_expiradas` remove-as em lotes.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Iterator
+from uuid import UUID
+
+from fastapi import HTTPException, status
+from sqlalchemy import delete, event, func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.infrastructure.db import models
+
+logger = logging.getLogger(__name__)
+
+def hash_pedido(*partes: Any) -> str:
+    """Hash estável (SHA-256) do endpoint e do corpo do pedido."""
+
+    return hashlib.sha256(json.dumps(partes, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _filtro(tenant_id: UUID, cliente_id: UUID, chave: str) -> tuple:
+    return (
+        models.IdempotencyKey.tenant_id == tenant_id,
+        models.IdempotencyKey.cliente_id == cliente_id,
+        models.IdempotencyKey.chave == chave,
+    )
+
+
+def _repetir(registo: models.IdempotencyKey, request_hash: str) -> dict:
+    if registo.request_hash != request_hash:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key já usada com outro pedido",
+        )
+    if registo.resposta is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Pedido com esta Idempotency-Key em curso")
+    return registo.resposta
+
+
+def _lease() -> datetime:
+    return datetime.now(timezone.utc) + timedelta(seconds=settings.idempotency_lease_seconds)
+
+
+def _retomar(db: Session, registo: models.IdempotencyKey, request_hash: str, dono: UUID) -> bool:
+    """Retoma uma chave sem resposta cujo lease expirou (o pedido original morreu ou ficou para trás)."""
+
+    if registo.request_hash != request_hash or registo.resposta is not None:
+        return False
+    retomada = db.execute(
+        update(models.IdempotencyKey)
+        .where(
+            models.IdempotencyKey.id == registo.id,
+            models.IdempotencyKey.resposta.is_(None),
+            # Sem lease, a operação já fez commit e só falta gravar a resposta: nunca é retomada.
+            models.IdempotencyKey.em_curso_ate.is_not(None),
+            models.IdempotencyKey.em_curso_ate <= func.now(),
+        )
+        .values(em_curso_ate=_lease(), dono=dono)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return retomada == 1
+
+
+def _renovar(bind, registo_id: UUID, dono: UUID, parar: threading.Event) -> None:
+    # Sessão própria: a do pedido está a meio da operação.
+    while not parar.wait(settings.idempotency_lease_seconds / 3):
+        try:
+            with Session(bind=bind) as sessao:
+                sessao.execute(
+                    update(models.IdempotencyKey)
+                    .where(
+                        models.IdempotencyKey.id == registo_id,
+                        models.IdempotencyKey.dono == dono,
+                        models.IdempotencyKey.em_curso_ate.is_not(None),
+                    )
+                    .values(em_curso_ate=_lease())
+                    .execution_options(synchronize_session=False)
+                )
+                sessao.commit()
+        except Exception:  # noqa: BLE001 - o lease só expira; o commit continua protegido pelo dono
+            logger.warning("Falha ao renovar o lease da Idempotency-Key %s", registo_id, exc_info=True)
+
+
+@contextmanager
+def _enquanto_dono(db: Session, registo_id: UUID, dono: UUID) -> Iterator[None]:
+    """Renova o lease e só deixa a operação fazer commit enquanto `dono` detiver a chave."""
+
+    def confirmar(session: Session) -> None:
+        confirmada = session.execute(
+            update(models.IdempotencyKey)
+            .where(models.IdempotencyKey.id == registo_id, models.IdempotencyKey.dono == dono)
+            .values(em_curso_ate=None)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if confirmada != 1:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Idempotency-Key retomada por outro pedido",
+            )
+
+    parar = threading.Event()
+    renovacao = threading.Thread(target=_renovar, args=(db.get_bind(), registo_id, dono, parar), daemon=True)
+    event.listen(db, "before_commit", confirmar)
+    renovacao.start()
+    try:
+        yield
+    finally:
+        event.remove(db, "before_commit", confirmar)
+        parar.set()
+        renovacao.join()
+
+
+def executar(
+    db: Session,
+    *,
+    tenant_id: UUID,
+    cliente_id: UUID,
+    chave: str,
+    request_hash: str,
+    operacao: Callable[[], dict],
+) -> tuple[dict, bool]:
+    """Executa `operacao` uma única vez por chave; devolve (resposta serializada, é repetição)."""
+
+    filtro = _filtro(tenant_id, cliente_id, chave)
+    dono = uuid.uuid4()
+    registo = db.scalars(
+        select(models.IdempotencyKey).where(*filtro, models.IdempotencyKey.expira_em > func.now())
+    ).one_or_none()
+    if registo is not None:
+        if not _retomar(db, registo, request_hash, dono):
+            return _repetir(registo, request_hash), True
+        registo_id = registo.id
+    else:
+        # Uma chave expirada com o mesmo valor é substituída.
+        db.execute(
+            delete(models.IdempotencyKey)
+            .where(*filtro, models.IdempotencyKey.expira_em <= func.now())
+            .execution_options(synchronize_session=False)
+        )
+        registo_id = uuid.uuid4()
+        registo = models.IdempotencyKey(
+            id=registo_id,
+            tenant_id=tenant_id,
+            cliente_id=cliente_id,
+            chave=chave,
+            request_hash=request_hash,
+            expira_em=datetime.now(timezone.utc) + timedelta(seconds=settings.idempotency_ttl_seconds),
+            em_curso_ate=_lease(),
+            dono=dono,
+        )
+        db.add(registo)
+        try:
+            db.commit()
+        except IntegrityError:
+            # Outro pedido com a mesma chave reclamou-a entretanto.
+            db.rollback()
+            registo = db.scalars(select(models.IdempotencyKey).where(*filtro)).one()
+            return _repetir(registo, request_hash), True
+
+    try:
+        with _enquanto_dono(db, registo_id, dono):
+            resposta = operacao()
+    except Exception:
+        db.rollback()
+        db.execute(
+            delete(models.IdempotencyKey)
+            .where(models.IdempotencyKey.id == registo_id, models.IdempotencyKey.dono == dono)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        raise
+
+    db.execute(
+        update(models.IdempotencyKey)
+        .where(models.IdempotencyKey.id == registo_id, models.IdempotencyKey.dono == dono)
+        .values(resposta=resposta, em_curso_ate=None)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return resposta, False
+
+
+def apagar_expiradas(db: Session, *, batch_size: int | None = None) -> int:
+    """Apaga as chaves expiradas em lotes (uma transação curta por lote); devolve quantas apagou."""
+
+    batch_size = batch_size or settings.idempotency_sweep_batch_size
+    total = 0
+    while True:
+        lote = (
+            select(models.IdempotencyKey.id)
+            .where(models.IdempotencyKey.expira_em <= func.now())
+            .limit(batch_size)
+            .scalar_subquery()
+        )
+        apagadas = db.execute(
+            delete(models.IdempotencyKey)
+            .where(models.IdempotencyKey.id.in_(lote))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        total += apagadas
+        if apagadas < batch_size:
+            return total
@@ -0,0 +1,299 @@
+"""Rollups dos dashboards de merchants e prestadores, mantidos incrementalmente.
+
+Em vez de agregar o histórico de pedidos/agendamentos a cada pedido do dashboard, as escritas
+atualizam três tabelas pequenas na mesma transação:
+
+- `merchant_kpis_diarios`: pedidos, faturação e itens vendidos por merchant, dia e status;
+- `merchant_produto_vendas`: quantidade vendida por produto e status;
+- `prestador_kpis`: agendamentos por prestador, dia e status.
+
+Os dias são locais ao fuso do tenant (`Tenant.timezone`): a criação do pedido e a data/hora do
+agendamento. As séries dos dashboards agregam estes dias em semanas/meses em memória.
+
+Cada atualização é um `INSERT ... ON CONFLICT DO UPDATE` que soma deltas, pelo que escritas
+concorrentes não perdem contagens. As linhas são escritas por ordem da chave (como os locks de
+stock, sem deadlocks entre pedidos com os mesmos merchants por outra ordem) e, nos rollups de
+merchants, cada pedido soma num de `KPI_ROLLUP_SHARDS` shards ao acaso: checkouts do mesmo produto
+no mesmo dia não serializam numa única linha. As leituras somam os shards.
+
+O status de cada merchant é o do seu sub-pedido (`pedidos_merchant`): uma mudança de status move
+as contribuições desse merchant do status anterior para o novo. `reconstruir` recalcula tudo a
+partir das tabelas de domínio (backfill), já com um único shard por chave.
+"""
+
+from __future__ import annotations
+
+import logging
+import random
+import uuid
+from collections import defaultdict
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from typing import Iterable
+from uuid import UUID
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.domain.enums import AgendamentoStatus, PedidoStatus
+from app.infrastructure.db import models
+from app.services import tenant_service
+
+logger = logging.getLogger(__name__)
+
+# Linhas por statement no upsert (limita o número de parâmetros no backfill).
+LOTE_UPSERT = 500
+
+
+def _somar(db: Session, model, chave: list[str], campos: list[str], linhas: Iterable[dict]) -> None:
+    """Soma `campos` às linhas do rollup identificadas por `chave` (`INSERT ... ON CONFLICT DO UPDATE`).
+
+    As linhas são escritas por ordem de `chave`, para que transações concorrentes bloqueiem as
+    mesmas linhas pela mesma ordem.
+    """
+
+    linhas = sorted(
+        (linha for linha in linhas if any(linha[campo] for campo in campos)),
+        key=lambda linha: tuple(str(linha[campo]) for campo in chave),
+    )
+    insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+    agora = datetime.now(timezone.utc)
+    for inicio in range(0, len(linhas), LOTE_UPSERT):
+        stmt = insert(model).values(
+            [
+                {**linha, "id": uuid.uuid4(), "created_at": agora, "updated_at": agora}
+                for linha in linhas[inicio : inicio + LOTE_UPSERT]
+            ]
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=chave,
+            set_={
+                **{campo: getattr(model, campo) + getattr(stmt.excluded, campo) for campo in campos},
+                "updated_at": stmt.excluded.updated_at,
+            },
+        )
+        db.execute(stmt)
+
+
+def zona_horaria(nome: str | None) -> ZoneInfo:
+    """Fuso IANA de um tenant; um valor inválido na base usa UTC em vez de falhar checkout e dashboards."""
+
+    try:
+        return ZoneInfo(nome or "UTC")
+    except (ZoneInfoNotFoundError, ValueError):
+        logger.warning("Fuso horário de tenant inválido (%r); a usar UTC", nome)
+        return ZoneInfo("UTC")
+
+
+def _fuso(db: Session, tenant_id: UUID) -> ZoneInfo:
+    contexto = tenant_service.resolve_tenant_context(db, str(tenant_id))
+    return zona_horaria(contexto.timezone if contexto else None)
+
+
+def _dia(momento: datetime | None, fuso: ZoneInfo) -> date:
+    """Dia local de `momento` (datas sem fuso são UTC, como as gravadas pelos modelos)."""
+
+    momento = momento or datetime.now(timezone.utc)
+    if momento.tzinfo is None:
+        momento = momento.replace(tzinfo=timezone.utc)
+    return momento.astimezone(fuso).date()
+
+
+def _contribuicoes_pedido(db: Session, pedido: models.Pedido, estados: dict[UUID, PedidoStatus], sinal: int):
+    """Soma (`sinal` 1/-1) os itens dos merchants em `estados` aos rollups, no status indicado por merchant."""
+
+    faturacao: dict[UUID, Decimal] = defaultdict(Decimal)
+    itens: dict[UUID, int] = defaultdict(int)
+    vendas: dict[tuple[UUID, UUID], int] = defaultdict(int)
+    for item in pedido.itens:
+        if item.tipo != "produto" or item.merchant_id not in estados:
+            continue
+        faturacao[item.merchant_id] += Decimal(item.preco_unitario) * item.quantidade
+        itens[item.merchant_id] += item.quantidade
+        vendas[(item.merchant_id, item.ref_id)] += item.quantidade
+    if not faturacao:
+        return
+
+    dia = _dia(pedido.created_at, _fuso(db, pedido.tenant_id))
+    shard = random.randrange(settings.kpi_rollup_shards)
+    _somar(
+        db,
+        models.MerchantKpiDiario,
+        ["merchant_id", "dia", "status", "shard"],
+        ["pedidos", "faturacao", "itens"],
+        [
+            {
+                "tenant_id": pedido.tenant_id,
+                "merchant_id": merchant_id,
+                "dia": dia,
+                "status": estados[merchant_id],
+                "shard": shard,
+                "pedidos": sinal,
+                "faturacao": sinal * valor,
+                "itens": sinal * itens[merchant_id],
+            }
+            for merchant_id, valor in faturacao.items()
+        ],
+    )
+    _somar(
+        db,
+        models.MerchantProdutoVendas,
+        ["produto_id", "status", "shard"],
+        ["quantidade"],
+        [
+            {
+                "tenant_id": pedido.tenant_id,
+                "merchant_id": merchant_id,
+                "produto_id": produto_id,
+                "status": estados[merchant_id],
+                "shard": shard,
+                "quantidade": sinal * quantidade,
+            }
+            for (merchant_id, produto_id), quantidade in vendas.items()
+        ],
+    )
+
+
+def registar_pedido(db: Session, pedido: models.Pedido) -> None:
+    """Soma um pedido novo (e os seus sub-pedidos) aos rollups dos merchants. Não faz commit."""
+
+    _contribuicoes_pedido(db, pedido, {sub.merchant_id: sub.status for sub in pedido.sub_pedidos}, 1)
+
+
+def mudar_status_sub_pedido(db: Session, sub_pedido: models.PedidoMerchant, anterior: PedidoStatus) -> None:
+    """Move as contribuições do merchant do sub-pedido de `anterior` para o status atual. Não faz commit."""
+
+    if anterior == sub_pedido.status:
+        return
+    _contribuicoes_pedido(db, sub_pedido.pedido, {sub_pedido.merchant_id: anterior}, -1)
+    _contribuicoes_pedido(db, sub_pedido.pedido, {sub_pedido.merchant_id: sub_pedido.status}, 1)
+
+
+def _somar_agendamento(db: Session, agendamento: models.Agendamento, status: AgendamentoStatus, sinal: int) -> None:
+    _somar(
+        db,
+        models.PrestadorKpi,
+        ["prestador_id", "dia", "status"],
+        ["agendamentos"],
+        [
+            {
+                "tenant_id": agendamento.tenant_id,
+                "prestador_id": agendamento.prestador_id,
+                "dia": _dia(agendamento.data_hora, _fuso(db, agendamento.tenant_id)),
+                "status": status,
+                "agendamentos": sinal,
+            }
+        ],
+    )
+
+
+def registar_agendamento(db: Session, agendamento: models.Agendamento) -> None:
+    """Soma um agendamento novo ao rollup do prestador. Não faz commit."""
+
+    _somar_agendamento(db, agendamento, agendamento.status, 1)
+
+
+def mudar_status_agendamento(db: Session, agendamento: models.Agendamento, anterior: AgendamentoStatus) -> None:
+    """Move o agendamento de `anterior` para o status atual no rollup do prestador. Não faz commit."""
+
+    if anterior == agendamento.status:
+        return
+    _somar_agendamento(db, agendamento, anterior, -1)
+    _somar_agendamento(db, agendamento, agendamento.status, 1)
+
+
+def reconstruir(db: Session, *, tenant_id: UUID | None = None) -> None:
+    """Recalcula os rollups (todos ou de um tenant) a partir de pedidos e agendamentos e faz commit.
+
+    Os pedidos (já agregados por pedido/merchant) e os agendamentos são lidos em streaming e
+    agrupados por dia local em memória, pelo que só ficam retidas as linhas dos rollups.
+    """
+
+    for model in (models.MerchantKpiDiario, models.MerchantProdutoVendas, models.PrestadorKpi):
+        stmt = delete(model)
+        if tenant_id is not None:
+            stmt = stmt.where(model.tenant_id == tenant_id)
+        db.execute(stmt.execution_options(synchronize_session=False))
+
+    merchant_id = models.ItemPedido.merchant_id
+    sub_pedido = models.PedidoMerchant
+    base = (
+        select(models.Pedido.tenant_id, merchant_id.label("merchant_id"), sub_pedido.status)
+        .join(models.ItemPedido, models.ItemPedido.pedido_id == models.Pedido.id)
+        .join(sub_pedido, (sub_pedido.pedido_id == models.Pedido.id) & (sub_pedido.merchant_id == merchant_id))
+        .where(models.ItemPedido.tipo == "produto")
+    )
+    if tenant_id is not None:
+        base = base.where(models.Pedido.tenant_id == tenant_id)
+
+    fusos = {tenant.id: zona_horaria(tenant.timezone) for tenant in db.query(models.Tenant)}
+
+    por_pedido = base.add_columns(
+        models.Pedido.created_at,
+        func.sum(models.ItemPedido.preco_unitario * models.ItemPedido.quantidade).label("faturacao"),
+        func.sum(models.ItemPedido.quantidade).label("itens"),
+    ).group_by(models.Pedido.id, models.Pedido.tenant_id, merchant_id, sub_pedido.status, models.Pedido.created_at)
+    diarios: dict[tuple, list] = {}
+    for row in db.execute(por_pedido.execution_options(yield_per=1000)):
+        chave = (row.tenant_id, row.merchant_id, _dia(row.created_at, fusos[row.tenant_id]), row.status)
+        acumulado = diarios.setdefault(chave, [0, Decimal("0"), 0])
+        acumulado[0] += 1
+        acumulado[1] += Decimal(row.faturacao or 0)
+        acumulado[2] += int(row.itens or 0)
+    _somar(
+        db,
+        models.MerchantKpiDiario,
+        ["merchant_id", "dia", "status", "shard"],
+        ["pedidos", "faturacao", "itens"],
+        [
+            {
+                "tenant_id": t,
+                "merchant_id": m,
+                "dia": d,
+                "status": s,
+                "shard": 0,
+                "pedidos": n,
+                "faturacao": v,
+                "itens": q,
+            }
+            for (t, m, d, s), (n, v, q) in diarios.items()
+        ],
+    )
+
+    vendas = base.add_columns(
+        models.ItemPedido.ref_id.label("produto_id"),
+        func.sum(models.ItemPedido.quantidade).label("quantidade"),
+    ).group_by(models.Pedido.tenant_id, merchant_id, sub_pedido.status, models.ItemPedido.ref_id)
+    _somar(
+        db,
+        models.MerchantProdutoVendas,
+        ["produto_id", "status", "shard"],
+        ["quantidade"],
+        [{**row._asdict(), "shard": 0} for row in db.execute(vendas)],
+    )
+
+    agendamentos = select(
+        models.Agendamento.tenant_id,
+        models.Agendamento.prestador_id,
+        models.Agendamento.status,
+        models.Agendamento.data_hora,
+    )
+    if tenant_id is not None:
+        agendamentos = agendamentos.where(models.Agendamento.tenant_id == tenant_id)
+    por_dia: dict[tuple, int] = defaultdict(int)
+    for row in db.execute(agendamentos.execution_options(yield_per=1000)):
+        por_dia[(row.tenant_id, row.prestador_id, _dia(row.data_hora, fusos[row.tenant_id]), row.status)] += 1
+    _somar(
+        db,
+        models.PrestadorKpi,
+        ["prestador_id", "dia", "status"],
+        ["agendamentos"],
+        [
+            {"tenant_id": t, "prestador_id": p, "dia": d, "status": s, "agendamentos": n}
+            for (t, p, d, s), n in por_dia.items()
+        ],
+    )
+    db.commit()
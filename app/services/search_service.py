@@ -0,0 +1,77 @@
+"""Pesquisa full-text de produtos e serviços ordenada por relevância."""
+
+from __future__ import annotations
+
+import re
+
+from sqlalchemy import cast, column, func, literal, literal_column, table
+from sqlalchemy.dialects.postgresql import REGCONFIG, TSVECTOR
+
+from app.infrastructure.db import models
+from app.infrastructure.db.search import (
+    FTS5_WEIGHTS,
+    PRODUTOS,
+    SEARCH_CONFIG,
+    SEARCH_VECTOR_COLUMN,
+    SERVICOS,
+    WORD_SIMILARITY_THRESHOLD,
+    SearchableTable,
+)
+
+_SEARCHABLE: dict[type, SearchableTable] = {models.Produto: PRODUTOS, models.Servico: SERVICOS}
+_TERM = re.compile(r"\w+", re.UNICODE)
+
+
+def _fts5_query(q: str) -> str:
+    # Cada termo é citado (evita a sintaxe FTS5 do utilizador) e pesquisado por prefixo.
+    return " ".join(f'"{term}"*' for term in _TERM.findall(q))
+
+
+def apply_search(query, model: type, q: str, *, dialect_name: str):
+    """Filtra `query` pelos documentos que correspondem a `q`, ordenados por relevância.
+
+    Funciona com `Query` e `select()`. Em Postgres usa `search_vector @@ websearch_to_tsquery`
+    ordenado por `ts_rank`; em SQLite usa a tabela espelho FTS5 ordenada por `bm25`. O `id` desempata
+    para que a paginação por offset seja estável.
+    """
+
+    searchable = _SEARCHABLE[model]
+    if dialect_name == "postgresql":
+        vector = literal_column(f"{searchable.table}.{SEARCH_VECTOR_COLUMN}", type_=TSVECTOR)
+        tsquery = func.websearch_to_tsquery(cast(literal(SEARCH_CONFIG), REGCONFIG), q)
+        return query.filter(vector.op("@@")(tsquery)).order_by(func.ts_rank(vector, tsquery).desc(), model.id)
+
+    terms = _fts5_query(q)
+    if not terms:
+        return query.filter(literal(False))
+    fts = table(searchable.fts_table, column("doc_id"))
+    weights = [literal_column("0.0")] + [
+        literal_column(str(FTS5_WEIGHTS[weight])) for _, weight in searchable.columns
+    ]
+    return (
+        query.join(fts, fts.c.doc_id == model.id)
+        .filter(literal_column(searchable.fts_table).op("MATCH")(terms))
+        # bm25 devolve valores negativos: quanto menor, mais relevante.
+        .order_by(func.bm25(literal_column(searchable.fts_table), *weights), model.id)
+    )
+
+
+def apply_name_search(query, model: type, term: str, *, fuzzy: bool = False, dialect_name: str):
+    """Filtra `model.nome` por `term` e ordena pela semelhança de trigramas.
+
+    Sem `fuzzy` exige a substring (`ILIKE`, servido pelo índice GIN `gin_trgm_ops`); com `fuzzy`
+    aceita erros de escrita via `term <% nome` (word similarity do pg_trgm). Em SQLite as mesmas
+    funções são fornecidas em Python (`app.infrastructure.db.search`).
+    """
+
+    nome = model.nome
+    if fuzzy:
+        if dialect_name == "postgresql":
+            condition = literal(term).op("<%")(nome)
+        else:
+            condition = func.word_similarity(term, nome) >= WORD_SIMILARITY_THRESHOLD
+        ranking = func.word_similarity(term, nome)
+    else:
+        condition = nome.ilike(f"%{term}%")
+        ranking = func.similarity(nome, term)
+    return query.filter(condition).order_by(ranking.desc(), model.id)
@@ -0,0 +1,282 @@
+"""Stock de produtos: modo "hot item" e reservas de carrinho.
+
+Modo "hot item": o stock de um produto dividido por N sub-contadores.
+
+Com `Produto.stock_shards = N` o stock deixa de viver em `produtos.stock_atual` e passa para N
+linhas de `produto_stock_shards`. Cada checkout decrementa um shard escolhido ao acaso (com
+fallback para os vizinhos), pelo que checkouts concorrentes do mesmo produto bloqueiam linhas
+diferentes em vez de serializarem na linha do produto. O stock total é `stock_atual` mais a soma
+dos shards (`Produto.stock_total`).
+
+Quando nenhum dos shards tentados tem sozinho a quantidade pedida, todos os shards do produto são
+bloqueados (por ordem) e o stock é consolidado e redistribuído; `rebalancear_shards` faz o mesmo em
+lote para produtos cujos shards ficaram desequilibrados.
+
+Reservas: adicionar um produto ao carrinho reserva as unidades por `stock_reservation_ttl_seconds`
+(`reservar`), validando contra o stock disponível (`stock_atual` menos reservas ativas de outros
+clientes) sob um lock curto do produto. O checkout consome as reservas do próprio cliente e só
+desconta as reservas dos outros (`reservado_por_outros`). Reservas expiradas deixam de contar de
+imediato; `libertar_reservas_expiradas` apaga-as em lotes.
+
+Vendas e reservas não tocam `produtos.updated_at`: cada escrita de stock marca o tenant na sessão
+(`marcar_stock_alterado`) e, após o commit, a tag `stock` do tenant é incrementada na cache de
+respostas, invalidando as listagens de produtos e as suas ETags.
+"""
+
+from __future__ import annotations
+
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Iterable
+from uuid import UUID
+
+from fastapi import HTTPException
+from sqlalchemy import delete, event, func, select, update
+from sqlalchemy.orm import Session
+
+from app.core import response_cache
+from app.core.config import settings
+from app.infrastructure.db import models
+
+MAX_SHARDS = 64
+# Shards tentados (o sorteado e os seguintes) antes de consolidar sob lock.
+SHARD_TENTATIVAS = 3
+# Chave em `Session.info` com os tenants cujo stock mudou na transação corrente.
+_STOCK_ALTERADO = "stock_service.tenants_alterados"
+
+
+def marcar_stock_alterado(db: Session, tenant_id: UUID) -> None:
+    """Regista que o stock do tenant mudou; a tag `stock` é incrementada após o commit."""
+
+    db.info.setdefault(_STOCK_ALTERADO, set()).add(tenant_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidar_stock(session: Session) -> None:
+    tenants = session.info.pop(_STOCK_ALTERADO, None)
+    if tenants:
+        response_cache.invalidate(*(response_cache.tenant_tag(tenant_id, "stock") for tenant_id in tenants))
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_stock_alterado(session: Session) -> None:
+    session.info.pop(_STOCK_ALTERADO, None)
+
+
+def _shards_bloqueados(db: Session, produto_id: UUID) -> list[models.ProdutoStockShard]:
+    return (
+        db.query(models.ProdutoStockShard)
+        .filter(models.ProdutoStockShard.produto_id == produto_id)
+        .order_by(models.ProdutoStockShard.shard)
+        .with_for_update()
+        .populate_existing()
+        .all()
+    )
+
+
+def _distribuir(
+    db: Session,
+    produto: models.Produto,
+    shards: list[models.ProdutoStockShard],
+    total: int,
+    n: int,
+) -> None:
+    """Reparte `total` por `n` shards (diferença máxima de 1 unidade) e remove os excedentes."""
+
+    existentes = {shard.shard: shard for shard in shards}
+    for indice, shard in existentes.items():
+        if indice >= n:
+            db.delete(shard)
+    base, resto = divmod(total, n) if n else (0, 0)
+    for indice in range(n):
+        shard = existentes.get(indice)
+        if shard is None:
+            shard = models.ProdutoStockShard(tenant_id=produto.tenant_id, produto_id=produto.id, shard=indice)
+            db.add(shard)
+        shard.stock = base + (1 if indice < resto else 0)
+    produto.stock_atual = 0 if n else total
+    produto.stock_shards = n
+
+
+def configurar_stock(
+    db: Session,
+    produto: models.Produto,
+    *,
+    stock: int | None = None,
+    shards: int | None = None,
+) -> None:
+    """Define o stock total e/ou o número de shards do produto (0 desativa o modo "hot item").
+
+    Sem `stock` mantém o total atual; sem `shards` mantém o modo atual. Não faz commit.
+    """
+
+    atuais = _shards_bloqueados(db, produto.id)
+    total = stock if stock is not None else produto.stock_atual + sum(shard.stock for shard in atuais)
+    n = shards if shards is not None else produto.stock_shards
+    _distribuir(db, produto, atuais, total, min(n, MAX_SHARDS))
+    db.flush()
+
+
+def decrementar(db: Session, produto: models.Produto, quantidade: int) -> bool:
+    """Retira `quantidade` do stock de um produto em modo "hot item"; `False` se não houver stock.
+
+    Tenta o shard sorteado e os seguintes com `UPDATE ... WHERE stock >= :q`; se nenhum chegar,
+    bloqueia todos os shards, valida contra o total (ou `permitir_backorder`) e redistribui o restante.
+    """
+
+    n = produto.stock_shards
+    inicio = random.randrange(n)
+    for passo in range(min(n, SHARD_TENTATIVAS)):
+        restante = db.execute(
+            update(models.ProdutoStockShard)
+            .where(
+                models.ProdutoStockShard.produto_id == produto.id,
+                models.ProdutoStockShard.shard == (inicio + passo) % n,
+                models.ProdutoStockShard.stock >= quantidade,
+            )
+            .values(stock=models.ProdutoStockShard.stock - quantidade)
+            .returning(models.ProdutoStockShard.stock)
+            .execution_options(synchronize_session=False)
+        ).scalar_one_or_none()
+        if restante is not None:
+            marcar_stock_alterado(db, produto.tenant_id)
+            return True
+
+    shards = _shards_bloqueados(db, produto.id)
+    total = produto.stock_atual + sum(shard.stock for shard in shards)
+    if total < quantidade and not produto.permitir_backorder:
+        return False
+    _distribuir(db, produto, shards, total - quantidade, n)
+    db.flush()
+    marcar_stock_alterado(db, produto.tenant_id)
+    return True
+
+
+def rebalancear_shards(db: Session, *, tenant_id: UUID | None = None, limite: int = 500) -> int:
+    """Redistribui os shards desequilibrados (diferença > 1 unidade); devolve quantos produtos tratou.
+
+    Cada produto é consolidado na sua própria transação curta, para não reter locks de vários
+    produtos hot ao mesmo tempo.
+    """
+
+    desequilibrados = (
+        db.query(models.ProdutoStockShard.produto_id)
+        .join(models.Produto, models.Produto.id == models.ProdutoStockShard.produto_id)
+        .filter(models.Produto.stock_shards > 0)
+        .group_by(models.ProdutoStockShard.produto_id)
+        .having(func.max(models.ProdutoStockShard.stock) - func.min(models.ProdutoStockShard.stock) > 1)
+    )
+    if tenant_id is not None:
+        desequilibrados = desequilibrados.filter(models.Produto.tenant_id == tenant_id)
+    produto_ids = [produto_id for (produto_id,) in desequilibrados.limit(limite).all()]
+
+    for produto_id in produto_ids:
+        produto = db.get(models.Produto, produto_id)
+        if produto is not None and produto.stock_shards > 0:
+            configurar_stock(db, produto)
+        db.commit()
+    return len(produto_ids)
+
+
+def reservado_por_outros(cliente_id: UUID):
+    """Subquery (correlacionada com `produtos`) das reservas ativas de outros clientes."""
+
+    return (
+        select(func.coalesce(func.sum(models.ReservaStock.quantidade), 0))
+        .where(
+            models.ReservaStock.produto_id == models.Produto.id,
+            models.ReservaStock.cliente_id != cliente_id,
+            models.ReservaStock.expira_em > func.now(),
+        )
+        .scalar_subquery()
+    )
+
+
+def reservar(
+    db: Session, *, tenant_id: UUID, cliente_id: UUID, produto_id: UUID, quantidade: int
+) -> None:
+    """Reserva `quantidade` unidades (total do carrinho) do produto para o cliente e renova o TTL.
+
+    O lock do produto só dura a transação do carrinho, pelo que a contenção fica repartida pela
+    fase de navegação. Produtos em modo "hot item" não são reservados: o stock é decidido no
+    checkout pelos shards. Não faz commit nem rollback: se recusar, levanta `HTTPException` e a
+    transação (com o que o chamador já escreveu nela) fica a cargo do chamador.
+    """
+
+    produto = (
+        db.query(models.Produto)
+        .filter(models.Produto.id == produto_id, models.Produto.tenant_id == tenant_id)
+        .with_for_update()
+        .populate_existing()
+        .one_or_none()
+    )
+    if produto is None or produto.stock_shards > 0:
+        return
+    if produto.max_por_pedido is not None and quantidade > produto.max_por_pedido:
+        raise HTTPException(status_code=400, detail="Quantidade acima do máximo por pedido")
+    if not produto.permitir_backorder:
+        outros = db.scalar(
+            select(func.coalesce(func.sum(models.ReservaStock.quantidade), 0)).where(
+                models.ReservaStock.produto_id == produto_id,
+                models.ReservaStock.cliente_id != cliente_id,
+                models.ReservaStock.expira_em > func.now(),
+            )
+        )
+        if produto.stock_atual - outros < quantidade:
+            raise HTTPException(status_code=400, detail="Stock insuficiente para o produto")
+
+    reserva = (
+        db.query(models.ReservaStock)
+        .filter(models.ReservaStock.cliente_id == cliente_id, models.ReservaStock.produto_id == produto_id)
+        .one_or_none()
+    )
+    if reserva is None:
+        reserva = models.ReservaStock(tenant_id=tenant_id, cliente_id=cliente_id, produto_id=produto_id)
+        db.add(reserva)
+    reserva.quantidade = quantidade
+    reserva.expira_em = datetime.now(timezone.utc) + timedelta(seconds=settings.stock_reservation_ttl_seconds)
+    db.flush()
+    marcar_stock_alterado(db, tenant_id)
+
+
+def libertar_reservas(db: Session, *, cliente_id: UUID, produto_ids: Iterable[UUID]) -> None:
+    """Apaga as reservas do cliente para os produtos indicados (item removido ou checkout). Não faz commit."""
+
+    ids = list(produto_ids)
+    if not ids:
+        return
+    tenant_ids = db.scalars(
+        delete(models.ReservaStock)
+        .where(models.ReservaStock.cliente_id == cliente_id, models.ReservaStock.produto_id.in_(ids))
+        .returning(models.ReservaStock.tenant_id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    for tenant_id in set(tenant_ids):
+        marcar_stock_alterado(db, tenant_id)
+
+
+def libertar_reservas_expiradas(db: Session, *, batch_size: int | None = None) -> int:
+    """Apaga as reservas expiradas em lotes (uma transação curta por lote); devolve quantas apagou."""
+
+    batch_size = batch_size or settings.stock_reservation_sweep_batch_size
+    total = 0
+    while True:
+        lote = (
+            select(models.ReservaStock.id)
+            .where(models.ReservaStock.expira_em <= func.now())
+            .limit(batch_size)
+            .scalar_subquery()
+        )
+        tenant_ids = db.scalars(
+            delete(models.ReservaStock)
+            .where(models.ReservaStock.id.in_(lote))
+            .returning(models.ReservaStock.tenant_id)
+            .execution_options(synchronize_session=False)
+        ).all()
+        for tenant_id in set(tenant_ids):
+            marcar_stock_alterado(db, tenant_id)
+        db.commit()
+        apagadas = len(tenant_ids)
+        total += apagadas
+        if apagadas < batch_size:
+            return total
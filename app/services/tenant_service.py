@@ -2,13 +2,62 @@
 
 from __future__ import annotations
 
-from typing import Iterable
 from uuid import UUID
 
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.pagination import keyset_list
+from app.domain.tenant import TenantContext
 from app.infrastructure.db import models
 
+# Cache de resolução de tenants (chave: slug ou UUID normalizado). Os identificadores
+# desconhecidos ficam numa cache separada para que headers inválidos não expulsem
+# os tenants reais da LRU.
+_tenant_cache = TTLCache(maxsize=settings.tenant_cache_max_entries, ttl=settings.tenant_cache_ttl_seconds)
+_tenant_miss_cache = TTLCache(
+    maxsize=settings.tenant_cache_max_entries, ttl=settings.tenant_cache_negative_ttl_seconds
+)
+
+TENANT_KEYSET = (models.Tenant.nome, models.Tenant.id)
+
+
+def _cache_key(identifier: str) -> str:
+    try:
+        return str(UUID(identifier))
+    except ValueError:
+        return identifier
+
+
+def _cache_tenant(key: str, tenant: models.Tenant | None) -> TenantContext | None:
+    if tenant is None:
+        _tenant_miss_cache.set(key, True)
+        return None
+    context = TenantContext(
+        id=tenant.id, slug=tenant.slug, is_active=tenant.ativo, timezone=tenant.timezone or "UTC"
+    )
+    _tenant_cache.set(str(tenant.id), context)
+    _tenant_cache.set(tenant.slug, context)
+    return context
+
+
+def invalidate_tenant_cache(tenant: models.Tenant) -> None:
+    """Descarta entradas (positivas e negativas) associadas ao tenant."""
+
+    keys = (str(tenant.id), tenant.slug)
+    _tenant_cache.delete(*keys)
+    _tenant_miss_cache.delete(*keys)
+
+
+def clear_tenant_cache() -> None:
+    """Esvazia a cache de tenants do processo corrente."""
+
+    _tenant_cache.clear()
+    _tenant_miss_cache.clear()
+
 
 def get_tenant_by_slug(db: Session, slug: str) -> models.Tenant | None:
     """Obtém um tenant a partir do slug único."""
@@ -32,19 +81,55 @@ def get_tenant_by_identifier(db: Session, identifier: str) -> models.Tenant | No
     return get_tenant_by_id(db, tenant_uuid)
 
 
-def list_tenants(db: Session) -> Iterable[models.Tenant]:
-    """Lista todos os tenants ordenados pelo nome."""
+async def get_tenant_by_identifier_async(db: AsyncSession, identifier: str) -> models.Tenant | None:
+    """Versão assíncrona de `get_tenant_by_identifier` para endpoints `async def`."""
+
+    try:
+        tenant_uuid = UUID(identifier)
+    except ValueError:
+        result = await db.execute(select(models.Tenant).where(models.Tenant.slug == identifier))
+        return result.scalars().first()
+    return await db.get(models.Tenant, tenant_uuid)
+
+
+def resolve_tenant_context(db: Session, identifier: str) -> TenantContext | None:
+    """Resolve o `TenantContext` via cache, consultando a BD apenas em caso de miss."""
+
+    key = _cache_key(identifier)
+    context = _tenant_cache.get(key)
+    if context is not None:
+        return context
+    if _tenant_miss_cache.get(key):
+        return None
+    return _cache_tenant(key, get_tenant_by_identifier(db, identifier))
+
+
+async def resolve_tenant_context_async(db: AsyncSession, identifier: str) -> TenantContext | None:
+    """Versão assíncrona de `resolve_tenant_context`."""
+
+    key = _cache_key(identifier)
+    context = _tenant_cache.get(key)
+    if context is not None:
+        return context
+    if _tenant_miss_cache.get(key):
+        return None
+    return _cache_tenant(key, await get_tenant_by_identifier_async(db, identifier))
+
+
+def list_tenants(db: Session, *, cursor: str | None = None, limit: int) -> tuple[list[models.Tenant], str | None]:
+    """Lista `limit` tenants ordenados pelo nome a partir de `cursor`; devolve-os com o cursor seguinte."""
 
-    return db.query(models.Tenant).order_by(models.Tenant.nome.asc()).all()
+    return keyset_list(db.query(models.Tenant), keyset=TENANT_KEYSET, cursor=cursor, limit=limit)
 
 
-def create_tenant(db: Session, *, nome: str, slug: str, ativo: bool) -> models.Tenant:
+def create_tenant(db: Session, *, nome: str, slug: str, ativo: bool, timezone: str = "UTC") -> models.Tenant:
     """Cria e persiste um tenant."""
 
-    tenant = models.Tenant(nome=nome, slug=slug, ativo=ativo)
+    tenant = models.Tenant(nome=nome, slug=slug, ativo=ativo, timezone=timezone)
     db.add(tenant)
     db.commit()
     db.refresh(tenant)
+    invalidate_tenant_cache(tenant)
     return tenant
 
 
@@ -54,6 +139,7 @@ def update_tenant(
     *,
     nome: str | None = None,
     ativo: bool | None = None,
+    timezone: str | None = None,
 ) -> models.Tenant:
     """Atualiza campos mutáveis do tenant."""
 
@@ -61,8 +147,11 @@ def update_tenant(
         tenant.nome = nome
     if ativo is not None:
         tenant.ativo = ativo
+    if timezone is not None:
+        tenant.timezone = timezone
 
     db.add(tenant)
     db.commit()
     db.refresh(tenant)
+    invalidate_tenant_cache(tenant)
     return tenant
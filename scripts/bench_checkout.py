@@ -0,0 +1,180 @@
+"""Benchmark de checkouts concorrentes sobre um único produto.
+
+Cria um tenant/merchant/produto isolados com `--stock` unidades e lança `--threads` workers que
+fazem checkouts de uma unidade até o stock esgotar. No fim confirma que não houve oversell
+(unidades vendidas == stock inicial e stock final == 0) e reporta checkouts por segundo.
+
+Uso:
+    python scripts/bench_checkout.py --threads 32 --stock 2000
+    python scripts/bench_checkout.py --threads 32 --stock 2000 --shards 8
+    python scripts/bench_checkout.py --database-url sqlite:///bench.db
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from fastapi import HTTPException
+from sqlalchemy import create_engine, func
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.domain.enums import PedidoOrigem, UserRole
+from app.infrastructure.db import models
+from app.infrastructure.db.base_class import Base
+from app.schemas.checkout import CheckoutItem
+from app.services import stock_service
+from app.services.checkout_service import create_pedido
+
+
+def _preparar(SessionLocal, stock: int, shards: int) -> tuple[uuid.UUID, uuid.UUID, uuid.UUID]:
+    """Cria os dados do benchmark e devolve (tenant_id, cliente_id, produto_id)."""
+
+    sufixo = uuid.uuid4().hex[:8]
+    db = SessionLocal()
+    try:
+        tenant = models.Tenant(nome=f"Bench {sufixo}", slug=f"bench-{sufixo}", ativo=True)
+        db.add(tenant)
+        db.flush()
+
+        owner = models.User(
+            email=f"owner-{sufixo}@bench.dev",
+            password_hash="bench",
+            role=UserRole.MERCHANT,
+            tenant_id=tenant.id,
+            is_active=True,
+        )
+        cliente_user = models.User(
+            email=f"cliente-{sufixo}@bench.dev",
+            password_hash="bench",
+            role=UserRole.CLIENTE,
+            tenant_id=tenant.id,
+            is_active=True,
+        )
+        db.add_all([owner, cliente_user])
+        db.flush()
+
+        merchant = models.Merchant(
+            nome="Bench", slug=f"bench-{sufixo}", tipo="produtos", tenant_id=tenant.id, owner_id=owner.id
+        )
+        cliente = models.Cliente(
+            nome="Bench",
+            email=cliente_user.email,
+            telefone="910000000",
+            tenant_id=tenant.id,
+            user_id=cliente_user.id,
+        )
+        db.add_all([merchant, cliente])
+        db.flush()
+
+        produto = models.Produto(
+            nome="Produto Hot",
+            preco=1,
+            merchant_id=merchant.id,
+            tenant_id=tenant.id,
+            disponivel=True,
+            stock_atual=stock,
+        )
+        db.add(produto)
+        db.flush()
+        if shards:
+            stock_service.configurar_stock(db, produto, shards=shards)
+        db.commit()
+        return tenant.id, cliente.id, produto.id
+    finally:
+        db.close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default=settings.database_url)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--stock", type=int, default=500)
+    parser.add_argument("--shards", type=int, default=0, help="Ativa o modo hot item com N shards")
+    args = parser.parse_args()
+
+    connect_args = {"timeout": 30, "check_same_thread": False} if args.database_url.startswith("sqlite") else {}
+    engine = create_engine(
+        args.database_url,
+        pool_size=args.threads,
+        max_overflow=0,
+        connect_args=connect_args,
+    )
+    Base.metadata.create_all(engine)
+    SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+    tenant_id, cliente_id, produto_id = _preparar(SessionLocal, args.stock, args.shards)
+
+    contadores = {"vendidos": 0, "recusados": 0, "conflitos": 0}
+    lock = threading.Lock()
+
+    def worker() -> None:
+        while True:
+            db = SessionLocal()
+            try:
+                cliente = db.get(models.Cliente, cliente_id)
+                create_pedido(
+                    db=db,
+                    tenant_id=tenant_id,
+                    cliente=cliente,
+                    itens_payload=[CheckoutItem(tipo="produto", ref_id=produto_id, quantidade=1)],
+                    origem=PedidoOrigem.WEB,
+                    metodo_pagamento=None,
+                    estado_pagamento=None,
+                    endereco_id=None,
+                )
+                resultado = "vendidos"
+            except HTTPException:
+                resultado = "recusados"
+            except OperationalError:
+                # Lock timeout/serialização (p.ex. SQLITE_BUSY): conta e volta a tentar.
+                db.rollback()
+                resultado = "conflitos"
+            finally:
+                db.close()
+            with lock:
+                contadores[resultado] += 1
+            if resultado == "recusados":
+                return
+
+    threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+    inicio = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duracao = time.perf_counter() - inicio
+
+    db = SessionLocal()
+    try:
+        stock_final = db.get(models.Produto, produto_id).stock_total
+        unidades = db.query(func.coalesce(func.sum(models.ItemPedido.quantidade), 0)).filter(
+            models.ItemPedido.ref_id == produto_id
+        ).scalar()
+    finally:
+        db.close()
+    engine.dispose()
+
+    print(f"threads={args.threads} shards={args.shards} stock_inicial={args.stock} duração={duracao:.2f}s")
+    print(
+        f"vendidos={contadores['vendidos']} recusados={contadores['recusados']} "
+        f"conflitos={contadores['conflitos']} stock_final={stock_final} unidades_em_pedidos={unidades}"
+    )
+    print(f"checkouts/s={contadores['vendidos'] / duracao:.1f}")
+
+    if stock_final != 0 or unidades != args.stock or contadores["vendidos"] != args.stock:
+        print("❌ Oversell ou stock inconsistente detetado")
+        return 1
+    print("✅ Sem oversell")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,27 @@
+"""Redistribui os shards de stock desequilibrados dos produtos em modo "hot item".
+
+Pensado para correr periodicamente (cron/k8s CronJob) durante drops com muitos checkouts:
+
+    python scripts/rebalance_stock_shards.py
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.core.database import SessionLocal
+from app.services.stock_service import rebalancear_shards
+
+
+def main() -> None:
+    db = SessionLocal()
+    try:
+        tratados = rebalancear_shards(db)
+        print(f"✅ {tratados} produto(s) rebalanceado(s)")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
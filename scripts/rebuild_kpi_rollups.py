@@ -0,0 +1,34 @@
+"""Reconstrói os rollups dos dashboards (merchants e prestadores) a partir do histórico.
+
+Usado no backfill inicial e para corrigir divergências; `--tenant-id` limita a um tenant:
+
+    python scripts/rebuild_kpi_rollups.py
+    python scripts/rebuild_kpi_rollups.py --tenant-id 6f1c...
+"""
+
+import argparse
+import sys
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.core.database import SessionLocal
+from app.services.kpi_service import reconstruir
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tenant-id", type=uuid.UUID, default=None)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        reconstruir(db, tenant_id=args.tenant_id)
+        print("✅ Rollups reconstruídos")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
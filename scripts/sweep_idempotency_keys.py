@@ -0,0 +1,41 @@
+"""Apaga em lotes as chaves de idempotência (`Idempotency-Key`) expiradas.
+
+Corre uma vez ou em ciclo:
+
+    python scripts/sweep_idempotency_keys.py
+    python scripts/sweep_idempotency_keys.py --interval 300
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.core.database import SessionLocal
+from app.services.idempotency_service import apagar_expiradas
+
+
+def sweep() -> int:
+    db = SessionLocal()
+    try:
+        return apagar_expiradas(db)
+    finally:
+        db.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--interval", type=float, default=0, help="Segundos entre execuções (0 = uma vez)")
+    args = parser.parse_args()
+
+    while True:
+        print(f"✅ {sweep()} chave(s) de idempotência expirada(s) apagada(s)")
+        if not args.interval:
+            return
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Liberta (apaga em lotes) as reservas de stock expiradas.
+
+As reservas expiradas já não contam para o stock disponível; o sweeper apenas mantém a tabela e
+o índice pequenos. Corre uma vez ou em ciclo:
+
+    python scripts/sweep_stock_reservations.py
+    python scripts/sweep_stock_reservations.py --interval 60
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.core.database import SessionLocal
+from app.services.stock_service import libertar_reservas_expiradas
+
+
+def sweep() -> int:
+    db = SessionLocal()
+    try:
+        return libertar_reservas_expiradas(db)
+    finally:
+        db.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--interval", type=float, default=0, help="Segundos entre execuções (0 = uma vez)")
+    args = parser.parse_args()
+
+    while True:
+        print(f"✅ {sweep()} reserva(s) expirada(s) libertada(s)")
+        if not args.interval:
+            return
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,8 +6,9 @@ from pathlib import Path
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import Session, sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import NullPool
 
 ROOT_DIR = Path(__file__).resolve().parents[1]
 if str(ROOT_DIR) not in sys.path:
@@ -18,18 +19,45 @@ from app.core.security import create_access_token
 from app.infrastructure.db.base_class import Base
 from app.infrastructure.db import models
 from app.domain.enums import UserRole
-from app.core.deps import get_db
+from app.core.deps import get_async_db, get_db
+from app.core import response_cache
+from app.core.pagination import clear_count_cache
 from app.main import app
+from app.services import auth_service, cart_store, tenant_service
+
+
+@pytest.fixture(autouse=True)
+def _reset_caches():
+    """Garante que as caches em memória não transitam entre testes (cada teste cria a sua BD)."""
+
+    tenant_service.clear_tenant_cache()
+    auth_service.clear_token_state_cache()
+    clear_count_cache()
+    response_cache.clear()
+    cart_store.clear()
+    yield
+    tenant_service.clear_tenant_cache()
+    auth_service.clear_token_state_cache()
+    clear_count_cache()
+    response_cache.clear()
+    cart_store.clear()
 
 
 @pytest.fixture()
-def db_session() -> Session:
-    """Cria uma sessão SQLite em memória para testes unitários."""
+def db_path(tmp_path) -> Path:
+    """Ficheiro SQLite partilhado entre o engine síncrono e o assíncrono (aiosqlite)."""
+
+    return tmp_path / "test.db"
+
+
+@pytest.fixture()
+def db_session(db_path: Path) -> Session:
+    """Cria uma sessão SQLite temporária para testes unitários."""
     engine = create_engine(
-        "sqlite:///:memory:",
+        f"sqlite:///{db_path}",
         future=True,
         connect_args={"check_same_thread": False},
-        poolclass=StaticPool,
+        poolclass=NullPool,
     )
     TestingSessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
     Base.metadata.create_all(engine)
@@ -116,6 +144,7 @@ def db_session() -> Session:
             merchant_id=merchant.id,
             tenant_id=tenant.id,
             disponivel=True,
+            stock_atual=10,
         )
         session.add(produto)
         session.commit()
@@ -124,22 +153,32 @@ def db_session() -> Session:
     finally:
         session.close()
         Base.metadata.drop_all(engine)
+        engine.dispose()
 
 
 @pytest.fixture()
-def client(db_session: Session) -> TestClient:
+def client(db_session: Session, db_path: Path) -> TestClient:
     """Instancia um TestClient com a sessão de BD de testes."""
 
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}", poolclass=NullPool)
+    TestingAsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
     def _get_test_db():
         try:
             yield db_session
         finally:
             pass
 
+    async def _get_test_async_db():
+        async with TestingAsyncSessionLocal() as session:
+            yield session
+
     app.dependency_overrides[get_db] = _get_test_db
+    app.dependency_overrides[get_async_db] = _get_test_async_db
     with TestClient(app) as test_client:
         yield test_client
     app.dependency_overrides.pop(get_db, None)
+    app.dependency_overrides.pop(get_async_db, None)
 
 
 @pytest.fixture()
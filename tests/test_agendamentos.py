@@ -2,14 +2,21 @@
 
 from __future__ import annotations
 
+import asyncio
+import json
 from datetime import datetime, timedelta, timezone
 
 import pytest
 from fastapi import HTTPException
 
+from app.core.pagination import stream_ndjson
 from app.domain.enums import AgendamentoStatus, PedidoOrigem
 from app.infrastructure.db import models
-from app.schemas.agendamento import AgendamentoCreate, AgendamentoStatusUpdate
+from app.schemas.agendamento import (
+    AgendamentoCreate,
+    AgendamentoOut,
+    AgendamentoStatusUpdate,
+)
 from app.services.agendamento_service import criar_agendamento
 
 
@@ -107,3 +114,69 @@ def test_prestador_lista_e_atualiza_agendamentos(client, db_session, auth_header
     body = cancela.json()
     assert body["status"] == AgendamentoStatus.CANCELADO
     assert body["motivo_cancelamento"] == "Cliente indisponível"
+
+
+def test_agenda_do_prestador_paginada_por_cursor_e_exportada_em_ndjson(client, db_session, auth_headers):
+    cliente = db_session.query(models.Cliente).first()
+    servico = db_session.query(models.Servico).first()
+    prestador_user = db_session.get(models.User, servico.prestador.user_id)
+    inicio = datetime(2026, 6, 1, 9)
+    for indice in range(5):
+        db_session.add(
+            models.Agendamento(
+                tenant_id=cliente.tenant_id,
+                cliente_id=cliente.id,
+                prestador_id=servico.prestador_id,
+                servico_id=servico.id,
+                data_hora=inicio + timedelta(hours=indice),
+                status=AgendamentoStatus.PENDENTE,
+            )
+        )
+    db_session.commit()
+    headers = auth_headers(prestador_user)
+    url = "/api/v1/prestadores/me/agendamentos"
+
+    paginas, cursor = [], None
+    while True:
+        resposta = client.get(url, params={"limit": 2, **({"cursor": cursor} if cursor else {})}, headers=headers)
+        assert resposta.status_code == 200
+        paginas.append([item["data_hora"] for item in resposta.json()])
+        cursor = resposta.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    exportacao = client.get(url, params={"format": "ndjson"}, headers=headers)
+
+    esperado = [(inicio + timedelta(hours=indice)).isoformat() for indice in reversed(range(5))]
+    assert [len(pagina) for pagina in paginas] == [2, 2, 1]
+    assert [data for pagina in paginas for data in pagina] == esperado
+    assert exportacao.headers["content-type"] == "application/x-ndjson"
+    assert [json.loads(linha)["data_hora"] for linha in exportacao.text.splitlines()] == esperado
+    assert client.get(url, params={"limit": 1000}, headers=headers).status_code == 422
+
+
+def test_exportacao_ndjson_nao_usa_a_sessao_do_pedido(db_session):
+    cliente = db_session.query(models.Cliente).first()
+    servico = db_session.query(models.Servico).first()
+    db_session.add(
+        models.Agendamento(
+            tenant_id=cliente.tenant_id,
+            cliente_id=cliente.id,
+            prestador_id=servico.prestador_id,
+            servico_id=servico.id,
+            data_hora=datetime(2026, 6, 1, 9),
+            status=AgendamentoStatus.PENDENTE,
+        )
+    )
+    db_session.commit()
+    servico_id = str(servico.id)
+
+    resposta = stream_ndjson(db_session.query(models.Agendamento), AgendamentoOut)
+    # Como a dependência `get_db`, a sessão do pedido fecha antes de o corpo ser enviado.
+    db_session.close()
+
+    async def corpo() -> list[str]:
+        return [linha async for linha in resposta.body_iterator]
+
+    linhas = asyncio.run(corpo())
+    assert [json.loads(linha)["servico_id"] for linha in linhas] == [servico_id]
+    assert not db_session.in_transaction()
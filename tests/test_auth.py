@@ -2,7 +2,10 @@
 
 from __future__ import annotations
 
+from app.core.security import decode_token, get_password_hash
+from app.domain.enums import UserRole
 from app.infrastructure.db import models
+from app.services import auth_service
 
 
 def test_recusa_registo_para_tenant_inativo(client, db_session):
@@ -25,3 +28,42 @@ def test_recusa_registo_para_tenant_inativo(client, db_session):
 
     assert response.status_code == 403
     assert response.json()["detail"] == "Tenant inativo: não é possível registar utilizadores"
+
+
+def test_token_emitido_no_login_e_revogado_pela_desativacao(client, db_session):
+    tenant = db_session.query(models.Tenant).first()
+    user = models.User(
+        email="login@example.com",
+        password_hash=get_password_hash("SenhaForte123"),
+        role=UserRole.CLIENTE,
+        tenant_id=tenant.id,
+        is_active=True,
+    )
+    db_session.add(user)
+    db_session.commit()
+
+    login = client.post("/api/v1/auth/login", json={"email": user.email, "password": "SenhaForte123"})
+    assert login.status_code == 200
+    token = login.json()["access_token"]
+    claims = decode_token(token)
+    assert claims["role"] == UserRole.CLIENTE.value
+    assert claims["tenant_id"] == str(tenant.id)
+    assert claims["ver"] == 0
+
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/api/v1/auth/me", headers=headers).status_code == 200
+
+    auth_service.deactivate_user(db_session, user)
+
+    assert client.get("/api/v1/auth/me", headers=headers).status_code == 401
+
+
+def test_role_verificado_pelas_claims_sem_carregar_utilizador(client, db_session, auth_headers):
+    cliente_user = db_session.query(models.User).filter(models.User.role == UserRole.CLIENTE).first()
+    headers = auth_headers(cliente_user)
+
+    # Acesso negado pelo role contido no token
+    assert client.get("/api/v1/tenants/", headers=headers).status_code == 403
+
+    auth_service.revoke_user_tokens(db_session, cliente_user)
+    assert client.get("/api/v1/tenants/", headers=headers).status_code == 401
@@ -0,0 +1,195 @@
+"""Testes do carrinho server-side."""
+
+from __future__ import annotations
+
+from decimal import Decimal
+
+import pytest
+
+from app.api.v1.routes import cart
+from app.core.config import settings
+from app.infrastructure.db import models
+from app.schemas.cart import CartItemCreate
+from app.services.cart_store import MemoryCartStore
+
+
+def test_batch_soma_itens_com_upsert(client, db_session, auth_headers):
+    cliente = db_session.query(models.Cliente).first()
+    produto = db_session.query(models.Produto).first()
+    servico = db_session.query(models.Servico).first()
+    headers = auth_headers(cliente.user)
+
+    client.post(
+        "/api/v1/me/carrinho/itens",
+        json={"tipo": "produto", "ref_id": str(produto.id), "quantidade": 1},
+        headers=headers,
+    )
+    resposta = client.post(
+        "/api/v1/me/carrinho/itens:batch",
+        json={
+            "itens": [
+                {"tipo": "servico", "ref_id": str(servico.id), "quantidade": 1},
+                {"tipo": "produto", "ref_id": str(produto.id), "quantidade": 2},
+                {"tipo": "produto", "ref_id": str(produto.id), "quantidade": 1},
+            ]
+        },
+        headers=headers,
+    )
+
+    assert resposta.status_code == 201
+    assert [(item["tipo"], item["quantidade"]) for item in resposta.json()] == [("servico", 1), ("produto", 4)]
+    assert db_session.query(models.CartItem).count() == 2
+    reserva = db_session.query(models.ReservaStock).one()
+    assert reserva.quantidade == 4
+
+
+def test_batch_e_atomico(client, db_session, auth_headers):
+    cliente = db_session.query(models.Cliente).first()
+    produto = db_session.query(models.Produto).first()
+    headers = auth_headers(cliente.user)
+
+    sem_stock = client.post(
+        "/api/v1/me/carrinho/itens:batch",
+        json={"itens": [{"tipo": "produto", "ref_id": str(produto.id), "quantidade": 11}]},
+        headers=headers,
+    )
+    inexistente = client.post(
+        "/api/v1/me/carrinho/itens:batch",
+        json={
+            "itens": [
+                {"tipo": "produto", "ref_id": str(produto.id), "quantidade": 1},
+                {"tipo": "servico", "ref_id": str(produto.id), "quantidade": 1},
+            ]
+        },
+        headers=headers,
+    )
+
+    assert sem_stock.status_code == 400
+    assert inexistente.status_code == 404
+    assert db_session.query(models.CartItem).count() == 0
+
+
+def test_backend_em_memoria_nao_escreve_cart_items(client, db_session, auth_headers, monkeypatch):
+    monkeypatch.setattr(settings, "cart_store_backend", "memory")
+    cliente = db_session.query(models.Cliente).first()
+    produto = db_session.query(models.Produto).first()
+    servico = db_session.query(models.Servico).first()
+    headers = auth_headers(cliente.user)
+
+    client.post(
+        "/api/v1/me/carrinho/itens:batch",
+        json={
+            "itens": [
+                {"tipo": "produto", "ref_id": str(produto.id), "quantidade": 2},
+                {"tipo": "servico", "ref_id": str(servico.id), "quantidade": 1},
+            ]
+        },
+        headers=headers,
+    )
+    [linha_produto, linha_servico] = client.get("/api/v1/me/carrinho", headers=headers).json()
+    atualizado = client.patch(
+        f"/api/v1/me/carrinho/itens/{linha_produto['id']}", json={"quantidade": 3}, headers=headers
+    )
+    removido = client.delete(f"/api/v1/me/carrinho/itens/{linha_servico['id']}", headers=headers)
+    pedido = client.post("/api/v1/checkout/", headers=headers)
+
+    assert atualizado.json()["quantidade"] == 3
+    assert removido.status_code == 204
+    assert pedido.status_code == 200
+    assert [(item["tipo"], item["quantidade"]) for item in pedido.json()["itens"]] == [("produto", 3)]
+    assert client.get("/api/v1/me/carrinho", headers=headers).json() == []
+    assert db_session.query(models.CartItem).count() == 0
+    assert db_session.query(models.ReservaStock).count() == 0
+
+
+def test_resumo_usa_precos_atuais_e_agrupa_por_vendedor(client, db_session, auth_headers):
+    cliente = db_session.query(models.Cliente).first()
+    produto = db_session.query(models.Produto).first()
+    servico = db_session.query(models.Servico).first()
+    headers = auth_headers(cliente.user)
+    client.post(
+        "/api/v1/me/carrinho/itens:batch",
+        json={
+            "itens": [
+                {"tipo": "produto", "ref_id": str(produto.id), "quantidade": 2},
+                {"tipo": "servico", "ref_id": str(servico.id), "quantidade": 1},
+            ]
+        },
+        headers=headers,
+    )
+    produto.preco = 30
+    servico.ativo = False
+    db_session.commit()
+
+    resumo = client.get("/api/v1/me/carrinho/resumo", headers=headers).json()
+
+    [grupo] = resumo["grupos"]
+    [item] = grupo["itens"]
+    assert (grupo["tipo"], grupo["id"]) == ("merchant", str(produto.merchant_id))
+    assert item["preco_alterado"] is True
+    assert float(item["preco_unitario"]) == 25
+    assert float(item["total_linha"]) == float(resumo["subtotal"]) == 60
+    assert item["stock_disponivel"] == 10
+    assert resumo["tem_precos_alterados"] is True
+    assert resumo["tem_indisponiveis"] is True
+    assert [linha["ref_id"] for linha in resumo["indisponiveis"]] == [str(servico.id)]
+
+
+def test_carrinho_em_hash_nao_perde_escritas_concorrentes(db_session):
+    cliente = db_session.query(models.Cliente).first()
+    produto = db_session.query(models.Produto).first()
+    # Dois pedidos do mesmo cliente leem o carrinho antes de qualquer um gravar.
+    primeiro, segundo = MemoryCartStore(db_session), MemoryCartStore(db_session)
+    primeiro.listar(cliente.tenant_id, cliente.id)
+    segundo.listar(cliente.tenant_id, cliente.id)
+
+    primeiro.adicionar(cliente.tenant_id, cliente.id, [("produto", produto.id, 2, Decimal("25"))])
+    segundo.adicionar(cliente.tenant_id, cliente.id, [("produto", produto.id, 3, Decimal("25"))])
+    primeiro.commit()
+    segundo.commit()
+
+    [linha] = MemoryCartStore(db_session).listar(cliente.tenant_id, cliente.id)
+    assert linha.quantidade == 5
+
+
+def test_carrinho_em_hash_e_reposto_se_a_transacao_sql_falhar(db_session, monkeypatch):
+    cliente = db_session.query(models.Cliente).first()
+    produto = db_session.query(models.Produto).first()
+    store = MemoryCartStore(db_session)
+    store.adicionar(cliente.tenant_id, cliente.id, [("produto", produto.id, 1, Decimal("25"))])
+    store.commit()
+
+    def falhar():
+        raise RuntimeError("commit falhou")
+
+    store.limpar(cliente.tenant_id, cliente.id)
+    monkeypatch.setattr(db_session, "commit", falhar)
+    with pytest.raises(RuntimeError):
+        store.commit()
+
+    assert [linha.quantidade for linha in MemoryCartStore(db_session).listar(cliente.tenant_id, cliente.id)] == [1]
+
+
+def test_reserva_segue_a_quantidade_gravada_em_adicoes_concorrentes(db_session):
+    cliente = db_session.query(models.Cliente).first()
+    produto = db_session.query(models.Produto).first()
+    inicial = MemoryCartStore(db_session)
+    inicial.adicionar(cliente.tenant_id, cliente.id, [("produto", produto.id, 2, Decimal("25"))])
+    inicial.commit()
+    # O pedido lento lê o carrinho (2 unidades) antes de o outro somar e gravar.
+    lento, rapido = MemoryCartStore(db_session), MemoryCartStore(db_session)
+    lento.listar(cliente.tenant_id, cliente.id)
+
+    for store in (rapido, lento):
+        cart._adicionar_itens(
+            db=db_session,
+            store=store,
+            tenant_id=cliente.tenant_id,
+            cliente=cliente,
+            itens=[CartItemCreate(tipo="produto", ref_id=produto.id, quantidade=1)],
+        )
+        store.commit()
+
+    [linha] = MemoryCartStore(db_session).listar(cliente.tenant_id, cliente.id)
+    reserva = db_session.query(models.ReservaStock).filter_by(cliente_id=cliente.id).one()
+    assert linha.quantidade == reserva.quantidade == 4
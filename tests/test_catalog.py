@@ -0,0 +1,163 @@
+"""Testes dos endpoints públicos de catálogo servidos pela stack assíncrona."""
+
+from __future__ import annotations
+
+from app.core import response_cache
+from app.infrastructure.db import models
+
+
+def _tenant_headers(db_session) -> dict[str, str]:
+    tenant = db_session.query(models.Tenant).first()
+    return {"X-Tenant-ID": tenant.slug}
+
+
+def test_listar_produtos_filtra_por_pesquisa(client, db_session):
+    merchant = db_session.query(models.Merchant).first()
+    db_session.add(
+        models.Produto(
+            nome="Café Moído",
+            preco=4,
+            merchant_id=merchant.id,
+            tenant_id=merchant.tenant_id,
+        )
+    )
+    db_session.commit()
+
+    response = client.get("/api/v1/produtos", params={"search": "café"}, headers=_tenant_headers(db_session))
+
+    assert response.status_code == 200
+    payload = response.json()
+    assert payload["total"] == 1
+    assert payload["items"][0]["nome"] == "Café Moído"
+
+
+def test_get_merchant_por_slug_e_uuid(client, db_session):
+    merchant = db_session.query(models.Merchant).first()
+    headers = _tenant_headers(db_session)
+
+    por_slug = client.get(f"/api/v1/merchants/{merchant.slug}", headers=headers)
+    por_uuid = client.get(f"/api/v1/merchants/{merchant.id}", headers=headers)
+    inexistente = client.get("/api/v1/merchants/nao-existe", headers=headers)
+
+    assert por_slug.status_code == 200
+    assert por_uuid.json()["id"] == por_slug.json()["id"] == str(merchant.id)
+    assert inexistente.status_code == 404
+
+
+def test_listar_prestadores_publicos_rejeita_tenant_desconhecido(client, db_session):
+    ok = client.get("/api/v1/public/prestadores", headers=_tenant_headers(db_session))
+    desconhecido = client.get("/api/v1/public/prestadores", headers={"X-Tenant-ID": "nao-existe"})
+
+    assert ok.status_code == 200
+    assert ok.json()["total"] == 1
+    assert desconhecido.status_code == 404
+
+
+def test_listar_produtos_pagina_por_cursor(client, db_session):
+    merchant = db_session.query(models.Merchant).first()
+    for nome in ("Arroz", "Banana", "Cenoura"):
+        db_session.add(models.Produto(nome=nome, preco=1, merchant_id=merchant.id, tenant_id=merchant.tenant_id))
+    db_session.commit()
+    headers = _tenant_headers(db_session)
+
+    nomes: list[str] = []
+    params: dict[str, object] = {"page_size": 2}
+    while True:
+        response = client.get("/api/v1/produtos", params=params, headers=headers)
+        assert response.status_code == 200
+        payload = response.json()
+        nomes.extend(item["nome"] for item in payload["items"])
+        if not payload["next_cursor"]:
+            break
+        params = {"page_size": 2, "cursor": payload["next_cursor"]}
+
+    assert nomes == sorted(nomes)
+    assert len(nomes) == len(set(nomes)) == payload["total"]
+
+    invalido = client.get("/api/v1/produtos", params={"cursor": "???"}, headers=headers)
+    assert invalido.status_code == 400
+
+
+def test_listar_produtos_sem_contagem_devolve_has_next(client, db_session):
+    merchant = db_session.query(models.Merchant).first()
+    for nome in ("Arroz", "Banana", "Cenoura"):
+        db_session.add(models.Produto(nome=nome, preco=1, merchant_id=merchant.id, tenant_id=merchant.tenant_id))
+    db_session.commit()
+    headers = _tenant_headers(db_session)
+
+    primeira = client.get("/api/v1/produtos", params={"page_size": 2, "count": "none"}, headers=headers).json()
+    segunda = client.get(
+        "/api/v1/produtos", params={"page_size": 2, "page": 2, "count": "none"}, headers=headers
+    ).json()
+
+    assert primeira["total"] is None and primeira["total_pages"] is None
+    assert primeira["has_next"] is True
+    assert segunda["has_next"] is False
+
+
+def test_listar_produtos_contagem_estimada_reutiliza_cache(client, db_session):
+    merchant = db_session.query(models.Merchant).first()
+    headers = _tenant_headers(db_session)
+    params = {"page_size": 50, "count": "estimated"}
+
+    antes = client.get("/api/v1/produtos", params=params, headers=headers).json()["total"]
+    db_session.add(models.Produto(nome="Novo", preco=1, merchant_id=merchant.id, tenant_id=merchant.tenant_id))
+    db_session.commit()
+    # Escrita direta na BD: invalida a cache de respostas como fariam os endpoints de escrita.
+    response_cache.invalidate(response_cache.tenant_tag(merchant.tenant_id, "produtos"))
+    pagina_2 = client.get("/api/v1/produtos", params={**params, "page": 2}, headers=headers).json()
+    depois = client.get("/api/v1/produtos", params=params, headers=headers).json()
+
+    assert pagina_2["total"] == antes
+    # A primeira página é também a última, por isso revela e corrige o total real.
+    assert depois["total"] == antes + 1
+
+
+def test_pesquisa_full_text_ordena_por_relevancia(client, db_session):
+    merchant = db_session.query(models.Merchant).first()
+    db_session.add_all(
+        [
+            models.Produto(
+                nome="Bolo de laranja",
+                descricao_detalhada="Feito com chocolate negro na cobertura",
+                preco=3,
+                merchant_id=merchant.id,
+                tenant_id=merchant.tenant_id,
+            ),
+            models.Produto(
+                nome="Chocolate quente",
+                descricao_curta="Bebida cremosa",
+                preco=2,
+                merchant_id=merchant.id,
+                tenant_id=merchant.tenant_id,
+            ),
+            models.Produto(nome="Pão", preco=1, merchant_id=merchant.id, tenant_id=merchant.tenant_id),
+        ]
+    )
+    db_session.commit()
+    headers = _tenant_headers(db_session)
+
+    response = client.get("/api/v1/produtos", params={"q": "chocolate"}, headers=headers)
+    descricao = client.get("/api/v1/produtos", params={"q": "cremosa"}, headers=headers)
+    com_cursor = client.get("/api/v1/produtos", params={"q": "chocolate", "cursor": "abc"}, headers=headers)
+
+    assert response.status_code == 200
+    assert [item["nome"] for item in response.json()["items"]] == ["Chocolate quente", "Bolo de laranja"]
+    assert [item["nome"] for item in descricao.json()["items"]] == ["Chocolate quente"]
+    assert com_cursor.status_code == 400
+
+
+def test_pesquisa_de_merchants_tolera_erros_de_escrita(client, db_session):
+    tenant = db_session.query(models.Tenant).first()
+    for nome, slug in (("Pizzaria do Bairro", "pizzaria"), ("Pizza Express", "pizza-express")):
+        db_session.add(models.Merchant(nome=nome, slug=slug, tipo="produtos", tenant_id=tenant.id))
+    db_session.commit()
+    headers = _tenant_headers(db_session)
+
+    exata = client.get("/api/v1/merchants/", params={"search": "pizza"}, headers=headers)
+    sem_fuzzy = client.get("/api/v1/merchants/", params={"search": "pizaria"}, headers=headers)
+    com_fuzzy = client.get("/api/v1/merchants/", params={"search": "pizaria", "fuzzy": True}, headers=headers)
+
+    assert [item["nome"] for item in exata.json()["items"]] == ["Pizza Express", "Pizzaria do Bairro"]
+    assert sem_fuzzy.json()["items"] == []
+    assert [item["nome"] for item in com_fuzzy.json()["items"]] == ["Pizzaria do Bairro"]
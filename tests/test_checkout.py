@@ -4,11 +4,13 @@ from __future__ import annotations
 
 import pytest
 from fastapi import HTTPException
+from sqlalchemy import event
 
+from app.core.config import settings
 from app.domain.enums import PedidoOrigem
 from app.infrastructure.db import models
 from app.schemas.checkout import CheckoutItem
-from app.services.checkout_service import create_pedido
+from app.services.checkout_service import cotar_pedido, create_pedido
 
 
 def test_criar_pedido_sucesso(db_session):
@@ -90,6 +92,7 @@ def test_checkout_captura_snapshots_e_limpa_carrinho(db_session):
                 tipo="produto",
                 ref_id=produto.id,
                 quantidade=2,
+                preco_unitario=produto.preco,
             ),
             models.CartItem(
                 tenant_id=tenant_id,
@@ -97,6 +100,7 @@ def test_checkout_captura_snapshots_e_limpa_carrinho(db_session):
                 tipo="servico",
                 ref_id=servico.id,
                 quantidade=1,
+                preco_unitario=servico.preco,
             ),
         ]
     )
@@ -119,3 +123,214 @@ def test_checkout_captura_snapshots_e_limpa_carrinho(db_session):
     assert pedido.endereco_entrega_snapshot["cidade"] == "Lisboa"
     assert all(item.total_linha > 0 for item in pedido.itens)
     assert db_session.query(models.CartItem).count() == 0
+
+
+def test_itens_carregados_com_uma_query_por_tipo(db_session):
+    """O número de SELECTs não cresce com o número de linhas do pedido."""
+
+    cliente = db_session.query(models.Cliente).first()
+    produto = db_session.query(models.Produto).first()
+    servico = db_session.query(models.Servico).first()
+    extras = [
+        models.Produto(
+            nome=f"Produto {indice}",
+            preco=1,
+            merchant_id=produto.merchant_id,
+            tenant_id=cliente.tenant_id,
+            stock_atual=5,
+        )
+        for indice in range(20)
+    ]
+    db_session.add_all(extras)
+    db_session.commit()
+
+    itens = [CheckoutItem(tipo="produto", ref_id=extra.id, quantidade=1) for extra in extras]
+    itens += [
+        CheckoutItem(tipo="produto", ref_id=produto.id, quantidade=4),
+        CheckoutItem(tipo="produto", ref_id=produto.id, quantidade=4),
+        CheckoutItem(tipo="servico", ref_id=servico.id, quantidade=1),
+    ]
+    selects: list[str] = []
+
+    def _registar(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            selects.append(statement)
+
+    engine = db_session.get_bind()
+    event.listen(engine, "before_cursor_execute", _registar)
+    try:
+        pedido = create_pedido(
+            db=db_session,
+            tenant_id=cliente.tenant_id,
+            cliente=cliente,
+            itens_payload=itens,
+            origem=PedidoOrigem.WEB,
+            metodo_pagamento=None,
+            estado_pagamento=None,
+            endereco_id=None,
+        )
+    finally:
+        event.remove(engine, "before_cursor_execute", _registar)
+
+    assert len(pedido.itens) == 23
+    assert pedido.total == 20 + produto.preco * 8 + servico.preco
+    assert produto.stock_atual == 2
+    assert sum("FROM produtos" in sql for sql in selects) == 1
+    assert sum("FROM servicos" in sql for sql in selects) == 1
+
+
+def test_stock_acumulado_de_linhas_repetidas(db_session):
+    """Linhas repetidas do mesmo produto contam contra o mesmo stock."""
+
+    cliente = db_session.query(models.Cliente).first()
+    produto = db_session.query(models.Produto).first()
+
+    with pytest.raises(HTTPException) as erro:
+        create_pedido(
+            db=db_session,
+            tenant_id=cliente.tenant_id,
+            cliente=cliente,
+            itens_payload=[
+                CheckoutItem(tipo="produto", ref_id=produto.id, quantidade=6),
+                CheckoutItem(tipo="produto", ref_id=produto.id, quantidade=6),
+            ],
+            origem=PedidoOrigem.WEB,
+            metodo_pagamento=None,
+            estado_pagamento=None,
+            endereco_id=None,
+        )
+    assert erro.value.status_code == 400
+
+
+def _pedido_com(db_session, cliente, produto, quantidade):
+    return create_pedido(
+        db=db_session,
+        tenant_id=cliente.tenant_id,
+        cliente=cliente,
+        itens_payload=[CheckoutItem(tipo="produto", ref_id=produto.id, quantidade=quantidade)],
+        origem=PedidoOrigem.WEB,
+        metodo_pagamento=None,
+        estado_pagamento=None,
+        endereco_id=None,
+    )
+
+
+def test_stock_insuficiente_nao_decrementa(db_session):
+    """Um pedido recusado por falta de stock não altera o stock do produto."""
+
+    cliente = db_session.query(models.Cliente).first()
+    produto = db_session.query(models.Produto).first()
+
+    with pytest.raises(HTTPException) as erro:
+        _pedido_com(db_session, cliente, produto, 11)
+
+    db_session.refresh(produto)
+    assert erro.value.detail == "Stock insuficiente para o produto"
+    assert produto.stock_atual == 10
+
+
+def test_backorder_e_maximo_por_pedido(db_session):
+    """`permitir_backorder` aceita stock negativo e `max_por_pedido` limita a quantidade."""
+
+    cliente = db_session.query(models.Cliente).first()
+    produto = db_session.query(models.Produto).first()
+    produto.permitir_backorder = True
+    produto.max_por_pedido = 12
+    db_session.commit()
+
+    _pedido_com(db_session, cliente, produto, 12)
+    with pytest.raises(HTTPException) as erro:
+        _pedido_com(db_session, cliente, produto, 13)
+
+    db_session.refresh(produto)
+    assert produto.stock_atual == -2
+    assert erro.value.detail == "Quantidade acima do máximo por pedido"
+
+
+def _checkout_cotado(db_session, cliente, itens, quote_token):
+    return create_pedido(
+        db=db_session,
+        tenant_id=cliente.tenant_id,
+        cliente=cliente,
+        itens_payload=itens,
+        origem=PedidoOrigem.WEB,
+        metodo_pagamento=None,
+        estado_pagamento=None,
+        endereco_id=None,
+        quote_token=quote_token,
+    )
+
+
+def test_cotacao_fixa_precos_das_linhas_inalteradas(db_session):
+    """Linhas inalteradas usam o preço cotado; as alteradas são re-precificadas."""
+
+    cliente = db_session.query(models.Cliente).first()
+    produto = db_session.query(models.Produto).first()
+    servico = db_session.query(models.Servico).first()
+    itens = [
+        CheckoutItem(tipo="produto", ref_id=produto.id, quantidade=2),
+        CheckoutItem(tipo="servico", ref_id=servico.id, quantidade=1),
+    ]
+    cotacao = cotar_pedido(db=db_session, tenant_id=cliente.tenant_id, cliente=cliente, itens_payload=itens)
+    assert cotacao["total"] == produto.preco * 2 + servico.preco
+    assert db_session.get(models.Produto, produto.id).stock_atual == 10
+
+    produto.preco = 99
+    servico.preco = 99
+    db_session.commit()
+    selects: list[str] = []
+
+    def _registar(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            selects.append(statement)
+
+    engine = db_session.get_bind()
+    event.listen(engine, "before_cursor_execute", _registar)
+    try:
+        pedido = _checkout_cotado(
+            db_session,
+            cliente,
+            [itens[0], CheckoutItem(tipo="servico", ref_id=servico.id, quantidade=2)],
+            cotacao["quote_token"],
+        )
+    finally:
+        event.remove(engine, "before_cursor_execute", _registar)
+
+    db_session.refresh(produto)
+    assert [item.preco_unitario for item in pedido.itens] == [25, 99]
+    assert produto.stock_atual == 8
+    # Os produtos (fixados ou não) continuam a ser lidos numa única query.
+    assert len([sql for sql in selects if "FROM produtos" in sql]) == 1
+
+
+def test_cotacao_nao_vende_produto_desativado_depois_da_cotacao(db_session):
+    cliente = db_session.query(models.Cliente).first()
+    produto = db_session.query(models.Produto).first()
+    itens = [CheckoutItem(tipo="produto", ref_id=produto.id, quantidade=1)]
+    cotacao = cotar_pedido(db=db_session, tenant_id=cliente.tenant_id, cliente=cliente, itens_payload=itens)
+
+    produto.ativo = False
+    db_session.commit()
+    with pytest.raises(HTTPException) as indisponivel:
+        _checkout_cotado(db_session, cliente, itens, cotacao["quote_token"])
+
+    db_session.refresh(produto)
+    assert indisponivel.value.status_code == 404
+    assert produto.stock_atual == 10
+    assert db_session.query(models.Pedido).count() == 0
+
+
+def test_cotacao_invalida_ou_expirada(db_session, monkeypatch):
+    cliente = db_session.query(models.Cliente).first()
+    produto = db_session.query(models.Produto).first()
+    itens = [CheckoutItem(tipo="produto", ref_id=produto.id, quantidade=1)]
+
+    with pytest.raises(HTTPException) as invalida:
+        _checkout_cotado(db_session, cliente, itens, "nao-e-um-token")
+    monkeypatch.setattr(settings, "checkout_quote_ttl_seconds", -1)
+    cotacao = cotar_pedido(db=db_session, tenant_id=cliente.tenant_id, cliente=cliente, itens_payload=itens)
+    with pytest.raises(HTTPException) as expirada:
+        _checkout_cotado(db_session, cliente, itens, cotacao["quote_token"])
+
+    assert invalida.value.status_code == 400
+    assert expirada.value.status_code == 409
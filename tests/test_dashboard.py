@@ -2,14 +2,22 @@
 
 from __future__ import annotations
 
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
 from decimal import Decimal
 
 import pytest
+from sqlalchemy import event, func
+from sqlalchemy.orm import sessionmaker
 
 from app.api.v1.routes.dashboard import merchant_summary
 from app.core.deps import TenantContext
-from app.domain.enums import PedidoStatus
+from app.domain.enums import AgendamentoStatus, PedidoStatus
 from app.infrastructure.db import models
+from app.schemas.checkout import CheckoutItem
+from app.services import kpi_service
+from app.services.checkout_service import create_pedido, sub_pedidos_por_merchant
 
 
 @pytest.fixture()
@@ -48,9 +56,11 @@ def _criar_pedido(
         ref_id=produto.id,
         quantidade=quantidade,
         preco_unitario=unitario,
+        merchant_id=produto.merchant_id,
         tenant_id=tenant.id,
     )
     db_session.add(item)
+    pedido.sub_pedidos = sub_pedidos_por_merchant([item], status=status)
     db_session.flush()
     return pedido
 
@@ -90,6 +100,8 @@ def test_merchant_summary_considera_apenas_pedidos_pagos(db_session, merchant_co
         quantidade=5,
     )
     db_session.commit()
+    # Pedidos inseridos diretamente: os rollups vêm do backfill.
+    kpi_service.reconstruir(db_session)
 
     resultado = merchant_summary(db=db_session, tenant=tenant_context, merchant=merchant)
 
@@ -101,3 +113,241 @@ def test_merchant_summary_considera_apenas_pedidos_pagos(db_session, merchant_co
     statuses = {pedido["status"] for pedido in resultado["ultimos_pedidos"]}
     assert PedidoStatus.PAGO.value in statuses
     assert PedidoStatus.CANCELADO.value in statuses
+
+
+def test_rollups_atualizados_no_checkout_e_na_mudanca_de_status(client, db_session, auth_headers, merchant_context):
+    tenant_context, merchant = merchant_context
+    cliente = db_session.query(models.Cliente).first()
+    produto = db_session.query(models.Produto).first()
+    owner = db_session.get(models.User, merchant.owner_id)
+    pedido = create_pedido(
+        db=db_session,
+        tenant_id=cliente.tenant_id,
+        cliente=cliente,
+        itens_payload=[CheckoutItem(tipo="produto", ref_id=produto.id, quantidade=3)],
+        origem=None,
+        metodo_pagamento=None,
+        estado_pagamento=None,
+        endereco_id=None,
+    )
+    antes = merchant_summary(db=db_session, tenant=tenant_context, merchant=merchant)
+
+    aceite = client.patch(
+        f"/api/v1/merchants/me/pedidos/{pedido.id}/status",
+        json={"status": PedidoStatus.ACEITE.value},
+        headers=auth_headers(owner),
+    )
+    sub_pedido = db_session.query(models.PedidoMerchant).filter_by(pedido_id=pedido.id).one()
+    sub_pedido.status = PedidoStatus.PAGO
+    kpi_service.mudar_status_sub_pedido(db_session, sub_pedido, PedidoStatus.ACEITE)
+    db_session.commit()
+    depois = merchant_summary(db=db_session, tenant=tenant_context, merchant=merchant)
+    incremental = merchant_summary(db=db_session, tenant=tenant_context, merchant=merchant)
+    kpi_service.reconstruir(db_session)
+    reconstruido = merchant_summary(db=db_session, tenant=tenant_context, merchant=merchant)
+
+    assert aceite.status_code == 200
+    assert antes["total_pedidos_por_status"] == {PedidoStatus.CRIADO.value: 1}
+    assert depois["total_pedidos_por_status"] == {PedidoStatus.PAGO.value: 1}
+    assert depois["faturacao_total"] == pytest.approx(75.0)
+    assert depois["top_produtos"][0]["total_vendido"] == 3
+    assert {k: v for k, v in reconstruido.items() if k != "ultimos_pedidos"} == {
+        k: v for k, v in incremental.items() if k != "ultimos_pedidos"
+    }
+
+
+def test_merchant_summary_usa_dois_statements(db_session, merchant_context):
+    """Agregados num único statement sobre os rollups e um para os últimos pedidos."""
+
+    tenant_context, merchant = merchant_context
+    tenant = db_session.query(models.Tenant).first()
+    cliente = db_session.query(models.Cliente).first()
+    produto = db_session.query(models.Produto).first()
+    for status in (PedidoStatus.PAGO, PedidoStatus.CANCELADO, PedidoStatus.PAGO):
+        _criar_pedido(db_session, tenant=tenant, cliente=cliente, produto=produto, status=status, quantidade=1)
+    db_session.commit()
+    kpi_service.reconstruir(db_session)
+    db_session.refresh(merchant)
+    statements: list[str] = []
+
+    def _registar(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = db_session.get_bind()
+    event.listen(engine, "before_cursor_execute", _registar)
+    try:
+        resultado = merchant_summary(db=db_session, tenant=tenant_context, merchant=merchant)
+    finally:
+        event.remove(engine, "before_cursor_execute", _registar)
+
+    assert len(statements) == 2
+    assert resultado["total_pedidos"] == 2
+    assert resultado["faturacao_total"] == pytest.approx(50.0)
+    assert len(resultado["ultimos_pedidos"]) == 3
+
+
+def test_series_agrupam_dias_locais_do_tenant(client, db_session, auth_headers):
+    tenant = db_session.query(models.Tenant).first()
+    tenant.timezone = "Africa/Maputo"
+    merchant = db_session.query(models.Merchant).first()
+    owner = db_session.get(models.User, merchant.owner_id)
+    cliente = db_session.query(models.Cliente).first()
+    produto = db_session.query(models.Produto).first()
+    # 23:30 UTC de 31/03 já é 01/04 em Maputo (UTC+2).
+    for criado, quantidade in ((datetime(2026, 3, 30, 10), 1), (datetime(2026, 3, 31, 23, 30), 2)):
+        pedido = _criar_pedido(
+            db_session, tenant=tenant, cliente=cliente, produto=produto, status=PedidoStatus.PAGO, quantidade=quantidade
+        )
+        pedido.created_at = criado
+    db_session.commit()
+    kpi_service.reconstruir(db_session)
+    url = "/api/v1/dashboard/merchant/me/series"
+
+    diaria = client.get(url, params={"from": "2026-03-30", "to": "2026-04-01"}, headers=auth_headers(owner)).json()
+    mensal = client.get(
+        url, params={"granularity": "month", "from": "2026-03-01", "to": "2026-04-30"}, headers=auth_headers(owner)
+    ).json()
+
+    assert diaria["timezone"] == "Africa/Maputo"
+    assert [(b["inicio"], b["pedidos"], b["itens"]) for b in diaria["buckets"]] == [
+        ("2026-03-30", 1, 1),
+        ("2026-03-31", 0, 0),
+        ("2026-04-01", 1, 2),
+    ]
+    assert [(b["inicio"], b["faturacao"]) for b in mensal["buckets"]] == [("2026-03-01", 25.0), ("2026-04-01", 50.0)]
+
+
+def test_series_de_agendamentos_do_prestador(client, db_session, auth_headers):
+    cliente = db_session.query(models.Cliente).first()
+    servico = db_session.query(models.Servico).first()
+    prestador_user = db_session.get(models.User, servico.prestador.user_id)
+    for dia in (date(2026, 5, 4), date(2026, 5, 6), date(2026, 5, 12)):
+        db_session.add(
+            models.Agendamento(
+                tenant_id=cliente.tenant_id,
+                cliente_id=cliente.id,
+                prestador_id=servico.prestador_id,
+                servico_id=servico.id,
+                data_hora=datetime(dia.year, dia.month, dia.day, 10),
+                status=AgendamentoStatus.CONFIRMADO,
+            )
+        )
+    db_session.commit()
+    kpi_service.reconstruir(db_session)
+
+    serie = client.get(
+        "/api/v1/dashboard/prestador/me/series",
+        params={"granularity": "week", "from": "2026-05-04", "to": "2026-05-17"},
+        headers=auth_headers(prestador_user),
+    ).json()
+    resumo = client.get("/api/v1/dashboard/prestador/me/resumo", headers=auth_headers(prestador_user)).json()
+
+    assert [(b["inicio"], b["total"]) for b in serie["buckets"]] == [("2026-05-04", 2), ("2026-05-11", 1)]
+    assert serie["buckets"][0]["por_status"] == {AgendamentoStatus.CONFIRMADO.value: 2}
+    assert resumo["total_por_status"] == {AgendamentoStatus.CONFIRMADO.value: 3}
+
+
+def test_fuso_invalido_do_tenant_usa_utc_sem_falhar_o_checkout(db_session, caplog):
+    tenant = db_session.query(models.Tenant).first()
+    tenant.timezone = "Marte/Olympus"
+    db_session.commit()
+    cliente = db_session.query(models.Cliente).first()
+    produto = db_session.query(models.Produto).first()
+
+    pedido = create_pedido(
+        db=db_session,
+        tenant_id=cliente.tenant_id,
+        cliente=cliente,
+        itens_payload=[CheckoutItem(tipo="produto", ref_id=produto.id, quantidade=1)],
+        origem=None,
+        metodo_pagamento=None,
+        estado_pagamento=None,
+        endereco_id=None,
+    )
+    kpi_service.reconstruir(db_session)
+
+    assert pedido.id is not None
+    assert kpi_service.zona_horaria("Marte/Olympus").key == "UTC"
+    assert "Marte/Olympus" in caplog.text
+
+
+def test_checkouts_concorrentes_com_varios_merchants_somam_nos_rollups(db_session):
+    tenant = db_session.query(models.Tenant).first()
+    cliente = db_session.query(models.Cliente).first()
+    produto_a = db_session.query(models.Produto).first()
+    outro = models.Merchant(nome="Loja B", slug="loja-b", tipo="produtos", tenant_id=tenant.id)
+    db_session.add(outro)
+    db_session.flush()
+    produto_b = models.Produto(
+        nome="Produto Y", preco=10, merchant_id=outro.id, tenant_id=tenant.id, disponivel=True, stock_atual=10
+    )
+    db_session.add(produto_b)
+    db_session.commit()
+    ordens = [(produto_a.id, produto_b.id), (produto_b.id, produto_a.id)] * 3
+    sessoes = sessionmaker(bind=db_session.get_bind(), autoflush=False)
+    barreira = threading.Barrier(len(ordens))
+
+    def comprar(ids):
+        with sessoes() as sessao:
+            comprador = sessao.get(models.Cliente, cliente.id)
+            barreira.wait()
+            create_pedido(
+                db=sessao,
+                tenant_id=tenant.id,
+                cliente=comprador,
+                itens_payload=[CheckoutItem(tipo="produto", ref_id=ref_id, quantidade=1) for ref_id in ids],
+                origem=None,
+                metodo_pagamento=None,
+                estado_pagamento=None,
+                endereco_id=None,
+            )
+
+    with ThreadPoolExecutor(max_workers=len(ordens)) as executor:
+        list(executor.map(comprar, ordens))
+
+    vendidos = dict(
+        db_session.query(models.MerchantProdutoVendas.produto_id, func.sum(models.MerchantProdutoVendas.quantidade))
+        .group_by(models.MerchantProdutoVendas.produto_id)
+        .all()
+    )
+    pedidos = dict(
+        db_session.query(models.MerchantKpiDiario.merchant_id, func.sum(models.MerchantKpiDiario.pedidos))
+        .group_by(models.MerchantKpiDiario.merchant_id)
+        .all()
+    )
+    assert vendidos == {produto_a.id: len(ordens), produto_b.id: len(ordens)}
+    assert pedidos == {produto_a.merchant_id: len(ordens), outro.id: len(ordens)}
+
+
+def test_rollups_sao_escritos_por_ordem_da_chave(db_session):
+    tenant = db_session.query(models.Tenant).first()
+    merchants = [
+        models.Merchant(nome=f"Loja {letra}", slug=f"loja-{letra}", tipo="produtos", tenant_id=tenant.id)
+        for letra in "BC"
+    ]
+    db_session.add_all(merchants)
+    db_session.flush()
+    ids = {str(merchant.id) for merchant in merchants}
+    statements = []
+    event.listen(db_session.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[3]))
+
+    kpi_service._somar(
+        db_session,
+        models.MerchantKpiDiario,
+        ["merchant_id", "dia", "status", "shard"],
+        ["pedidos"],
+        [
+            {
+                "tenant_id": tenant.id,
+                "merchant_id": merchant.id,
+                "dia": date(2026, 4, 1),
+                "status": PedidoStatus.PAGO,
+                "shard": 0,
+                "pedidos": 1,
+            }
+            for merchant in sorted(merchants, key=lambda merchant: str(merchant.id), reverse=True)
+        ],
+    )
+
+    escritos = [valor for valor in statements[-1] if valor in ids]
+    assert escritos == sorted(ids)
@@ -0,0 +1,185 @@
+"""Testes do suporte a `Idempotency-Key` em checkout e agendamentos."""
+
+from __future__ import annotations
+
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.infrastructure.db import models
+from app.services import idempotency_service
+
+
+def test_checkout_repetido_devolve_a_resposta_guardada(client, db_session, auth_headers):
+    cliente = db_session.query(models.Cliente).first()
+    produto = db_session.query(models.Produto).first()
+    headers = {**auth_headers(cliente.user), "Idempotency-Key": "pedido-1"}
+    corpo = {"itens": [{"tipo": "produto", "ref_id": str(produto.id), "quantidade": 2}]}
+
+    primeiro = client.post("/api/v1/checkout/", json=corpo, headers=headers)
+    repetido = client.post("/api/v1/checkout/", json=corpo, headers=headers)
+    outro_corpo = client.post(
+        "/api/v1/checkout/",
+        json={"itens": [{"tipo": "produto", "ref_id": str(produto.id), "quantidade": 1}]},
+        headers=headers,
+    )
+
+    db_session.expire_all()
+    assert primeiro.status_code == repetido.status_code == 200
+    assert repetido.json() == primeiro.json()
+    assert repetido.headers["Idempotent-Replayed"] == "true"
+    assert "Idempotent-Replayed" not in primeiro.headers
+    assert outro_corpo.status_code == 422
+    assert db_session.query(models.Pedido).count() == 1
+    assert db_session.get(models.Produto, produto.id).stock_atual == 8
+
+
+def test_falha_liberta_a_chave(client, db_session, auth_headers):
+    cliente = db_session.query(models.Cliente).first()
+    produto = db_session.query(models.Produto).first()
+    headers = {**auth_headers(cliente.user), "Idempotency-Key": "pedido-2"}
+    corpo = {"itens": [{"tipo": "produto", "ref_id": str(produto.id), "quantidade": 11}]}
+
+    recusado = client.post("/api/v1/checkout/", json=corpo, headers=headers)
+    produto.stock_atual = 20
+    db_session.commit()
+    aceite = client.post("/api/v1/checkout/", json=corpo, headers=headers)
+
+    assert recusado.status_code == 400
+    assert aceite.status_code == 200
+    assert "Idempotent-Replayed" not in aceite.headers
+
+
+def test_agendamento_repetido_e_limpeza(client, db_session, auth_headers):
+    cliente = db_session.query(models.Cliente).first()
+    servico = db_session.query(models.Servico).first()
+    headers = {**auth_headers(cliente.user), "Idempotency-Key": "agendamento-1"}
+    corpo = {
+        "prestador_id": str(servico.prestador_id),
+        "servico_id": str(servico.id),
+        "data_hora": (datetime.now(timezone.utc) + timedelta(days=1)).isoformat(),
+        "nome": "Cliente",
+        "contacto": "910000000",
+    }
+
+    primeiro = client.post("/api/v1/agendamentos/", json=corpo, headers=headers)
+    repetido = client.post("/api/v1/agendamentos/", json=corpo, headers=headers)
+
+    assert repetido.json()["id"] == primeiro.json()["id"]
+    assert db_session.query(models.Agendamento).count() == 1
+
+    chave = db_session.query(models.IdempotencyKey).one()
+    chave.expira_em = datetime.utcnow() - timedelta(minutes=1)
+    db_session.commit()
+    assert idempotency_service.apagar_expiradas(db_session) == 1
+    assert db_session.query(models.IdempotencyKey).count() == 0
+
+
+def test_chave_em_curso_com_lease_expirado_e_retomada(db_session):
+    cliente = db_session.query(models.Cliente).first()
+    # Pedido original morreu depois de reclamar a chave: sem resposta e com o lease já expirado.
+    db_session.add(
+        models.IdempotencyKey(
+            tenant_id=cliente.tenant_id,
+            cliente_id=cliente.id,
+            chave="pedido-3",
+            request_hash="hash",
+            expira_em=datetime.utcnow() + timedelta(hours=1),
+            em_curso_ate=datetime.utcnow() - timedelta(minutes=1),
+        )
+    )
+    db_session.commit()
+    argumentos = {"tenant_id": cliente.tenant_id, "cliente_id": cliente.id, "chave": "pedido-3"}
+
+    resposta, repetida = idempotency_service.executar(
+        db_session, **argumentos, request_hash="hash", operacao=lambda: {"id": "novo"}
+    )
+    guardada, repetida_depois = idempotency_service.executar(
+        db_session, **argumentos, request_hash="hash", operacao=lambda: {"id": "outro"}
+    )
+
+    assert (resposta, repetida) == ({"id": "novo"}, False)
+    assert (guardada, repetida_depois) == ({"id": "novo"}, True)
+
+
+def test_chave_em_curso_dentro_do_lease_devolve_409(db_session):
+    cliente = db_session.query(models.Cliente).first()
+    db_session.add(
+        models.IdempotencyKey(
+            tenant_id=cliente.tenant_id,
+            cliente_id=cliente.id,
+            chave="pedido-4",
+            request_hash="hash",
+            expira_em=datetime.utcnow() + timedelta(hours=1),
+            em_curso_ate=datetime.utcnow() + timedelta(minutes=1),
+        )
+    )
+    db_session.commit()
+
+    with pytest.raises(HTTPException) as erro:
+        idempotency_service.executar(
+            db_session,
+            tenant_id=cliente.tenant_id,
+            cliente_id=cliente.id,
+            chave="pedido-4",
+            request_hash="hash",
+            operacao=lambda: {"id": "novo"},
+        )
+
+    assert erro.value.status_code == 409
+
+
+def _outra_sessao(db_session):
+    return sessionmaker(bind=db_session.get_bind(), autoflush=False)()
+
+
+def test_original_que_perdeu_o_lease_nao_faz_commit(db_session):
+    cliente = db_session.query(models.Cliente).first()
+    produto_id = db_session.query(models.Produto).first().id
+    argumentos = {"tenant_id": cliente.tenant_id, "cliente_id": cliente.id, "chave": "pedido-5"}
+
+    def vender(sessao):
+        sessao.get(models.Produto, produto_id).stock_atual -= 1
+        sessao.commit()
+        return {"vendido": True}
+
+    def original():
+        # Operação lenta: o lease expira e a repetição do cliente retoma a chave antes do commit.
+        with _outra_sessao(db_session) as sessao:
+            sessao.query(models.IdempotencyKey).update({"em_curso_ate": datetime.utcnow() - timedelta(seconds=1)})
+            sessao.commit()
+            repetida = idempotency_service.executar(
+                sessao, **argumentos, request_hash="hash", operacao=lambda: vender(sessao)
+            )
+        assert repetida == ({"vendido": True}, False)
+        return vender(db_session)
+
+    with pytest.raises(HTTPException) as perdida:
+        idempotency_service.executar(db_session, **argumentos, request_hash="hash", operacao=original)
+
+    db_session.expire_all()
+    assert perdida.value.status_code == 409
+    assert db_session.get(models.Produto, produto_id).stock_atual == 9
+    assert db_session.query(models.IdempotencyKey).one().resposta == {"vendido": True}
+
+
+def test_lease_e_renovado_enquanto_a_operacao_corre(db_session, monkeypatch):
+    monkeypatch.setattr(settings, "idempotency_lease_seconds", 0.3)
+    cliente = db_session.query(models.Cliente).first()
+    argumentos = {"tenant_id": cliente.tenant_id, "cliente_id": cliente.id, "chave": "pedido-6"}
+
+    def lenta():
+        # Mais do que o lease (e do que a resolução de 1 s do `CURRENT_TIMESTAMP` do SQLite).
+        time.sleep(1.5)
+        with _outra_sessao(db_session) as sessao, pytest.raises(HTTPException) as em_curso:
+            idempotency_service.executar(sessao, **argumentos, request_hash="hash", operacao=lambda: {"id": "outro"})
+        assert em_curso.value.status_code == 409
+        return {"id": "original"}
+
+    resposta = idempotency_service.executar(db_session, **argumentos, request_hash="hash", operacao=lenta)
+
+    assert resposta == ({"id": "original"}, False)
@@ -5,9 +5,12 @@ from __future__ import annotations
 from datetime import datetime, timezone
 
 import pytest
+from sqlalchemy import event
 
-from app.domain.enums import PedidoOrigem, PedidoStatus
+from app.domain.enums import PedidoOrigem, PedidoStatus, UserRole
 from app.infrastructure.db import models
+from app.schemas.checkout import CheckoutItem
+from app.services.checkout_service import create_pedido, sub_pedidos_por_merchant
 
 
 def test_list_merchants_retorna_metadata_de_paginacao(client, db_session):
@@ -158,6 +161,7 @@ def test_merchant_visualiza_pedidos_relevantes(client, db_session, auth_headers)
             total_linha=produto.preco,
         )
     ]
+    pedido.sub_pedidos = sub_pedidos_por_merchant(pedido.itens, status=pedido.status)
     db_session.add(pedido)
     db_session.commit()
 
@@ -175,3 +179,148 @@ def test_merchant_visualiza_pedidos_relevantes(client, db_session, auth_headers)
     assert float(detalhe_json["total"]) == pytest.approx(float(produto.preco))
     assert detalhe_json["endereco_entrega_snapshot"]["cidade"] == "Lisboa"
     assert detalhe_json["itens"][0]["nome_snapshot"] == produto.nome
+
+
+def test_get_produto_privado_reutiliza_principal_carregado(client, db_session, auth_headers):
+    merchant = db_session.query(models.Merchant).first()
+    owner = db_session.query(models.User).filter(models.User.id == merchant.owner_id).first()
+    produto = db_session.query(models.Produto).first()
+    headers = auth_headers(owner)
+    url = f"/api/v1/merchants/{merchant.id}/produtos/{produto.id}"
+
+    # Primeiro pedido aquece as caches de tenant e de versão do token
+    assert client.get(url, headers=headers).status_code == 200
+
+    statements: list[str] = []
+
+    def _capturar(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = db_session.get_bind()
+    event.listen(engine, "before_cursor_execute", _capturar)
+    try:
+        response = client.get(url, headers=headers)
+    finally:
+        event.remove(engine, "before_cursor_execute", _capturar)
+
+    assert response.status_code == 200
+    assert response.json()["id"] == str(produto.id)
+    # Uma query para utilizador + merchant e outra para o produto
+    assert len([stmt for stmt in statements if stmt.lstrip().upper().startswith("SELECT")]) == 2
+
+
+def test_lista_de_pedidos_carrega_itens_do_merchant_numa_query(client, db_session, auth_headers):
+    tenant = db_session.query(models.Tenant).first()
+    merchant = db_session.query(models.Merchant).filter(models.Merchant.tenant_id == tenant.id).first()
+    outro = models.Merchant(nome="Outra Loja", slug="outra-loja", tipo="produtos", tenant_id=tenant.id)
+    db_session.add(outro)
+    db_session.flush()
+    owner = db_session.query(models.User).filter(models.User.id == merchant.owner_id).first()
+    cliente = db_session.query(models.Cliente).first()
+    produto = db_session.query(models.Produto).first()
+
+    for _ in range(5):
+        pedido = models.Pedido(
+            tenant_id=tenant.id,
+            cliente_id=cliente.id,
+            subtotal=produto.preco,
+            total=produto.preco,
+            status=PedidoStatus.PAGO,
+            origem=PedidoOrigem.WEB,
+        )
+        # Dois itens do merchant (o pedido não pode repetir-se) e um de outro merchant.
+        pedido.itens = [
+            models.ItemPedido(
+                tenant_id=tenant.id,
+                tipo="produto",
+                ref_id=produto.id,
+                quantidade=1,
+                preco_unitario=produto.preco,
+                merchant_id=dono.id,
+                total_linha=produto.preco,
+            )
+            for dono in (merchant, merchant, outro)
+        ]
+        pedido.sub_pedidos = sub_pedidos_por_merchant(pedido.itens, status=pedido.status)
+        db_session.add(pedido)
+    db_session.commit()
+
+    headers = auth_headers(owner)
+    url = "/api/v1/merchants/me/pedidos"
+    assert client.get(url, headers=headers).status_code == 200
+
+    statements: list[str] = []
+
+    def _capturar(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = db_session.get_bind()
+    event.listen(engine, "before_cursor_execute", _capturar)
+    try:
+        response = client.get(url, params={"page_size": 3}, headers=headers)
+    finally:
+        event.remove(engine, "before_cursor_execute", _capturar)
+
+    pedidos = response.json()
+    assert response.status_code == 200
+    assert len({pedido["id"] for pedido in pedidos}) == 3
+    assert all(
+        len(pedido["itens"]) == 2 and {item["merchant_id"] for item in pedido["itens"]} == {str(merchant.id)}
+        for pedido in pedidos
+    )
+    # Utilizador + merchant, página de pedidos e itens da página
+    assert len([stmt for stmt in statements if stmt.lstrip().upper().startswith("SELECT")]) == 3
+
+
+def test_status_do_merchant_so_altera_o_seu_sub_pedido(client, db_session, auth_headers):
+    tenant = db_session.query(models.Tenant).first()
+    merchant = db_session.query(models.Merchant).first()
+    produto = db_session.query(models.Produto).first()
+    cliente = db_session.query(models.Cliente).first()
+    owner = db_session.get(models.User, merchant.owner_id)
+    outro_owner = models.User(
+        email="outro.owner@example.com", password_hash="hash", role=UserRole.MERCHANT, tenant_id=tenant.id
+    )
+    db_session.add(outro_owner)
+    db_session.flush()
+    outro = models.Merchant(
+        nome="Outra Loja", slug="outra-loja", tipo="produtos", tenant_id=tenant.id, owner_id=outro_owner.id
+    )
+    db_session.add(outro)
+    db_session.flush()
+    outro_produto = models.Produto(nome="Produto Y", preco=10, merchant_id=outro.id, tenant_id=tenant.id, stock_atual=5)
+    db_session.add(outro_produto)
+    db_session.commit()
+
+    pedido = create_pedido(
+        db=db_session,
+        tenant_id=tenant.id,
+        cliente=cliente,
+        itens_payload=[
+            CheckoutItem(tipo="produto", ref_id=produto.id, quantidade=2),
+            CheckoutItem(tipo="produto", ref_id=outro_produto.id, quantidade=3),
+        ],
+        origem=PedidoOrigem.WEB,
+        metodo_pagamento=None,
+        estado_pagamento=None,
+        endereco_id=None,
+    )
+    sub_pedidos = {sub.merchant_id: sub for sub in pedido.sub_pedidos}
+    assert (sub_pedidos[merchant.id].subtotal, sub_pedidos[merchant.id].total_itens) == (50, 2)
+    assert (sub_pedidos[outro.id].subtotal, sub_pedidos[outro.id].total_itens) == (30, 3)
+
+    url = f"/api/v1/merchants/me/pedidos/{pedido.id}/status"
+    enviado = client.patch(url, json={"status": PedidoStatus.ENVIADO.value}, headers=auth_headers(owner))
+    lista_outro = client.get("/api/v1/merchants/me/pedidos", headers=auth_headers(outro_owner)).json()
+    db_session.expire_all()
+
+    assert enviado.status_code == 200
+    assert enviado.json()["status"] == PedidoStatus.ENVIADO.value
+    assert float(enviado.json()["subtotal_merchant"]) == pytest.approx(50.0)
+    assert lista_outro[0]["status"] == PedidoStatus.CRIADO.value
+    assert db_session.get(models.Pedido, pedido.id).status == PedidoStatus.CRIADO
+    assert db_session.get(models.PedidoMerchant, sub_pedidos[merchant.id].id).data_envio is not None
+
+    client.patch(url, json={"status": PedidoStatus.ENVIADO.value}, headers=auth_headers(outro_owner))
+    db_session.expire_all()
+    assert db_session.get(models.Pedido, pedido.id).status == PedidoStatus.ENVIADO
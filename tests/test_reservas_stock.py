@@ -0,0 +1,151 @@
+"""Testes das reservas de stock feitas ao adicionar produtos ao carrinho."""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import event
+
+from app.domain.enums import PedidoOrigem, UserRole
+from app.infrastructure.db import models
+from app.schemas.checkout import CheckoutItem
+from app.services import stock_service
+from app.services.checkout_service import create_pedido
+
+
+def _outro_cliente(db_session) -> models.Cliente:
+    tenant_id = db_session.query(models.Tenant).first().id
+    user = models.User(
+        email="outro@example.com",
+        password_hash="hash",
+        role=UserRole.CLIENTE,
+        tenant_id=tenant_id,
+        is_active=True,
+    )
+    db_session.add(user)
+    db_session.flush()
+    cliente = models.Cliente(
+        nome="Outro", email=user.email, telefone="920000000", user_id=user.id, tenant_id=tenant_id
+    )
+    db_session.add(cliente)
+    db_session.commit()
+    return cliente
+
+
+def _comprar(db_session, cliente, produto, quantidade):
+    return create_pedido(
+        db=db_session,
+        tenant_id=cliente.tenant_id,
+        cliente=cliente,
+        itens_payload=[CheckoutItem(tipo="produto", ref_id=produto.id, quantidade=quantidade)],
+        origem=PedidoOrigem.WEB,
+        metodo_pagamento=None,
+        estado_pagamento=None,
+        endereco_id=None,
+    )
+
+
+def test_carrinho_reserva_stock_e_limita_outros_clientes(client, db_session, auth_headers):
+    cliente = db_session.query(models.Cliente).first()
+    outro = _outro_cliente(db_session)
+    produto = db_session.query(models.Produto).first()
+    url = "/api/v1/me/carrinho/itens"
+
+    adicionado = client.post(
+        url, json={"tipo": "produto", "ref_id": str(produto.id), "quantidade": 6}, headers=auth_headers(cliente.user)
+    )
+    recusado = client.post(
+        url, json={"tipo": "produto", "ref_id": str(produto.id), "quantidade": 5}, headers=auth_headers(outro.user)
+    )
+    aceite = client.post(
+        url, json={"tipo": "produto", "ref_id": str(produto.id), "quantidade": 4}, headers=auth_headers(outro.user)
+    )
+    catalogo = client.get("/api/v1/produtos", headers={"X-Tenant-ID": str(produto.tenant_id)})
+
+    assert adicionado.status_code == 201
+    assert recusado.status_code == 400
+    assert aceite.status_code == 201
+    assert catalogo.json()["items"][0]["stock_atual"] == 10
+    assert catalogo.json()["items"][0]["stock_disponivel"] == 0
+
+    removido = client.delete(f"{url}/{adicionado.json()['id']}", headers=auth_headers(cliente.user))
+    db_session.expire_all()
+    assert removido.status_code == 204
+    assert db_session.get(models.Produto, produto.id).stock_disponivel == 6
+
+
+def test_checkout_consome_reserva_propria_e_respeita_as_dos_outros(db_session):
+    cliente = db_session.query(models.Cliente).first()
+    outro = _outro_cliente(db_session)
+    produto = db_session.query(models.Produto).first()
+    for dono, quantidade in ((cliente, 3), (outro, 5)):
+        stock_service.reservar(
+            db_session, tenant_id=produto.tenant_id, cliente_id=dono.id, produto_id=produto.id, quantidade=quantidade
+        )
+    db_session.commit()
+
+    _comprar(db_session, cliente, produto, 3)
+    with pytest.raises(HTTPException):
+        _comprar(db_session, cliente, produto, 3)
+
+    db_session.refresh(produto)
+    assert produto.stock_atual == 7
+    assert produto.stock_disponivel == 2
+    assert db_session.query(models.ReservaStock).filter_by(cliente_id=cliente.id).count() == 0
+
+
+def test_reservas_expiradas_nao_contam_e_sao_libertadas(db_session):
+    outro = _outro_cliente(db_session)
+    cliente = db_session.query(models.Cliente).first()
+    produto = db_session.query(models.Produto).first()
+    stock_service.reservar(
+        db_session, tenant_id=produto.tenant_id, cliente_id=outro.id, produto_id=produto.id, quantidade=10
+    )
+    db_session.commit()
+    reserva = db_session.query(models.ReservaStock).one()
+    reserva.expira_em = datetime.utcnow() - timedelta(minutes=1)
+    db_session.commit()
+
+    _comprar(db_session, cliente, produto, 10)
+
+    assert stock_service.libertar_reservas_expiradas(db_session, batch_size=1) == 1
+    assert db_session.query(models.ReservaStock).count() == 0
+
+
+def test_reservas_so_sao_agregadas_quando_pedidas(client, db_session, auth_headers):
+    merchant = db_session.query(models.Merchant).first()
+    owner = db_session.query(models.User).filter(models.User.id == merchant.owner_id).first()
+    cliente = db_session.query(models.Cliente).first()
+    produto = db_session.query(models.Produto).first()
+    stock_service.reservar(
+        db_session, tenant_id=produto.tenant_id, cliente_id=cliente.id, produto_id=produto.id, quantidade=4
+    )
+    db_session.commit()
+    selects = []
+    event.listen(db_session.get_bind(), "before_cursor_execute", lambda *args: selects.append(args[2]))
+
+    db_session.expire_all()
+    db_session.query(models.Produto).all()
+    listagem = client.get(f"/api/v1/merchants/{merchant.id}/produtos", headers=auth_headers(owner))
+
+    assert "reservas_stock" not in selects[0]
+    assert listagem.json()["items"][0]["stock_disponivel"] == 6
+    # Agregado no SELECT da página, sem um lazy load por produto.
+    assert sum("reservas_stock" in sql for sql in selects[1:]) == 1
+
+
+def test_reserva_recusada_deixa_a_transacao_ao_chamador(db_session):
+    cliente = db_session.query(models.Cliente).first()
+    produto = db_session.query(models.Produto).first()
+    cliente.nome = "Cliente Renomeado"
+
+    with pytest.raises(HTTPException):
+        stock_service.reservar(
+            db_session, tenant_id=produto.tenant_id, cliente_id=cliente.id, produto_id=produto.id, quantidade=11
+        )
+    db_session.commit()
+
+    db_session.expire_all()
+    assert db_session.get(models.Cliente, cliente.id).nome == "Cliente Renomeado"
@@ -0,0 +1,196 @@
+"""Testes da cache de respostas do catálogo público."""
+
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from app.api.v1.routes import catalog
+from app.core import response_cache
+from app.core.config import settings
+from app.domain.enums import PedidoOrigem
+from app.infrastructure.db import models
+from app.schemas.checkout import CheckoutItem
+from app.services import stock_service
+from app.services.checkout_service import create_pedido
+
+
+def _contexto(db_session):
+    merchant = db_session.query(models.Merchant).first()
+    owner = db_session.query(models.User).filter(models.User.id == merchant.owner_id).first()
+    return merchant, owner, {"X-Tenant-ID": str(merchant.tenant_id)}
+
+
+def _nomes(response) -> list[str]:
+    return [item["nome"] for item in response.json()["items"]]
+
+
+def test_escrita_do_merchant_invalida_listagens_em_cache(client, db_session, auth_headers):
+    merchant, owner, headers = _contexto(db_session)
+
+    primeira = client.get("/api/v1/produtos", headers=headers)
+    segunda = client.get("/api/v1/produtos", headers=headers)
+    por_slug = client.get(f"/api/v1/public/merchants/{merchant.slug}/produtos", headers=headers)
+    criado = client.post(
+        f"/api/v1/merchants/{merchant.id}/produtos",
+        json={"merchant_id": str(merchant.id), "nome": "Sumo Natural", "preco": 2, "stock_atual": 5},
+        headers=auth_headers(owner),
+    )
+    depois = client.get("/api/v1/produtos", headers=headers)
+    por_slug_depois = client.get(f"/api/v1/public/merchants/{merchant.slug}/produtos", headers=headers)
+
+    assert criado.status_code == 201
+    assert (primeira.headers["X-Cache"], segunda.headers["X-Cache"]) == ("MISS", "HIT")
+    assert segunda.json() == primeira.json()
+    assert depois.headers["X-Cache"] == "MISS"
+    assert "Sumo Natural" in _nomes(depois)
+    assert "Sumo Natural" not in _nomes(por_slug)
+    assert "Sumo Natural" in _nomes(por_slug_depois)
+
+
+def test_entrada_expirada_e_servida_e_revalidada_em_segundo_plano(client, db_session, monkeypatch):
+    merchant, _, headers = _contexto(db_session)
+    monkeypatch.setattr(settings, "response_cache_ttl_seconds", 0)
+
+    client.get("/api/v1/produtos", headers=headers)
+    db_session.add(models.Produto(nome="Chá", preco=1, merchant_id=merchant.id, tenant_id=merchant.tenant_id))
+    db_session.commit()
+    obsoleta = client.get("/api/v1/produtos", headers=headers)
+    revalidada = client.get("/api/v1/produtos", headers=headers)
+
+    assert obsoleta.headers["X-Cache"] == "STALE"
+    assert "Chá" not in _nomes(obsoleta)
+    assert "Chá" in _nomes(revalidada)
+
+
+def test_entrada_obsoleta_e_revalidada_por_um_so_pedido(client, db_session, monkeypatch):
+    _, _, headers = _contexto(db_session)
+    monkeypatch.setattr(settings, "response_cache_ttl_seconds", 0)
+    agendadas = []
+
+    async def _refresh_em_curso(view, key, tags):
+        # Simula uma revalidação lenta: o lock só é libertado quando ela terminar.
+        agendadas.append(key)
+
+    client.get("/api/v1/produtos", headers=headers)
+    monkeypatch.setattr(response_cache, "_refresh", _refresh_em_curso)
+    obsoletas = [client.get("/api/v1/produtos", headers=headers) for _ in range(5)]
+    asyncio.run(response_cache.get_backend().unlock_refresh(agendadas[0]))
+    depois = client.get("/api/v1/produtos", headers=headers)
+
+    assert [resposta.headers["X-Cache"] for resposta in obsoletas] == ["STALE"] * 5
+    assert depois.headers["X-Cache"] == "STALE"
+    assert len(agendadas) == 2
+
+
+def test_erro_de_base_de_dados_serve_entrada_obsoleta(client, db_session, monkeypatch):
+    merchant, _, headers = _contexto(db_session)
+    original = client.get("/api/v1/categorias", headers=headers)
+
+    async def _falha(*args, **kwargs):
+        raise OperationalError("SELECT 1", {}, Exception("ligação perdida"))
+
+    monkeypatch.setattr(catalog, "paginate_async", _falha)
+    monkeypatch.setattr(settings, "response_cache_ttl_seconds", 0)
+    monkeypatch.setattr(settings, "response_cache_stale_seconds", 0)
+    resposta = client.get("/api/v1/categorias", headers=headers)
+    with pytest.raises(OperationalError):
+        client.get("/api/v1/categorias", params={"page_size": 5}, headers=headers)
+
+    assert resposta.status_code == 200
+    assert resposta.headers["X-Cache"] == "STALE"
+    assert resposta.json() == original.json()
+
+
+def test_if_none_match_devolve_304_com_validadores(client, db_session, monkeypatch):
+    merchant, _, headers = _contexto(db_session)
+    url = f"/api/v1/merchants/{merchant.slug}"
+
+    primeira = client.get(url, headers=headers)
+    etag = primeira.headers["ETag"]
+    em_cache = client.get(url, headers={**headers, "If-None-Match": etag})
+    # Sem cache de respostas o 304 resulta apenas da agregação max(updated_at)/count.
+    monkeypatch.setattr(settings, "response_cache_enabled", False)
+    sem_cache = client.get(url, headers={**headers, "If-None-Match": etag})
+    por_data = client.get(url, headers={**headers, "If-Modified-Since": primeira.headers["Last-Modified"]})
+
+    merchant.nome = "Loja Renovada"
+    db_session.commit()
+    alterado = client.get(url, headers={**headers, "If-None-Match": etag})
+
+    assert primeira.status_code == 200
+    assert primeira.headers["Cache-Control"].startswith("public, max-age=")
+    assert primeira.headers["Surrogate-Key"] == f"tenant-{merchant.tenant_id} merchant-{merchant.id}"
+    assert em_cache.status_code == sem_cache.status_code == por_data.status_code == 304
+    assert em_cache.content == b""
+    assert alterado.status_code == 200
+    assert alterado.headers["ETag"] != etag
+    assert alterado.json()["nome"] == "Loja Renovada"
+
+
+def test_etag_das_listagens_depende_dos_filtros(client, db_session):
+    merchant, _, headers = _contexto(db_session)
+    produto = db_session.query(models.Produto).first()
+
+    todos = client.get("/api/v1/produtos", headers=headers)
+    filtrado = client.get("/api/v1/produtos", params={"merchant_id": str(merchant.id)}, headers=headers)
+    revalidado = client.get(
+        "/api/v1/produtos",
+        params={"merchant_id": str(merchant.id)},
+        headers={**headers, "If-None-Match": filtrado.headers["ETag"]},
+    )
+
+    assert todos.headers["ETag"] != filtrado.headers["ETag"]
+    assert f"merchant-{produto.merchant_id}" in todos.headers["Surrogate-Key"].split()
+    assert revalidado.status_code == 304
+
+
+def test_vendas_e_reservas_invalidam_o_stock_das_listagens(client, db_session, monkeypatch):
+    merchant, _, headers = _contexto(db_session)
+    cliente = db_session.query(models.Cliente).first()
+    produto = db_session.query(models.Produto).first()
+    url = f"/api/v1/public/merchants/{merchant.slug}/produtos"
+
+    def _stock(response) -> tuple[int, int]:
+        item = next(item for item in response.json()["items"] if item["id"] == str(produto.id))
+        return item["stock_atual"], item["stock_disponivel"]
+
+    primeira = client.get(url, headers=headers)
+    em_cache = client.get(url, headers=headers)
+    stock_service.reservar(
+        db_session, tenant_id=produto.tenant_id, cliente_id=cliente.id, produto_id=produto.id, quantidade=4
+    )
+    db_session.commit()
+    reservado = client.get(url, headers=headers)
+    nao_modificado = client.get(url, headers={**headers, "If-None-Match": primeira.headers["ETag"]})
+    create_pedido(
+        db=db_session,
+        tenant_id=cliente.tenant_id,
+        cliente=cliente,
+        itens_payload=[CheckoutItem(tipo="produto", ref_id=produto.id, quantidade=4)],
+        origem=PedidoOrigem.WEB,
+        metodo_pagamento=None,
+        estado_pagamento=None,
+        endereco_id=None,
+    )
+    vendido = client.get(url, headers={**headers, "If-None-Match": reservado.headers["ETag"]})
+    # Sem cache de respostas a ETag continua a depender das versões das tags.
+    monkeypatch.setattr(settings, "response_cache_enabled", False)
+    stock_service.reservar(
+        db_session, tenant_id=produto.tenant_id, cliente_id=cliente.id, produto_id=produto.id, quantidade=1
+    )
+    db_session.commit()
+    sem_cache = client.get(url, headers={**headers, "If-None-Match": vendido.headers["ETag"]})
+
+    assert (primeira.headers["X-Cache"], em_cache.headers["X-Cache"]) == ("MISS", "HIT")
+    assert _stock(primeira) == (10, 10)
+    assert reservado.headers["X-Cache"] == "MISS"
+    assert _stock(reservado) == (10, 6)
+    assert nao_modificado.status_code == 200
+    assert vendido.status_code == 200
+    assert vendido.headers["X-Cache"] == "MISS"
+    assert _stock(vendido) == (6, 6)
+    assert sem_cache.status_code == 200
+    assert _stock(sem_cache) == (6, 5)
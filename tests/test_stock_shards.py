@@ -0,0 +1,103 @@
+"""Testes do modo de stock "hot item" (stock dividido em shards)."""
+
+from __future__ import annotations
+
+import pytest
+from fastapi import HTTPException
+
+from app.domain.enums import PedidoOrigem
+from app.infrastructure.db import models
+from app.schemas.checkout import CheckoutItem
+from app.services import stock_service
+from app.services.checkout_service import create_pedido
+
+
+def _shards(db_session, produto) -> list[int]:
+    return [
+        shard.stock
+        for shard in db_session.query(models.ProdutoStockShard)
+        .filter(models.ProdutoStockShard.produto_id == produto.id)
+        .order_by(models.ProdutoStockShard.shard)
+    ]
+
+
+def _comprar(db_session, produto, quantidade):
+    cliente = db_session.query(models.Cliente).first()
+    return create_pedido(
+        db=db_session,
+        tenant_id=cliente.tenant_id,
+        cliente=cliente,
+        itens_payload=[CheckoutItem(tipo="produto", ref_id=produto.id, quantidade=quantidade)],
+        origem=PedidoOrigem.WEB,
+        metodo_pagamento=None,
+        estado_pagamento=None,
+        endereco_id=None,
+    )
+
+
+def test_checkout_decrementa_um_shard(db_session):
+    produto = db_session.query(models.Produto).first()
+    stock_service.configurar_stock(db_session, produto, shards=4)
+    db_session.commit()
+
+    assert _shards(db_session, produto) == [3, 3, 2, 2]
+    _comprar(db_session, produto, 2)
+
+    db_session.refresh(produto)
+    assert produto.stock_atual == 0
+    assert produto.stock_total == 8
+    assert sorted(_shards(db_session, produto)) in ([0, 2, 3, 3], [1, 2, 2, 3])
+
+
+def test_quantidade_acima_de_cada_shard_consolida_e_recusa_sem_stock(db_session):
+    produto = db_session.query(models.Produto).first()
+    stock_service.configurar_stock(db_session, produto, shards=4)
+    db_session.commit()
+
+    _comprar(db_session, produto, 7)
+    db_session.refresh(produto)
+    assert _shards(db_session, produto) == [1, 1, 1, 0]
+
+    with pytest.raises(HTTPException) as erro:
+        _comprar(db_session, produto, 4)
+    db_session.refresh(produto)
+    assert erro.value.detail == "Stock insuficiente para o produto"
+    assert produto.stock_total == 3
+
+
+def test_rebalanceador_e_desativacao(db_session):
+    produto = db_session.query(models.Produto).first()
+    stock_service.configurar_stock(db_session, produto, stock=12, shards=3)
+    db_session.commit()
+    shard = (
+        db_session.query(models.ProdutoStockShard)
+        .filter(models.ProdutoStockShard.produto_id == produto.id, models.ProdutoStockShard.shard == 0)
+        .one()
+    )
+    shard.stock = 0
+    db_session.commit()
+
+    assert stock_service.rebalancear_shards(db_session) == 1
+    assert _shards(db_session, produto) == [3, 3, 2]
+
+    stock_service.configurar_stock(db_session, produto, shards=0)
+    db_session.commit()
+    db_session.refresh(produto)
+    assert _shards(db_session, produto) == []
+    assert (produto.stock_atual, produto.stock_shards) == (8, 0)
+
+
+def test_read_models_mostram_o_total_dos_shards(client, db_session, auth_headers):
+    merchant = db_session.query(models.Merchant).first()
+    owner = db_session.query(models.User).filter(models.User.id == merchant.owner_id).first()
+    produto = db_session.query(models.Produto).first()
+    url = f"/api/v1/merchants/{merchant.id}/produtos/{produto.id}"
+
+    ativado = client.patch(url, json={"stock_shards": 4, "stock_atual": 40}, headers=auth_headers(owner))
+    _comprar(db_session, produto, 5)
+    publico = client.get("/api/v1/produtos", headers={"X-Tenant-ID": str(merchant.tenant_id)})
+
+    assert ativado.status_code == 200
+    assert ativado.json()["stock_atual"] == 40
+    assert ativado.json()["stock_shards"] == 4
+    assert publico.json()["items"][0]["stock_atual"] == 35
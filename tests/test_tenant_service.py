@@ -1,7 +1,11 @@
 from __future__ import annotations
 
-from app.services import tenant_service
+import pytest
+from pydantic import ValidationError
+
 from app.infrastructure.db import models
+from app.schemas.tenant import TenantCreate, TenantUpdate
+from app.services import tenant_service
 
 
 def test_get_tenant_by_identifier_accepts_slug(db_session):
@@ -26,6 +30,43 @@ def test_create_and_update_tenant(db_session):
     )
     assert tenant_service.get_tenant_by_slug(db_session, "tenant-novo").id == novo.id
 
-    atualizado = tenant_service.update_tenant(db_session, novo, nome="Tenant Atualizado", ativo=False)
+    atualizado = tenant_service.update_tenant(
+        db_session, novo, nome="Tenant Atualizado", ativo=False, timezone="Africa/Maputo"
+    )
     assert atualizado.nome == "Tenant Atualizado"
     assert atualizado.ativo is False
+    assert atualizado.timezone == "Africa/Maputo"
+
+
+def test_timezone_do_tenant_e_validado():
+    assert TenantCreate(nome="Tenant", slug="tenant").timezone == "UTC"
+    assert TenantUpdate(timezone="Africa/Maputo").timezone == "Africa/Maputo"
+    for payload in ({"nome": "Tenant", "slug": "tenant", "timezone": "Marte/Olympus"}, {"timezone": "../etc"}):
+        with pytest.raises(ValidationError):
+            (TenantCreate if "slug" in payload else TenantUpdate)(**payload)
+
+
+def test_resolve_tenant_context_usa_cache_e_invalida_no_update(db_session):
+    tenant = db_session.query(models.Tenant).first()
+
+    contexto = tenant_service.resolve_tenant_context(db_session, "tenant-teste")
+    assert contexto.id == tenant.id
+    assert tenant_service.resolve_tenant_context(db_session, str(tenant.id)) is contexto
+
+    # Alteração fora do serviço não é vista enquanto a entrada estiver em cache
+    db_session.query(models.Tenant).filter(models.Tenant.id == tenant.id).update({"ativo": False})
+    db_session.commit()
+    assert tenant_service.resolve_tenant_context(db_session, "tenant-teste").is_active is True
+
+    tenant_service.update_tenant(db_session, tenant, ativo=False)
+    assert tenant_service.resolve_tenant_context(db_session, "tenant-teste").is_active is False
+
+
+def test_resolve_tenant_context_cache_negativa_invalidada_no_create(db_session):
+    assert tenant_service.resolve_tenant_context(db_session, "tenant-futuro") is None
+
+    novo = tenant_service.create_tenant(db_session, nome="Futuro", slug="tenant-futuro", ativo=True)
+
+    contexto = tenant_service.resolve_tenant_context(db_session, "tenant-futuro")
+    assert contexto is not None
+    assert contexto.id == novo.id